@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+
+from metrics import (
+    ADMISSION_ACTIVE,
+    ADMISSION_QUEUED,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT_SECONDS,
+)
+
+# Generations run at the same time per model
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", 1))
+# Per-model concurrency, as JSON: {"qwen2.5:1.5b": 2, "qwen2.5:7b": 1}
+MODEL_CONCURRENCY_OVERRIDES: dict = json.loads(
+    os.getenv("MODEL_CONCURRENCY_OVERRIDES", "{}")
+)
+# Requests allowed to wait per model; beyond that they get 429 at once
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+# Seconds between queue status lines sent to a waiting stream
+QUEUE_STATUS_INTERVAL = float(os.getenv("QUEUE_STATUS_INTERVAL", 5))
+# Assumed generation time until a model has finished one
+DEFAULT_SERVICE_SECONDS = float(os.getenv("DEFAULT_SERVICE_SECONDS", 20))
+# Weight of the latest generation in the moving average of service times
+_SERVICE_ALPHA = 0.2
+
+
+class QueueFull(Exception):
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"La cola de {model} está llena.")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    A request waiting for, or holding, one generation slot of a model.
+    """
+
+    def __init__(self, queue: "ModelQueue", client: str):
+        self.queue = queue
+        self.client = client
+        self.created = time.perf_counter()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+        self._admitted = asyncio.Event()
+        self._changed = asyncio.Event()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+    def _admit(self):
+        self.admitted_at = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.labels(self.queue.model).observe(
+            self.admitted_at - self.created
+        )
+        self._admitted.set()
+        self._changed.set()
+
+    def status(self) -> dict:
+        position = self.queue.position(self)
+        return {
+            "position": position,
+            "eta_seconds": round(self.queue.eta(position), 1),
+        }
+
+    async def wait(self):
+        await self._admitted.wait()
+
+    async def updates(self) -> AsyncIterator[dict]:
+        """
+        Yield the queue status until the ticket is admitted: whenever the
+        queue moves, and every QUEUE_STATUS_INTERVAL seconds otherwise (which
+        also keeps the client's read timeout from expiring).
+        """
+        while not self.admitted:
+            yield self.status()
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), QUEUE_STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self):
+        """
+        Give the slot back, or leave the queue if not admitted yet.
+        Calling it more than once has no effect.
+        """
+        if not self.released:
+            self.released = True
+            self.queue.release(self)
+
+
+class ModelQueue:
+    """
+    Slots and wait queue of one model.
+
+    Waiting requests are grouped by client and served round-robin, so a
+    client that sends many questions does not hold back the others.
+    """
+
+    def __init__(self, model: str, concurrency: int, queue_size: int):
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting: "OrderedDict[str, deque[Ticket]]" = OrderedDict()
+        self.queued = 0
+        self.service_seconds = DEFAULT_SERVICE_SECONDS
+        self.served = 0
+        self.rejected = 0
+
+    def eta(self, position: int) -> float:
+        # Requests ahead are served `concurrency` at a time
+        return (position // self.concurrency + 1) * self.service_seconds
+
+    def position(self, ticket: Ticket) -> int:
+        """
+        Requests that will be admitted before `ticket` (0 when it is next).
+        """
+        if ticket.admitted:
+            return 0
+        tickets = self.waiting.get(ticket.client)
+        if not tickets or ticket not in tickets:
+            return 0
+        rounds = tickets.index(ticket)
+        ahead = rounds
+        before = True
+        for client, queued in self.waiting.items():
+            if client == ticket.client:
+                before = False
+                continue
+            ahead += min(len(queued), rounds + 1 if before else rounds)
+        return ahead
+
+    def enter(self, client: str) -> Ticket:
+        ticket = Ticket(self, client)
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            ticket._admit()
+        elif self.queued >= self.queue_size:
+            self.rejected += 1
+            ADMISSION_REJECTED.labels(self.model).inc()
+            raise QueueFull(self.model, self.eta(self.queued))
+        else:
+            self.waiting.setdefault(client, deque()).append(ticket)
+            self.queued += 1
+        self._update_gauges()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        if ticket.admitted:
+            self.active -= 1
+            self.served += 1
+            elapsed = time.perf_counter() - ticket.admitted_at
+            self.service_seconds += _SERVICE_ALPHA * (elapsed - self.service_seconds)
+        else:
+            tickets = self.waiting.get(ticket.client)
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                self.queued -= 1
+                if not tickets:
+                    del self.waiting[ticket.client]
+        self._admit_next()
+        self._update_gauges()
+
+    def _admit_next(self):
+        while self.active < self.concurrency and self.waiting:
+            # Round-robin: the client served goes to the back of the line
+            client, tickets = self.waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                self.waiting[client] = tickets
+            self.queued -= 1
+            self.active += 1
+            ticket._admit()
+        # Everyone still waiting has moved up
+        for tickets in self.waiting.values():
+            for ticket in tickets:
+                ticket._changed.set()
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.labels(self.model).set(self.active)
+        ADMISSION_QUEUED.labels(self.model).set(self.queued)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": self.queued,
+            "queue_size": self.queue_size,
+            "clients_waiting": len(self.waiting),
+            "service_seconds": round(self.service_seconds, 2),
+            "served": self.served,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """
+    Per-model concurrency cap with a bounded, fair wait queue in front of
+    Ollama. Requests beyond the queue are rejected right away (QueueFull)
+    instead of piling up until the client times out.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = MODEL_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        overrides: Optional[dict] = None,
+    ):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.overrides = MODEL_CONCURRENCY_OVERRIDES if overrides is None else overrides
+        self.queues: dict[str, ModelQueue] = {}
+
+    def queue(self, model: str) -> ModelQueue:
+        if model not in self.queues:
+            self.queues[model] = ModelQueue(
+                model, int(self.overrides.get(model, self.concurrency)), self.queue_size
+            )
+        return self.queues[model]
+
+    def enter(self, model: str, client: str) -> Ticket:
+        """
+        Take a generation slot of `model`, or a place in its queue.
+
+        Raises:
+            QueueFull: The queue of the model is full.
+        """
+        return self.queue(model).enter(client)
+
+    def stats(self) -> dict:
+        return {model: queue.stats() for model, queue in self.queues.items()}
+
+
+admission = AdmissionController()
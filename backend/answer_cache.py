@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Minimum cosine similarity between two questions to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+# Seconds an answer stays valid
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 24 * 3600))
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", 1000))
+
+
+@dataclass
+class CachedAnswer:
+    embedding: np.ndarray
+    context_ids: frozenset
+    model: str
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Reuse answers to questions that mean the same thing.
+
+    An entry matches when it was generated by the same model, from the same set
+    of retrieved context IDs, and its question embedding is within the cosine
+    threshold of the new one. Entries expire after a TTL, the least recently
+    used ones are evicted first, and re-ingesting a chunk drops every answer
+    built from it.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_items: int = ANSWER_CACHE_MAX_ITEMS,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(
+        self, embedding: list[float], context_ids: Iterable[str], model: str
+    ) -> Optional[str]:
+        """
+        Return a cached answer for an equivalent question, or None.
+
+        Args:
+            embedding (list[float]): Embedding of the new question.
+            context_ids (Iterable[str]): IDs returned by retrieval for it.
+            model (str): The generation model.
+
+        Returns:
+            Optional[str]: The cached answer if one matches.
+        """
+        query = _normalize(embedding)
+        ids = frozenset(context_ids)
+        with self._lock:
+            self._expire()
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if entry.model == model and entry.context_ids == ids
+            ]
+            if keys:
+                matrix = np.stack([self._entries[key].embedding for key in keys])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    return self._entries[keys[best]].answer
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: list[float],
+        context_ids: Iterable[str],
+        model: str,
+        answer: str,
+    ):
+        """
+        Remember the answer generated for a question.
+        """
+        entry = CachedAnswer(
+            embedding=_normalize(embedding),
+            context_ids=frozenset(context_ids),
+            model=model,
+            answer=answer,
+            created_at=time.monotonic(),
+        )
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Drop the answers built from any of the given chunk IDs.
+
+        Args:
+            ids (Iterable[str], optional): Re-ingested chunk IDs. None drops everything.
+
+        Returns:
+            int: Number of answers removed.
+        """
+        with self._lock:
+            if ids is None:
+                keys = list(self._entries)
+            else:
+                changed = set(ids)
+                keys = [
+                    key
+                    for key, entry in self._entries.items()
+                    if not changed.isdisjoint(entry.context_ids)
+                ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _expire(self):
+        now = time.monotonic()
+        # Entries are stored in insertion order, but lookups reorder them
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.created_at > self.ttl
+        ]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+
+def _normalize(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+answer_cache = SemanticAnswerCache()
@@ -1,103 +1,616 @@
+import asyncio
 import json
-import os
-from typing import Dict, List
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
 
 # import sys
 # import milvus.milvus
 # sys.path.append("/app")
-import requests
+import httpx
+import numpy as np
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException  # type: ignore
-from models import Answer_Request, Data_embed
+from fastapi import FastAPI, Header, HTTPException, Request  # type: ignore
+from fastapi.exceptions import RequestValidationError  # type: ignore
+from fastapi.responses import Response, StreamingResponse  # type: ignore
+from pydantic import ValidationError
+from pymilvus.exceptions import MilvusUnavailableException
+from admission import QueueFull, Ticket, admission
+from answer_cache import answer_cache
+from embeddings import close_embedding_engine, get_embedding_engine
+from ingest_jobs import InvalidRecord, ingest_jobs
+from metrics import (
+    CLIENT_ID_HEADER,
+    REQUEST_ID_HEADER,
+    REQUEST_SECONDS,
+    REQUESTS,
+    log_event,
+    metrics_payload,
+    new_request_id,
+    observe_generation,
+    request_id_var,
+    span,
+)
+from models import (
+    Answer_Request,
+    Ask_Request,
+    Data_embed,
+    Ingest_Documents_Request,
+    Ingest_Options,
+    Invalidate_Request,
+    Search_Request,
+    Warmup_Request,
+)
+from ollama_client import close_ollama_client, get_ollama_client
+from ollama_router import NoOllamaNodes
+import rag
+from warmup import start_warmup, warm_model, warm_state
 
 # from milvus.milvus import milvus_router
-from pymilvus import MilvusClient  # type: ignore
+from milvus_pool import MILVUS_COLLECTION, close_milvus_pools, get_milvus_pool
+from vector_store import VECTOR_BACKEND
+from vector_codec import encode_matrix, negotiate
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared Ollama connection pool inside the running event loop
+    # and start checking the health of every Ollama node
+    get_ollama_client().router.start()
+    # Load the configured models so the first question does not pay for it
+    warming = start_warmup()
+    # Open the Milvus pool and load the collection once, not per query
+    if VECTOR_BACKEND == "milvus":
+        await asyncio.to_thread(get_milvus_pool().prepare, [MILVUS_COLLECTION])
+    # Start the ingestion workers and resume the jobs left unfinished
+    ingest_jobs.start()
+    yield
+    warming.cancel()
+    await asyncio.to_thread(ingest_jobs.stop)
+    await close_embedding_engine()
+    await close_ollama_client()
+    await close_milvus_pools()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Running pump_generation tasks; the event loop only keeps weak references to
+# tasks, so an unreferenced generation could be garbage collected mid-stream
+_generations: set = set()
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Propagate the request ID (X-Request-ID) and record per-route metrics.
+    """
+    request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    # Label by route template to keep the metric cardinality bounded
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    REQUESTS.labels(path, str(response.status_code)).inc()
+    REQUEST_SECONDS.labels(path).observe(time.perf_counter() - start)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Métricas en formato Prometheus.
+    """
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
+def ollama_http_exception(e: Exception) -> HTTPException:
+    """
+    Translate an error raised while talking to Ollama into an HTTPException.
+    """
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(
+            status_code=504, detail="Tiempo de espera excedido al consultar Ollama."
+        )
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(
+            status_code=e.response.status_code, detail=e.response.text
+        )
+    if isinstance(e, NoOllamaNodes):
+        return HTTPException(status_code=503, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def search_http_exception(e: Exception) -> HTTPException:
+    """
+    Translate an error raised by rag.search into an HTTPException: Ollama
+    errors as in ollama_http_exception, vector store errors as 503 when the
+    store cannot be reached and 502 otherwise.
+    """
+    if isinstance(e, (httpx.HTTPError, NoOllamaNodes)):
+        return ollama_http_exception(e)
+    log_event("search_error", error=f"{type(e).__name__}: {e}")
+    if isinstance(e, MilvusUnavailableException):
+        return HTTPException(
+            status_code=503, detail="El almacén de vectores no está disponible."
+        )
+    return HTTPException(
+        status_code=502, detail=f"Error al consultar el almacén de vectores: {e}"
+    )
+
+
+def client_id_of(request: Request) -> str:
+    """
+    Identify who is asking, for fair queuing: the X-Client-ID header (the
+    frontend sends one per browser session, since all its sessions share
+    one address) or the client address.
+    """
+    return request.headers.get(CLIENT_ID_HEADER) or (
+        request.client.host if request.client else "-"
+    )
 
 
 # # app.include_route(milvus.milvus_router)
-client = MilvusClient("Versat.db")
 
 
-@app.get("/mv_insert")
-async def insert(
-    collection: str,
-    data: List[dict] = [
-        {"vector": [], "text": "", "subject": ""},
-        {"vector": [], "text": "", "subject": ""},
-    ],
+@app.post("/mv_insert")
+async def insert(collection: str, data: List[dict]):
+    """
+    Inserta filas ({"id", "vector", ...}) en una colección, creándola si no existe.
+    Para ingerir documentos usar /ingest/documents o /ingest/records.
+    """
+    pool = get_milvus_pool()
+    # The sync client blocks, so the check runs off the event loop; the
+    # vectors we will use in this demo have 768 dimensions
+    await asyncio.to_thread(pool.ensure_collection, collection, 768)
+    return await pool.insert(collection, data)
+
+
+async def stream_ndjson(
+    chunks: AsyncIterator[dict], first: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """
+    Forward Ollama stream objects as NDJSON lines.
+
+    The bulky "context" token array is dropped. Errors after the first byte
+    cannot change the HTTP status, so they are sent as a final error line.
+    `first`, if given, is sent as the first line.
+    """
+    if first:
+        yield json.dumps(first, ensure_ascii=False) + "\n"
+    try:
+        async for chunk in chunks:
+            chunk.pop("context", None)
+            yield json.dumps(chunk, ensure_ascii=False) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e), "done": True}) + "\n"
+
+
+async def _single_chunk(chunk: dict) -> AsyncIterator[dict]:
+    yield chunk
+
+
+async def answer_with_cache(
+    model: str,
+    prompt: str,
+    stream: bool,
+    query_embedding: Optional[list[float]] = None,
+    context_ids: Optional[list[str]] = None,
+    extra: Optional[dict] = None,
+    system: Optional[str] = None,
+    client_id: str = "-",
 ):
-    if not client.has_collection(collection_name=collection):
-        client.create_collection(
-            collection_name=collection,
-            dimension=768,  # The vectors we will use in this demo has 768 dimensions
+    """
+    Generate an answer, going through the answer cache when possible.
+
+    Cache misses go through admission control: at most MODEL_CONCURRENCY
+    generations run per model and the rest wait in a bounded, fair queue
+    (429 when it is full). A waiting stream receives {"queue": {"position",
+    "eta_seconds"}} lines until its generation starts.
+
+    Args:
+        model (str): The generation model.
+        prompt (str): The full prompt.
+        stream (bool): Forward the tokens as NDJSON instead of a single JSON.
+        query_embedding (list[float], optional): Question embedding; enables the cache.
+        context_ids (list[str], optional): Retrieved IDs the prompt was built from.
+        extra (dict, optional): Fields added to the JSON response, or sent as
+            the first NDJSON line when streaming.
+        system (str, optional): System prompt, sent apart from the prompt.
+        client_id (str): Who asks, for fair queuing (see client_id_of).
+    """
+    if query_embedding is not None:
+        with span("answer_cache") as fields:
+            cached = answer_cache.lookup(query_embedding, context_ids or [], model)
+            fields["hit"] = cached is not None
+        if cached is not None:
+            if stream:
+                chunk = {"response": cached, "done": True, "cached": True}
+                return StreamingResponse(
+                    stream_ndjson(_single_chunk(chunk), extra),
+                    media_type="application/x-ndjson",
+                )
+            return {"response": cached, "cached": True, **(extra or {})}
+
+    def remember(answer: str):
+        if query_embedding is not None:
+            answer_cache.store(query_embedding, context_ids or [], model, answer)
+
+    try:
+        ticket = admission.enter(model, client_id)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+
+    ollama = get_ollama_client()
+    options = {"system": system} if system else {}
+    if not stream:
+        try:
+            with span("admission") as fields:
+                fields["position"] = ticket.status()["position"]
+                await ticket.wait()
+            start = time.perf_counter()
+            result = await ollama.generate(model=model, prompt=prompt, **options)
+        except Exception as e:
+            raise ollama_http_exception(e)
+        finally:
+            ticket.release()
+        observe_generation(model, time.perf_counter() - start, None, result)
+
+        # Ensure the response ends with a newline character
+        formatted_response = result.get("response", "").strip() + "\n"
+        remember(formatted_response)
+
+        # Return the formatted response as a dictionary
+        return {"response": formatted_response, **(extra or {})}
+
+    async def open_stream():
+        start = time.perf_counter()
+        chunks = ollama.generate_stream(model=model, prompt=prompt, **options)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = {"response": "", "done": True}
+        except Exception:
+            await chunks.aclose()
+            raise
+        sink: asyncio.Queue = asyncio.Queue()
+        # The generation runs in its own task: if the client goes away, it is
+        # still finished and stored in the answer cache instead of wasted
+        task = asyncio.create_task(
+            pump_generation(
+                model, chunks, first, start, time.perf_counter() - start,
+                sink, remember, ticket,
+            )
+        )
+        _generations.add(task)
+        task.add_done_callback(_generations.discard)
+        return sink
+
+    if ticket.admitted:
+        try:
+            # Wait for the first token so connection errors still map to a status
+            sink = await open_stream()
+        except Exception as e:
+            ticket.release()
+            raise ollama_http_exception(e)
+        return StreamingResponse(
+            stream_ndjson(drain(sink), extra), media_type="application/x-ndjson"
         )
 
-        res = client.insert(collection_name=collection, data=data)
-    return res
+    async def queued() -> AsyncIterator[dict]:
+        # Queue position and ETA lines until a slot is free, then the tokens
+        try:
+            async for status in ticket.updates():
+                yield {"queue": status}
+            sink = await open_stream()
+        except BaseException:
+            ticket.release()
+            raise
+        async for chunk in drain(sink):
+            yield chunk
+
+    return StreamingResponse(
+        stream_ndjson(queued(), extra), media_type="application/x-ndjson"
+    )
+
+
+async def pump_generation(
+    model: str,
+    chunks: AsyncIterator[dict],
+    first: dict,
+    start: float,
+    first_token_seconds: float,
+    sink: asyncio.Queue,
+    remember,
+    ticket: Ticket,
+):
+    """
+    Read a streamed generation to the end, forwarding each chunk to `sink`
+    (None marks the end), then record it and free the model slot.
+    """
+    parts: list[str] = []
+    chunk: Optional[dict] = first
+    try:
+        while chunk is not None:
+            parts.append(chunk.get("response", ""))
+            sink.put_nowait(chunk)
+            if chunk.get("done"):
+                observe_generation(
+                    model, time.perf_counter() - start, first_token_seconds, chunk
+                )
+                remember("".join(parts).strip() + "\n")
+                break
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+    except Exception as e:
+        sink.put_nowait({"error": str(e), "done": True})
+    finally:
+        ticket.release()
+        sink.put_nowait(None)
+
+
+async def drain(sink: asyncio.Queue) -> AsyncIterator[dict]:
+    while True:
+        chunk = await sink.get()
+        if chunk is None:
+            return
+        yield chunk
 
 
 @app.post("/get_answer/")
 # async def generate_formatted(request: GenerateRequest):
-async def generate_formatted(data: Answer_Request):
+async def generate_formatted(data: Answer_Request, request: Request):
+    """
+    Get answer from ollama.
+
+    With stream=True the tokens are forwarded as NDJSON
+    ({"response": "...", "done": false} per line) as soon as Ollama emits them.
+
+    When the question and the retrieved context IDs are sent, answers to
+    semantically equivalent questions over the same context are served from
+    the answer cache.
+
+    Generations wait for a free slot of the model; when its queue is full
+    the request is rejected with 429 and a Retry-After header.
     """
-    Get answer from ollama
+    query_embedding = None
+    if data.question and data.context_ids is not None:
+        try:
+            with span("embed_question"):
+                query_embedding = (
+                    await get_embedding_engine().embed([data.question])
+                )[0]
+        except Exception as e:
+            log_event("answer_cache_error", error=str(e))
+    return await answer_with_cache(
+        data.model,
+        data.prompt,
+        data.stream,
+        query_embedding,
+        data.context_ids,
+        client_id=client_id_of(request),
+    )
+
+
+@app.post("/search")
+async def search(data: Search_Request):
     """
-    url = f"http://ollama_llm:11434/api/generate"
-    headers = {"Content-Type": "application/json"}
-    # data = {"model": request.model, "prompt": request.prompt, "stream": request.stream}
+    Busca los fragmentos más parecidos a cada consulta.
 
-    model = data.model
-    prompt = data.prompt
-    stream = data.stream
-    data = {"model": model, "prompt": prompt}
+    Embeddings, búsqueda vectorial y contenido completo de cada pregunta en
+    una sola llamada, para un lote de consultas.
+    """
+    if not data.queries:
+        raise HTTPException(status_code=400, detail="Se requiere al menos una consulta.")
+    try:
+        results, _ = await rag.search(data.queries, data.limit or rag.SEARCH_LIMIT)
+    except Exception as e:
+        raise search_http_exception(e)
+    return {"results": results}
 
-    response = requests.post(url, headers=headers, data=json.dumps(data), stream=stream)
 
-    # Capture and format streamed responses
-    formatted_response = ""
-    for line in response.iter_lines():
-        if line:
-            try:
-                json_line = json.loads(line.decode("utf-8"))  # Parse each line as JSON
-                if "response" in json_line:
-                    formatted_response += json_line[
-                        "response"
-                    ]  # Extract the response content
-            except json.JSONDecodeError:
-                # Handle any decoding errors
-                continue
+@app.post("/ask")
+async def ask(data: Ask_Request, request: Request):
+    """
+    Responde una pregunta con todo el flujo RAG en el servidor.
 
-    # Ensure the response ends with a newline character
-    formatted_response = formatted_response.strip() + "\n"
+    Busca el contexto, arma el prompt y genera la respuesta. Con stream=True
+    la primera línea NDJSON trae las fuentes ({"sources": [...]}) y las
+    siguientes, los tokens.
+    """
+    question = data.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="La pregunta no puede estar vacía.")
+    try:
+        results, vectors = await rag.search([question], data.limit or rag.SEARCH_LIMIT)
+    except Exception as e:
+        raise search_http_exception(e)
+    hits = results[0]
+    with span("build_prompt") as fields:
+        prompt, packing = rag.build_prompt(question, hits, data.model)
+        fields.update(packing.to_dict())
+    sources = [
+        {"id": hit["id"], "question_id": hit["question_id"], "score": hit["score"]}
+        for hit in hits
+    ]
+    return await answer_with_cache(
+        data.model,
+        prompt,
+        data.stream,
+        vectors[0],
+        [hit["id"] for hit in hits],
+        {"sources": sources},
+        system=rag.SYSTEM_PROMPT,
+        client_id=client_id_of(request),
+    )
+
+
+@app.get("/queue")
+async def queue_status():
+    """
+    Estado de la cola de generación de cada modelo (activos, en espera,
+    tiempo medio por respuesta y rechazos).
+    """
+    return admission.stats()
+
+
+@app.post("/warmup")
+async def warmup(data: Warmup_Request):
+    """
+    Carga un modelo en memoria (p. ej. al seleccionarlo en el frontend).
+
+    Devuelve el tiempo de carga informado por Ollama y el keep_alive aplicado.
+    """
+    state = await warm_model(data.model)
+    if "error" in state:
+        raise HTTPException(status_code=502, detail=state["error"])
+    return state
+
+
+@app.get("/warmup")
+async def warmup_status():
+    """
+    Último calentamiento de cada modelo.
+    """
+    return warm_state
+
+
+def ingest_job_or_404(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de ingesta no encontrado.")
+    return job
+
+
+@app.post("/ingest/documents", status_code=202)
+async def ingest_documents(data: Ingest_Documents_Request):
+    """
+    Encola la ingesta de documentos de preguntas (formato "ID: ...").
+    Devuelve el trabajo; su progreso se consulta en /ingest/jobs/{job_id}.
+    """
+    job = await asyncio.to_thread(
+        ingest_jobs.submit_documents,
+        [(document.name, document.content) for document in data.documents],
+        batch_size=data.batch_size,
+        max_length=data.max_length,
+        overlap=data.overlap,
+    )
+    return ingest_jobs.status(job)
+
+
+@app.post("/ingest/records", status_code=202)
+async def ingest_records(
+    request: Request, batch_size: int = 64, max_length: int = 450, overlap: int = 100
+):
+    """
+    Encola la ingesta de un flujo NDJSON (application/x-ndjson) con una
+    pregunta por línea: {"id": "...", "text": "..."}. El cuerpo se guarda en
+    disco a medida que llega, así que admite cargas grandes.
+    """
+    try:
+        options = Ingest_Options(
+            batch_size=batch_size, max_length=max_length, overlap=overlap
+        )
+    except ValidationError as e:
+        raise RequestValidationError(
+            [
+                {**error, "loc": ("query", *error["loc"])}
+                for error in e.errors(include_url=False, include_context=False)
+            ]
+        )
+    try:
+        job = await ingest_jobs.submit_ndjson(request.stream(), **options.model_dump())
+    except InvalidRecord as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe estar en UTF-8.")
+    return ingest_jobs.status(job)
+
+
+@app.get("/ingest/jobs")
+async def list_ingest_jobs():
+    """
+    Trabajos de ingesta, del más reciente al más antiguo.
+    """
+    return ingest_jobs.stats()
 
-    # Return the formatted response as a dictionary
-    return {"response": formatted_response}
+
+@app.get("/ingest/jobs/{job_id}")
+async def ingest_job_status(job_id: str):
+    """
+    Estado de un trabajo: lotes hechos, chunks/s y segundos estimados hasta terminar.
+    """
+    return ingest_jobs.status(ingest_job_or_404(job_id))
+
+
+@app.post("/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    """
+    Detiene el trabajo tras el lote en curso, conservando su punto de control.
+    """
+    ingest_job_or_404(job_id)
+    return ingest_jobs.status(ingest_jobs.cancel(job_id))
+
+
+@app.post("/ingest/jobs/{job_id}/resume")
+async def resume_ingest_job(job_id: str):
+    """
+    Vuelve a encolar un trabajo fallido o cancelado desde su último punto de control.
+    """
+    ingest_job_or_404(job_id)
+    return ingest_jobs.status(ingest_jobs.resume(job_id))
+
+
+@app.get("/milvus/pool")
+async def milvus_pool_status():
+    """
+    Conexiones abiertas a Milvus y estado de carga de las colecciones.
+    """
+    return get_milvus_pool().stats()
+
+
+@app.get("/ollama/nodes")
+async def ollama_nodes():
+    """
+    Nodos de Ollama por rol (generate / embed): salud, carga y modelos cargados.
+    """
+    return get_ollama_client().router.stats()
 
 
 @app.post("/get_embeddings")
 async def get_embeddings(text: str, overlap: int, answer_split_chr: str = "\n"):
-    chunks = text.split(answer_split_chr)
-    url = "http://ollama_llm:11434/api/generate"
-    headers = {"Content-Type": "application/json"}
-    payload = {"text_to_embed": chunks}
-    embeddings = requests.get(url, headers=headers, json=payload)
-    return embeddings.json()
+    chunks = [chunk for chunk in text.split(answer_split_chr) if chunk.strip()]
+    try:
+        embeddings = await get_embedding_engine().embed(chunks)
+    except Exception as e:
+        raise ollama_http_exception(e)
+    return {"embeddings": embeddings}
 
 
 @app.post("/generate-embeddings/")
-async def generate_embeddings(data: Data_embed):
+async def generate_embeddings(data: Data_embed, accept: Optional[str] = Header(None)):
     """
     Genera embeddings para una lista de textos.
-    """
-    url_embed = os.getenv("URL_FOR_EMBED", "ollama_llm")
-    port_embed = os.getenv("PORT_FOR_EMBED", 11434)
 
-    OLLAMA_URL = f"http://{url_embed}:{port_embed}/api/embed"
-    print("OLLAMA_URL", OLLAMA_URL)
+    Por defecto responde en JSON. Con la cabecera Accept se puede pedir un
+    formato binario (application/x-float32, application/x-npy o
+    application/msgpack, ver vector_codec.py): la matriz float32 va en el
+    cuerpo y las estadísticas en la cabecera X-Embedding-Stats.
+    """
     try:
         # Extraer la lista de textos del cuerpo de la solicitud
         input_texts = data.texts
@@ -109,26 +622,65 @@ async def generate_embeddings(data: Data_embed):
                 detail="El campo 'texts' debe ser una lista de cadenas.",
             )
 
-        # Generar embeddings para cada texto
-        embeddings = []
-        for text in input_texts:
-            payload = {"model": "nomic-embed-text:latest", "input": text}
+        # Generar embeddings por lotes concurrentes, conservando el orden
+        with span("embed", texts=len(input_texts)) as fields:
+            vectors, stats = await get_embedding_engine().embed_with_stats(
+                input_texts, batch_size=data.batch_size
+            )
+            fields["cache_hits"] = stats.cache_hits
 
-            # Enviar la solicitud a Ollama
-            response = requests.post(OLLAMA_URL, json=payload)
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code, detail=response.text
+        media_type = negotiate(accept)
+        if media_type is not None:
+            with span("encode", texts=len(input_texts), media_type=media_type):
+                matrix = np.asarray(vectors, dtype=np.float32).reshape(
+                    len(vectors), len(vectors[0]) if vectors else 0
                 )
+                body = encode_matrix(matrix, media_type)
+            return Response(
+                content=body,
+                media_type=media_type,
+                headers={"X-Embedding-Stats": json.dumps(stats.to_dict())},
+            )
 
-            # Agregar el embedding generado a la lista
-            embeddings.append(response.json()["embeddings"])
+        # Cada elemento conserva el formato de Ollama: [[0.123, ..., 0.456]]
+        embeddings = [[vector] for vector in vectors]
 
         # Devolver los embeddings generados
-        return {"embeddings": embeddings}
+        return {"embeddings": embeddings, "stats": stats.to_dict()}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise ollama_http_exception(e)
+
+
+@app.get("/embedding-cache/stats")
+async def embedding_cache_stats():
+    """
+    Contadores de la caché de embeddings (aciertos, fallos, desalojos).
+    """
+    cache = get_embedding_engine().cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/answer-cache/stats")
+async def answer_cache_stats():
+    """
+    Contadores de la caché semántica de respuestas.
+    """
+    return answer_cache.stats()
+
+
+@app.post("/answer-cache/invalidate")
+async def invalidate_answer_cache(data: Invalidate_Request):
+    """
+    Descarta las respuestas construidas con los chunks indicados
+    (todas si no se indican IDs). La ingesta lo llama tras reindexar.
+    """
+    removed = answer_cache.invalidate(data.ids)
+    return {"removed": removed}
 
 
 @app.get("/generate-predefined-embeddings")
@@ -140,31 +692,24 @@ async def generate_predefined_embeddings():
         # Lista predefinida de textos
         predefined_texts = ["asdasd ", "asd asd asdasdf "]
 
-        # URL del endpoint /generate-embeddings/
-        url = "http://backend:5000/generate-embeddings/"  # Usar el nombre del servicio Docker
-
-        # Payload con la lista de textos
-        payload = {"texts": predefined_texts}
-
-        # Encabezados para indicar que el contenido es JSON
-        headers = {"Content-Type": "application/json"}
-
-        # Enviar la solicitud POST al endpoint /generate-embeddings/ con un timeout
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-
-        # Verificar si la solicitud fue exitosa
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+        # Llamar directamente al manejador de /generate-embeddings/ con un
+        # timeout, sin pasar de nuevo por la red
+        response = await asyncio.wait_for(
+            generate_embeddings(Data_embed(texts=predefined_texts), accept=None),
+            timeout=10,
+        )
 
         # Procesar la respuesta
-        embeddings = response.json().get("embeddings", [])
+        embeddings = response.get("embeddings", [])
 
         # Devolver los embeddings generados
         return {"embeddings": embeddings}
 
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         raise HTTPException(
             status_code=504, detail="Tiempo de espera excedido al generar embeddings."
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1 @@
+# Offline benchmark suite for ingestion and query latency
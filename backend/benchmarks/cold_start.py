@@ -0,0 +1,89 @@
+"""
+Measure cold-start and prefill latency against a real Ollama server.
+
+For each prompt layout the model is unloaded (keep_alive 0), then asked two
+different questions over different contexts. The first request shows the
+cold load (load_duration); the second shows how much of the prompt Ollama
+had to evaluate again (prompt_eval_count / prompt_eval_duration):
+
+    inline  the instructions and the question in a single prompt, as the
+            frontend used to send them
+    system  the instructions as a fixed system prompt and only the context
+            and question as the prompt (what /ask sends)
+
+Usage (from the backend directory):
+    python -m benchmarks.cold_start --url http://localhost:11434 --model qwen2.5:1.5b
+"""
+import argparse
+import json
+import time
+
+import requests
+
+from rag import QUESTION_TEMPLATE, SYSTEM_PROMPT
+
+QUESTIONS = [
+    (
+        "¿Cómo concilio una cuenta bancaria?",
+        "CON_banco_P1\nPregunta: ¿Cómo concilio una cuenta bancaria? Respuesta: "
+        "En el módulo Contabilidad abra Conciliación, seleccione la cuenta y el período.",
+    ),
+    (
+        "¿Cómo cierro el período contable?",
+        "CON_cierre_P2\nPregunta: ¿Cómo cierro el período? Respuesta: Verifique que "
+        "no queden comprobantes pendientes y ejecute Cierre de período.",
+    ),
+]
+
+
+def _generate(url: str, model: str, **fields) -> dict:
+    start = time.perf_counter()
+    response = requests.post(
+        f"{url}/api/generate",
+        json={"model": model, "stream": False, "options": {"num_predict": 16}, **fields},
+        timeout=600,
+    )
+    response.raise_for_status()
+    data = response.json()
+    return {
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        "load_ms": round((data.get("load_duration") or 0) / 1e6, 1),
+        "prompt_tokens": data.get("prompt_eval_count") or 0,
+        "prefill_ms": round((data.get("prompt_eval_duration") or 0) / 1e6, 1),
+    }
+
+
+def _unload(url: str, model: str):
+    requests.post(
+        f"{url}/api/generate", json={"model": model, "keep_alive": 0}, timeout=60
+    ).raise_for_status()
+
+
+def run_layout(url: str, model: str, layout: str) -> list[dict]:
+    _unload(url, model)
+    runs = []
+    for question, context in QUESTIONS:
+        prompt = QUESTION_TEMPLATE.format(context=context, question=question)
+        if layout == "system":
+            result = _generate(url, model, prompt=prompt, system=SYSTEM_PROMPT)
+        else:
+            result = _generate(url, model, prompt=f"{SYSTEM_PROMPT}\n\n{prompt}")
+        runs.append(result)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:11434")
+    parser.add_argument("--model", default="qwen2.5:1.5b")
+    args = parser.parse_args()
+
+    report = {
+        layout: dict(zip(["cold", "warm"], run_layout(args.url, args.model, layout)))
+        for layout in ("inline", "system")
+    }
+    print(json.dumps({"model": args.model, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import random
+
+WORDS = (
+    "factura cliente proveedor inventario almacén contabilidad asiento cuenta "
+    "comprobante nómina empleado activo fijo depreciación costo centro período "
+    "cierre reporte usuario permiso módulo configuración moneda tasa cambio banco "
+    "conciliación pago cobro documento registro saldo balance impuesto venta compra"
+).split()
+
+SYSTEMS = ["VER", "CON", "INV", "NOM", "FIN"]
+TOPICS = ["factura", "cierre", "almacen", "nomina", "banco", "activo", "reporte"]
+
+
+def _sentence(rng: random.Random, min_words: int = 6, max_words: int = 18) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def generate_question(rng: random.Random, number: int) -> str:
+    """
+    Generate one question block in the mf3.txt layout.
+    """
+    question_id = f"{rng.choice(SYSTEMS)}_{rng.choice(TOPICS)}_P{number}"
+    steps = "\n".join(
+        f"{i}. {_sentence(rng)}" for i in range(1, rng.randint(2, 6) + 1)
+    )
+    return (
+        f"ID: {question_id}\n"
+        f"Sct. Pregunta: ¿{_sentence(rng)[:-1]}?\n\n"
+        f"Sct. Respuesta: {_paragraph(rng, rng.randint(2, 8))}\n\n"
+        f"Sct. Pasos a Seguir:\n{steps}\n\n"
+        f"Sct. Observaciones: {'N/A' if rng.random() < 0.5 else _sentence(rng)}\n\n"
+    )
+
+
+def generate_corpus(path: str, questions: int = 1000, seed: int = 42) -> str:
+    """
+    Write a synthetic FAQ file with the given number of questions.
+
+    Args:
+        path (str): Output file.
+        questions (int): Number of questions.
+        seed (int): Random seed, so the same corpus is produced on every run.
+
+    Returns:
+        str: The output path.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as file:
+        for number in range(1, questions + 1):
+            file.write(generate_question(rng, number))
+    return path
@@ -0,0 +1,258 @@
+"""
+Offline benchmark of the ingestion and query paths.
+
+Everything runs locally: a stub Ollama server, the backend app served by
+uvicorn in a thread, an in-process vector store and a synthetic corpus.
+Results are printed (or written) as JSON so runs can be compared between
+commits.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --questions 2000 --output bench.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+import requests
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.stub_ollama import start_stub_server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def percentiles(samples: list[float]) -> dict:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+def start_backend(stub_url: str, port: int):
+    """
+    Serve backend/app.py with uvicorn in a background thread, wired to the stub.
+    """
+    host, stub_port = stub_url.rsplit("//", 1)[1].split(":")
+    os.environ.update(
+        {
+            "OLLAMA_LLM_URL": stub_url,
+            "URL_FOR_EMBED": host,
+            "PORT_FOR_EMBED": stub_port,
+            # Measure the embedding path itself, not the cache
+            "EMBED_CACHE_PATH": "",
+            "EMBED_CACHE_MEMORY_ITEMS": "0",
+        }
+    )
+    import uvicorn
+
+    from app import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def bench_chunking(corpus_path: str) -> tuple[dict, list[str], list[str]]:
+    from milvus import build_chunk_records, process_questions_file
+
+    size_mb = os.path.getsize(corpus_path) / 1e6
+    start = time.perf_counter()
+    questions = process_questions_file(corpus_path, max_length=450)
+    seconds = time.perf_counter() - start
+    ids, chunks = build_chunk_records(questions)
+    return (
+        {
+            "questions": len(questions),
+            "chunks": len(chunks),
+            "seconds": round(seconds, 4),
+            "chunks_per_sec": round(len(chunks) / seconds, 1),
+            "mb_per_sec": round(size_mb / seconds, 2),
+        },
+        ids,
+        chunks,
+    )
+
+
+def bench_embeddings(
+    backend_url: str, chunks: list[str], request_size: int
+) -> tuple[dict, list[list[float]]]:
+    vectors: list[list[float]] = []
+    start = time.perf_counter()
+    for i in range(0, len(chunks), request_size):
+        response = requests.post(
+            f"{backend_url}/generate-embeddings/",
+            json={"texts": chunks[i : i + request_size]},
+            timeout=600,
+        )
+        response.raise_for_status()
+        vectors.extend(embedding[0] for embedding in response.json()["embeddings"])
+    seconds = time.perf_counter() - start
+    return (
+        {
+            "texts": len(chunks),
+            "request_size": request_size,
+            "seconds": round(seconds, 4),
+            "texts_per_sec": round(len(chunks) / seconds, 1),
+        },
+        vectors,
+    )
+
+
+def bench_insert(store, ids, chunks, vectors, batch_size: int) -> dict:
+    from milvus import build_rows
+
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        store.insert(
+            build_rows(
+                ids[i : i + batch_size],
+                chunks[i : i + batch_size],
+                vectors[i : i + batch_size],
+            )
+        )
+    store.save()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": len(ids),
+        "batch_size": batch_size,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(len(ids) / seconds, 1),
+    }
+
+
+def bench_queries(
+    query: Callable[[str], None], questions: list[str], concurrency: int
+) -> dict:
+    def timed(question: str) -> float:
+        start = time.perf_counter()
+        query(question)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, questions))
+    seconds = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        **percentiles(latencies),
+        "qps": round(len(questions) / seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=1000, help="Corpus size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--request-size", type=int, default=256, help="Texts per /generate-embeddings/ call")
+    parser.add_argument("--insert-batch", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100, help="Queries per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated levels")
+    parser.add_argument("--vector-backend", choices=["numpy", "faiss"], default="numpy")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.002)
+    parser.add_argument("--generate-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--output", default=None, help="Write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="versat-bench-")
+    stub = start_stub_server(
+        embed_latency=args.embed_latency,
+        embed_latency_per_text=args.embed_latency_per_text,
+        generate_latency=args.generate_latency,
+        token_latency=args.token_latency,
+        tokens=args.tokens,
+    )
+    backend_port = _free_port()
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    server = start_backend(stub.url, backend_port)
+
+    from vector_store import get_vector_store
+
+    corpus_path = generate_corpus(
+        os.path.join(workdir, "mf3.txt"), args.questions, args.seed
+    )
+    chunking, ids, chunks = bench_chunking(corpus_path)
+    embedding, vectors = bench_embeddings(backend_url, chunks, args.request_size)
+    store = get_vector_store(
+        args.vector_backend, os.path.join(workdir, "store"), fresh=True
+    )
+    insert = bench_insert(store, ids, chunks, vectors, args.insert_batch)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=64)
+    session.mount("http://", adapter)
+
+    def query(question: str):
+        response = session.post(
+            f"{backend_url}/generate-embeddings/", json={"texts": [question]}, timeout=60
+        )
+        response.raise_for_status()
+        vector = response.json()["embeddings"][0][0]
+        hits = store.search([vector], limit=5, output_fields=["q_chunk"])[0]
+        context = "\n\n".join(hit["entity"]["q_chunk"] for hit in hits)
+        response = session.post(
+            f"{backend_url}/get_answer/",
+            json={"model": "stub", "prompt": f"{context}\n\nPregunta: {question}"},
+            timeout=600,
+        )
+        response.raise_for_status()
+
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    for level in (int(level) for level in args.concurrency.split(",")):
+        sample = rng.choice(len(chunks), size=args.queries)
+        questions = [chunks[i][:200] for i in sample]
+        queries.append(bench_queries(query, questions, level))
+
+    result = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": vars(args),
+        "chunking": chunking,
+        "embedding": embedding,
+        "insert": insert,
+        "query": queries,
+    }
+    server.should_exit = True
+    stub.shutdown()
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def deterministic_vector(text: str, dim: int = 768) -> list[float]:
+    """
+    Unit vector derived from the text hash: same text, same vector.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubOllama(ThreadingHTTPServer):
+    """
+    Minimal Ollama look-alike for /api/embed and /api/generate.
+
+    Latencies are simulated with sleeps: a fixed cost per call plus a cost per
+    embedded text or per generated token.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        dim: int = 768,
+        embed_latency: float = 0.01,
+        embed_latency_per_text: float = 0.002,
+        generate_latency: float = 0.05,
+        token_latency: float = 0.005,
+        tokens: int = 50,
+    ):
+        super().__init__(address, _Handler)
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.embed_latency_per_text = embed_latency_per_text
+        self.generate_latency = generate_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubOllama
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path in ("/api/tags", "/api/ps"):
+            self._send_json({"models": []})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/embed":
+            self._embed(body)
+        elif self.path == "/api/generate":
+            self._generate(body)
+        else:
+            self.send_error(404)
+
+    def _embed(self, body: dict):
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        stub = self.server
+        time.sleep(stub.embed_latency + stub.embed_latency_per_text * len(texts))
+        vectors = [deterministic_vector(text, stub.dim) for text in texts]
+        self._send_json({"model": body.get("model"), "embeddings": vectors})
+
+    def _generate(self, body: dict):
+        stub = self.server
+        time.sleep(stub.generate_latency)
+        words = [f"tok{i} " for i in range(stub.tokens)]
+        final = {
+            "model": body.get("model"),
+            "response": "",
+            "done": True,
+            "load_duration": 0,
+            "prompt_eval_count": len(body.get("prompt", "")) // 4,
+            "prompt_eval_duration": 0,
+            "eval_count": stub.tokens,
+            "eval_duration": int(stub.token_latency * stub.tokens * 1e9),
+        }
+        if not body.get("stream", True):
+            time.sleep(stub.token_latency * stub.tokens)
+            self._send_json({**final, "response": "".join(words)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for word in words:
+            time.sleep(stub.token_latency)
+            line = {"model": body.get("model"), "response": word, "done": False}
+            self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **options) -> StubOllama:
+    """
+    Start the stub in a background thread. Port 0 picks a free port.
+    """
+    server = StubOllama((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,253 @@
+"""
+File export and Milvus bulk import for very large loads.
+
+Instead of sending every row through insert calls, the ingestion pipeline
+writes the columns to files that Milvus imports on its own (bulk insert):
+
+    npy      <dir>/part-00001/q_id.npy, q_vector.npy, q_chunk.npy (one
+             directory per import call, the Milvus NumPy layout)
+    parquet  <dir>/part-00001.parquet (needs pyarrow)
+
+Milvus reads the files from its object storage (MinIO in docker-compose):
+they are uploaded with the `minio` package when installed, or can be copied
+into the bucket by hand and imported with --remote-prefix.
+
+Usage (from the backend directory):
+    python milvus.py --export-dir ./cache/bulk                 # only write files
+    python milvus.py --export-dir ./cache/bulk --bulk-import   # write, upload and import
+    python bulk_ingest.py --export-dir ./cache/bulk --remote-prefix bulk
+"""
+import argparse
+import os
+import time
+from typing import Optional
+
+import numpy as np
+from compact_vectors import EMBED_DIM, VECTOR_DIM, VECTOR_STORAGE, truncate
+from milvus_pool import MILVUS_COLLECTION, MILVUS_DB, MILVUS_URI
+from pymilvus import BulkInsertState, connections, utility
+
+# Rows written per file (and imported per bulk insert call)
+EXPORT_ROWS_PER_FILE = int(os.getenv("EXPORT_ROWS_PER_FILE", 100_000))
+
+# Object storage read by Milvus (the MinIO service of docker-compose)
+MINIO_ADDRESS = os.getenv("MINIO_ADDRESS", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "a-bucket")
+
+_FINISHED = (
+    BulkInsertState.ImportCompleted,
+    BulkInsertState.ImportFailed,
+    BulkInsertState.ImportFailedAndCleaned,
+)
+
+
+class ColumnExporter:
+    """
+    Ingestion sink that writes the batches to bulk import files.
+
+    It has the insert_columns/save interface of a VectorStore, so it can be
+    passed to ingestion.run_pipeline. Batches are buffered until
+    EXPORT_ROWS_PER_FILE rows, so memory is bounded by one file.
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        file_format: str = "npy",
+        rows_per_file: int = EXPORT_ROWS_PER_FILE,
+        dim: int = VECTOR_DIM,
+    ):
+        if file_format not in ("npy", "parquet"):
+            raise ValueError(f"Unknown export format: {file_format}")
+        if VECTOR_STORAGE != "float32":
+            raise ValueError("Bulk export only supports float32 vectors")
+        self.out_dir = out_dir
+        self.file_format = file_format
+        self.rows_per_file = rows_per_file
+        self.dim = dim
+        # Files of each part, relative to out_dir (one bulk insert call each)
+        self.parts: list[list[str]] = []
+        self.rows = 0
+        self._ids: list[str] = []
+        self._chunks: list[str] = []
+        self._vectors: list[np.ndarray] = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def insert_columns(self, ids: list[str], chunks: list[str], vectors: np.ndarray) -> int:
+        if not ids:
+            return 0
+        if self.dim != EMBED_DIM:
+            vectors = truncate(vectors, self.dim)
+        self._ids.extend(ids)
+        self._chunks.extend(chunks)
+        self._vectors.append(np.asarray(vectors, dtype=np.float32))
+        if len(self._ids) >= self.rows_per_file:
+            self._flush()
+        return len(ids)
+
+    def save(self):
+        self._flush()
+
+    def _flush(self):
+        if not self._ids:
+            return
+        name = f"part-{len(self.parts) + 1:05d}"
+        matrix = np.concatenate(self._vectors)
+        if self.file_format == "npy":
+            os.makedirs(os.path.join(self.out_dir, name), exist_ok=True)
+            files = []
+            for field, column in (
+                ("q_id", np.array(self._ids)),
+                ("q_vector", matrix),
+                ("q_chunk", np.array(self._chunks)),
+            ):
+                files.append(f"{name}/{field}.npy")
+                np.save(os.path.join(self.out_dir, files[-1]), column)
+        else:
+            files = [f"{name}.parquet"]
+            _write_parquet(
+                os.path.join(self.out_dir, files[0]), self._ids, self._chunks, matrix
+            )
+        self.parts.append(files)
+        self.rows += len(self._ids)
+        print(f"Exportados {len(self._ids)} registros a {name}")
+        self._ids, self._chunks, self._vectors = [], [], []
+
+
+def _write_parquet(path: str, ids: list[str], chunks: list[str], matrix: np.ndarray):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("El formato parquet necesita pyarrow (pip install pyarrow)")
+    rows, dim = matrix.shape
+    # List column built over the flat float32 buffer, without Python floats
+    offsets = pa.array(np.arange(0, (rows + 1) * dim, dim, dtype=np.int32))
+    vectors = pa.ListArray.from_arrays(offsets, pa.array(matrix.reshape(-1)))
+    table = pa.table(
+        {"q_id": pa.array(ids), "q_vector": vectors, "q_chunk": pa.array(chunks)}
+    )
+    pq.write_table(table, path)
+
+
+def upload_parts(out_dir: str, parts: list[list[str]], prefix: str) -> list[list[str]]:
+    """
+    Copy the exported files to the bucket Milvus reads from.
+
+    Returns:
+        list[list[str]]: The object paths of each part, for bulk_import.
+    """
+    try:
+        from minio import Minio
+    except ImportError:
+        raise SystemExit(
+            "Subir los archivos necesita el paquete minio (pip install minio). "
+            f"También se pueden copiar a mano al bucket {MINIO_BUCKET} e "
+            "importar con --remote-prefix."
+        )
+    client = Minio(
+        MINIO_ADDRESS,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=False,
+    )
+    remote_parts = []
+    for files in parts:
+        remote = []
+        for file in files:
+            name = f"{prefix.rstrip('/')}/{file}"
+            client.fput_object(MINIO_BUCKET, name, os.path.join(out_dir, file))
+            remote.append(name)
+        remote_parts.append(remote)
+    return remote_parts
+
+
+def bulk_import(
+    parts: list[list[str]],
+    collection_name: str = MILVUS_COLLECTION,
+    uri: str = MILVUS_URI,
+    db_name: str = MILVUS_DB,
+    poll_seconds: float = 5,
+    timeout: Optional[float] = None,
+) -> list[BulkInsertState]:
+    """
+    Start one bulk insert per part and wait until all of them finish.
+
+    Args:
+        parts (list[list[str]]): Object paths of the files of each part.
+
+    Returns:
+        list[BulkInsertState]: The final state of each import task.
+    """
+    alias = "bulk_import"
+    connections.connect(alias=alias, uri=uri, db_name=db_name)
+    try:
+        task_ids = [
+            utility.do_bulk_insert(collection_name, files, using=alias) for files in parts
+        ]
+        start = time.perf_counter()
+        while True:
+            states = [
+                utility.get_bulk_insert_state(task_id, using=alias) for task_id in task_ids
+            ]
+            finished = [state for state in states if state.state in _FINISHED]
+            rows = sum(state.row_count for state in states)
+            print(f"Importación: {len(finished)}/{len(states)} partes, {rows} registros")
+            if len(finished) == len(states):
+                break
+            if timeout is not None and time.perf_counter() - start > timeout:
+                print("Tiempo de espera agotado; las importaciones siguen en Milvus")
+                break
+            time.sleep(poll_seconds)
+        for state in states:
+            if state.state != BulkInsertState.ImportCompleted:
+                print(f"Parte {state.files} falló: {state.failed_reason}")
+        return states
+    finally:
+        connections.disconnect(alias)
+
+
+def export_parts(out_dir: str) -> list[list[str]]:
+    """
+    Find the parts already exported to `out_dir`.
+    """
+    parts = []
+    for name in sorted(os.listdir(out_dir)):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path) and name.startswith("part-"):
+            parts.append(
+                [f"{name}/{field}.npy" for field in ("q_id", "q_vector", "q_chunk")]
+            )
+        elif name.startswith("part-") and name.endswith(".parquet"):
+            parts.append([name])
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import exported files into Milvus")
+    parser.add_argument("--export-dir", required=True, help="Directory written by the export")
+    parser.add_argument("--collection", default=MILVUS_COLLECTION)
+    parser.add_argument(
+        "--remote-prefix",
+        default=None,
+        help="Files are already in the bucket under this prefix (no upload)",
+    )
+    args = parser.parse_args()
+
+    parts = export_parts(args.export_dir)
+    if not parts:
+        raise SystemExit(f"No hay archivos exportados en {args.export_dir}")
+    if args.remote_prefix is not None:
+        remote = [
+            [f"{args.remote_prefix.rstrip('/')}/{file}" for file in files] for files in parts
+        ]
+    else:
+        prefix = os.path.basename(args.export_dir.rstrip("/"))
+        remote = upload_parts(args.export_dir, parts, prefix)
+    bulk_import(remote, args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Compact vector storage with two-phase search.
+
+nomic-embed-text is trained with Matryoshka representation learning, so the
+first N dimensions of an embedding are an embedding on their own. The
+vector index can hold those truncated vectors, optionally as FLOAT16 or as
+1 bit per dimension. Searches then run in two phases: a coarse search on
+the compact index for `RERANK_FACTOR` times more candidates, and an exact
+cosine re-score of those candidates against the full-precision vectors,
+which live in a memory-mapped NumPy store next to the index, or in a second
+Milvus collection (`<collection>_full`) with the Milvus backend.
+
+Measure the recall/memory trade-off on the stored vectors (from the backend
+directory):
+    python compact_vectors.py --dims 768,512,256 --storages float32,float16,binary
+"""
+import asyncio
+import os
+import time
+from typing import Iterator, Optional, Union
+
+import numpy as np
+from metrics import RESCORE_MISSING, log_event
+from vector_store import MilvusVectorStore, NumpyVectorStore, VectorStore, normalize_rows
+
+# Dimension produced by the embedding model
+EMBED_DIM = int(os.getenv("EMBED_DIM", 768))
+# Dimensions kept in the vector index (Matryoshka prefix of the embedding)
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", EMBED_DIM))
+# "float32" (default), "float16" or "binary" (1 bit per dimension)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+# Coarse candidates fetched per requested hit before the exact re-score
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", 4))
+# Suffix of the Milvus collection holding the full-precision vectors
+FULL_COLLECTION_SUFFIX = os.getenv("FULL_COLLECTION_SUFFIX", "_full")
+
+STORAGES = ("float32", "float16", "binary")
+BYTES_PER_DIM = {"float32": 4.0, "float16": 2.0, "binary": 1 / 8}
+
+# Number of set bits of every byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def compact_enabled(dim: int = VECTOR_DIM, storage: str = VECTOR_STORAGE) -> bool:
+    return dim < EMBED_DIM or storage != "float32"
+
+
+def full_collection_name(collection_name: str) -> str:
+    return collection_name + FULL_COLLECTION_SUFFIX
+
+
+def validate(dim: int, storage: str):
+    if storage not in STORAGES:
+        raise ValueError(f"Unknown vector storage: {storage}")
+    if not 0 < dim <= EMBED_DIM:
+        raise ValueError(f"VECTOR_DIM must be between 1 and {EMBED_DIM}, got {dim}")
+    if storage == "binary" and dim % 8:
+        raise ValueError(f"Binary vectors need a multiple of 8 dimensions, got {dim}")
+
+
+def truncate(vectors, dim: int) -> np.ndarray:
+    """
+    Keep the first `dim` dimensions and re-normalize (Matryoshka truncation).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    return normalize_rows(vectors[:, :dim])
+
+
+def encode(vectors: np.ndarray, storage: str) -> np.ndarray:
+    """
+    Encode normalized float32 vectors for storage.
+
+    Binary vectors keep the sign of each dimension, packed 8 per byte.
+    """
+    if storage == "float16":
+        return vectors.astype(np.float16)
+    if storage == "binary":
+        return np.packbits(vectors > 0, axis=1)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def coarse_scores(matrix: np.ndarray, queries: np.ndarray, storage: str) -> np.ndarray:
+    """
+    Similarity of each query to each encoded row; higher is closer.
+
+    Binary rows are compared by Hamming distance, mapped to [-1, 1] like a
+    cosine. Float16 rows are scored in float32 blocks, since NumPy has no
+    fast float16 matrix product.
+    """
+    if storage == "binary":
+        packed = encode(queries, "binary")
+        bits = matrix.shape[1] * 8
+        scores = np.empty((len(packed), len(matrix)), dtype=np.float32)
+        for i, query in enumerate(packed):
+            distance = _POPCOUNT[np.bitwise_xor(matrix, query)].sum(axis=1)
+            scores[i] = 1 - 2 * distance / bits
+        return scores
+    if storage == "float16":
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), 8192):
+            block = np.asarray(matrix[start : start + 8192], dtype=np.float32)
+            scores[:, start : start + 8192] = queries @ block.T
+        return scores
+    return queries @ np.asarray(matrix).T
+
+
+def encode_for_milvus(vectors, storage: str) -> list:
+    """
+    Vectors in the format pymilvus expects for the field type of `storage`.
+    """
+    encoded = encode(np.asarray(vectors, dtype=np.float32), storage)
+    if storage == "binary":
+        return [row.tobytes() for row in encoded]
+    if storage == "float16":
+        return list(encoded)
+    return [list(map(float, row)) for row in encoded]
+
+
+def milvus_index_config(config: dict, storage: str = VECTOR_STORAGE) -> dict:
+    """
+    Adapt an index config to the field type. Binary fields only support the
+    BIN_* indexes and the HAMMING/JACCARD metrics.
+    """
+    if storage != "binary":
+        return config
+    return {
+        "index_type": "BIN_FLAT",
+        "metric_type": "HAMMING",
+        "params": {},
+        "search_params": {},
+    }
+
+
+class CompactNumpyVectorStore(NumpyVectorStore):
+    """
+    In-process coarse index over truncated float32/float16/binary vectors.
+
+    Expects vectors already truncated and normalized (see TwoPhaseVectorStore).
+    """
+
+    def __init__(self, path: str, storage: str = VECTOR_STORAGE, fresh: bool = False):
+        self.storage = storage
+        super().__init__(path, fresh)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return encode(normalize_rows(vectors), self.storage)
+
+    def _top_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = coarse_scores(self._matrix(), queries, self.storage)
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(scores, positions, axis=1)
+        order = np.argsort(-top, axis=1)
+        return (
+            np.take_along_axis(top, order, axis=1),
+            np.take_along_axis(positions, order, axis=1),
+        )
+
+
+class TwoPhaseVectorStore(VectorStore):
+    """
+    Coarse search on compact vectors, exact re-score on full-precision ones.
+
+    `coarse` holds the truncated (and possibly FLOAT16/binary) vectors and is
+    the only index kept in memory; `full` holds the original vectors (a
+    memory-mapped NumPy store or a Milvus collection) and is only read for
+    the re-scored candidates. Hits carry the exact cosine similarity as distance.
+
+    Raises RuntimeError on search when the coarse index returns candidates
+    but `full` is empty, since nothing could be re-scored.
+    """
+
+    def __init__(
+        self,
+        coarse: VectorStore,
+        full: Union[NumpyVectorStore, MilvusVectorStore],
+        dim: int = VECTOR_DIM,
+        rerank_factor: int = RERANK_FACTOR,
+    ):
+        self.coarse = coarse
+        self.full = full
+        self.dim = dim
+        self.rerank_factor = max(1, rerank_factor)
+
+    def __len__(self) -> int:
+        return len(self.full)
+
+    def _compact_rows(self, rows: list[dict]) -> list[dict]:
+        vectors = truncate([row["q_vector"] for row in rows], self.dim)
+        return [{**row, "q_vector": vector} for row, vector in zip(rows, vectors)]
+
+    def insert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        self.full.insert(rows)
+        return self.coarse.insert(self._compact_rows(rows))
+
+    def upsert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        self.full.upsert(rows)
+        return self.coarse.upsert(self._compact_rows(rows))
+
+    def insert_columns(self, ids: list[str], chunks: list[str], vectors: np.ndarray) -> int:
+        if not ids:
+            return 0
+        self.full.insert_columns(ids, chunks, vectors)
+        return self.coarse.insert_columns(ids, chunks, truncate(vectors, self.dim))
+
+    def delete(self, ids: list[str]) -> int:
+        self.full.delete(ids)
+        return self.coarse.delete(ids)
+
+    def records(self, batch_size: int = 1000) -> Iterator[tuple[str, str]]:
+        return self.full.records(batch_size)
+
+    def save(self):
+        self.coarse.save()
+        self.full.save()
+
+    def search(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        candidates = self.coarse.search(
+            truncate(queries, self.dim), limit * self.rerank_factor, output_fields
+        )
+        return self._rescore(queries, candidates, limit)
+
+    async def asearch(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        candidates = await self.coarse.asearch(
+            truncate(queries, self.dim), limit * self.rerank_factor, output_fields
+        )
+        return await asyncio.to_thread(self._rescore, queries, candidates, limit)
+
+    def _rescore(
+        self, queries: np.ndarray, candidates: list[list[dict]], limit: int
+    ) -> list[list[dict]]:
+        # Candidates missing from `full` (e.g. the coarse index was updated by
+        # another process) cannot get an exact score. They are kept, marked
+        # "rescored": False with their coarse score, after every re-scored hit
+        results = []
+        missing = 0
+        total = 0
+        for query, hits in zip(queries, candidates):
+            by_id = {hit["id"]: hit for hit in hits}
+            ids, matrix = self.full.get_vectors(list(by_id))
+            scores = matrix @ query if ids else np.zeros(0, dtype=np.float32)
+            order = np.argsort(-scores)[:limit]
+            rescored = [
+                {**by_id[ids[i]], "distance": float(scores[i]), "rescored": True}
+                for i in order
+            ]
+            found = set(ids)
+            unscored = [
+                {**hit, "rescored": False} for hit in hits if hit["id"] not in found
+            ]
+            missing += len(unscored)
+            total += len(hits)
+            results.append((rescored + unscored)[:limit])
+        if missing == total > 0 and len(self.full) == 0:
+            raise RuntimeError(
+                f"The full-precision vector store {self._full_name()} is empty "
+                f"but the compact index is not; re-run the ingestion"
+            )
+        if missing:
+            RESCORE_MISSING.inc(missing)
+            log_event("rescore_missing", candidates=missing, store=self._full_name())
+        return results
+
+    def _full_name(self) -> str:
+        if isinstance(self.full, MilvusVectorStore):
+            return self.full.collection_name
+        return self.full.path
+
+    def refresh(self):
+        self.coarse.refresh()
+        self.full.refresh()
+
+
+def get_compact_vector_store(
+    backend: str,
+    path: str,
+    client=None,
+    collection_name: Optional[str] = None,
+    fresh: bool = False,
+    dim: int = VECTOR_DIM,
+    storage: str = VECTOR_STORAGE,
+) -> TwoPhaseVectorStore:
+    """
+    Build the two-phase store for a backend. With Milvus both the coarse and
+    the full-precision vectors are collections, so every process sharing the
+    server sees them; otherwise the full-precision vectors are kept under
+    `<path>/full` and the in-process coarse index under `<path>/compact`.
+    """
+    from vector_store import MILVUS_COLLECTION
+
+    validate(dim, storage)
+    full: Union[NumpyVectorStore, MilvusVectorStore]
+    if backend == "milvus":
+        collection_name = collection_name or MILVUS_COLLECTION
+        coarse: VectorStore = MilvusVectorStore(client, collection_name, storage=storage)
+        full = MilvusVectorStore(client, full_collection_name(collection_name))
+    else:
+        full = NumpyVectorStore(os.path.join(path, "full"), fresh)
+        if backend == "faiss":
+            print("Los vectores compactos usan el índice NumPy en lugar de faiss")
+        coarse = CompactNumpyVectorStore(os.path.join(path, "compact"), storage, fresh)
+    return TwoPhaseVectorStore(coarse, full, dim)
+
+
+def evaluate(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    dims: list[int],
+    storages: list[str],
+    rerank_factor: int = RERANK_FACTOR,
+) -> list[dict]:
+    """
+    Recall@k, index memory and search time of each dim/storage combination.
+
+    The ground truth is the exact top-k over the full vectors. Both the
+    coarse-only recall and the recall after the exact re-score are reported.
+    """
+    full = normalize_rows(matrix)
+    queries = normalize_rows(queries)
+    exact = np.argpartition(-(queries @ full.T), k - 1, axis=1)[:, :k]
+    truth = [set(row) for row in exact]
+    candidates = k * max(1, rerank_factor)
+
+    results = []
+    for dim in dims:
+        for storage in storages:
+            validate(dim, storage)
+            index = encode(truncate(full, dim), storage)
+            compact_queries = truncate(queries, dim)
+
+            start = time.perf_counter()
+            scores = coarse_scores(index, compact_queries, storage)
+            top = np.argpartition(-scores, min(candidates, len(full)) - 1, axis=1)[
+                :, :candidates
+            ]
+            coarse_seconds = time.perf_counter() - start
+            coarse_top = np.take_along_axis(scores, top, axis=1)
+            coarse_k = np.take_along_axis(
+                top, np.argsort(-coarse_top, axis=1)[:, :k], axis=1
+            )
+            start = time.perf_counter()
+            reranked = []
+            for query, row in zip(queries, top):
+                exact_scores = full[row] @ query
+                reranked.append(row[np.argsort(-exact_scores)[:k]])
+            rerank_seconds = time.perf_counter() - start
+
+            def recall(found) -> float:
+                return float(
+                    np.mean([len(set(r) & t) / k for r, t in zip(found, truth)])
+                )
+
+            bytes_per_vector = dim * BYTES_PER_DIM[storage]
+            results.append(
+                {
+                    "dim": dim,
+                    "storage": storage,
+                    "bytes_per_vector": bytes_per_vector,
+                    "index_mb": round(bytes_per_vector * len(full) / 1e6, 2),
+                    "compression": round(EMBED_DIM * 4 / bytes_per_vector, 1),
+                    "coarse_recall": round(recall(coarse_k), 4),
+                    "recall": round(recall(reranked), 4),
+                    "coarse_ms_per_query": round(coarse_seconds / len(queries) * 1000, 3),
+                    "rerank_ms_per_query": round(rerank_seconds / len(queries) * 1000, 3),
+                }
+            )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from vector_store import VECTOR_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Measure the recall of compact vectors")
+    parser.add_argument(
+        "--source",
+        default=os.path.join(VECTOR_STORE_PATH, "full")
+        if os.path.exists(os.path.join(VECTOR_STORE_PATH, "full", "vectors.npy"))
+        else VECTOR_STORE_PATH,
+        help="Directory with the full-precision vectors.npy",
+    )
+    parser.add_argument("--dims", default="768,512,256,128")
+    parser.add_argument("--storages", default="float32,float16,binary")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    matrix = np.load(os.path.join(args.source, "vectors.npy"), mmap_mode="r")
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)
+    report = evaluate(
+        np.asarray(matrix, dtype=np.float32),
+        np.asarray(matrix[np.sort(sample)], dtype=np.float32),
+        args.k,
+        [int(dim) for dim in args.dims.split(",")],
+        args.storages.split(","),
+        args.rerank_factor,
+    )
+    for row in report:
+        print(
+            f"{row['dim']:4} {row['storage']:8} {row['index_mb']:8.2f} MB "
+            f"(x{row['compression']:5}) recall@{args.k} coarse={row['coarse_recall']:.3f} "
+            f"two-phase={row['recall']:.3f} "
+            f"{row['coarse_ms_per_query'] + row['rerank_ms_per_query']:.2f} ms/query"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
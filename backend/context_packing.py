@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import re
+from dataclasses import asdict, dataclass
+
+# Context tokens sent to the model when it has no budget of its own
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1024))
+# Per-model budgets, as JSON: {"qwen2.5:1.5b": 768, "qwen2.5:7b": 2048}
+CONTEXT_TOKEN_BUDGETS: dict = json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", "{}"))
+# Characters per token used to estimate lengths (Spanish text, Qwen tokenizer)
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", 3.5))
+
+# Longest overlap looked for between consecutive chunks; split_text_into_chunks
+# repeats up to `overlap` characters, twice when a section is split by sentence
+MAX_OVERLAP = 400
+# Shorter repeats of the tail inside a chunk are treated as a coincidence
+MIN_OVERLAP = 24
+# A question cut below this many tokens is dropped instead
+MIN_PARTIAL_TOKENS = 48
+
+# Chunk records are "<question id>" or "<question id>_<n>" (see milvus.question_records)
+_CHUNK_INDEX = re.compile(r"^(.*_P\d+)_(\d+)$")
+# Sentence end directly followed by more text (no space in between)
+_SENTENCE_END = re.compile(r"[.!?:](?=\S)")
+
+
+@dataclass
+class PackingStats:
+    hits: int = 0
+    questions: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    truncated: int = 0
+    dropped: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def token_budget(model: str) -> int:
+    return int(CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET))
+
+
+def question_id_of(record_id: str) -> str:
+    """
+    Map a chunk record ID back to the ID of its question.
+    """
+    match = _CHUNK_INDEX.match(record_id)
+    return match.group(1) if match else record_id
+
+
+def chunk_position(record_id: str) -> int:
+    """
+    Position of a chunk inside its question (1 for the first one).
+    """
+    match = _CHUNK_INDEX.match(record_id)
+    return int(match.group(2)) if match else 1
+
+
+def _seam(text: str, right: str, shortest: int = 1) -> int:
+    # Length of the longest prefix of `right` that `text` ends with; only
+    # prefixes ending with the last character of `text` can match
+    if not text:
+        return 0
+    end = right.rfind(text[-1], 0, min(len(text), len(right), MAX_OVERLAP))
+    while end + 1 >= shortest:
+        if text.endswith(right[: end + 1]):
+            return end + 1
+        end = right.rfind(text[-1], 0, end)
+    return 0
+
+
+def merge_overlap(left: str, right: str) -> str:
+    """
+    Join two consecutive chunks, dropping the text repeated at the seam.
+
+    split_text_into_chunks starts every chunk after the first with the tail
+    of the previous one, glued on without a separator. Chunks stored before
+    that tail was shortened to fit were cut at `max_length` instead, so
+    `left` may end mid-word before the point where the tail ends: the tail
+    is matched against the end of `left` and only its missing part is kept.
+    Chunks split by sentence repeat the tail once more before the next
+    sentence; that copy is dropped too. A chunk that starts a new section
+    has the tail glued straight onto it, so the blank line is put back.
+    """
+    if not left or not right.strip():
+        return left or right
+    # Nothing matches when `left` was cut right where the tail starts
+    rest = right[_seam(left, right) :]
+
+    # The second copy follows the first one, which may have been shortened
+    # to fit the chunk; otherwise it starts like the first one
+    probe = right.lstrip()[:MIN_OVERLAP]
+    start = 0
+    while 0 <= start <= MAX_OVERLAP:
+        size = _seam(left + rest[:start], rest[start:], MIN_OVERLAP)
+        if size:
+            return left + rest[:start] + rest[start + size :]
+        start = rest.find(probe, start + 1)
+
+    # A new section: a sentence end directly followed by a capital letter
+    # marks where the tail ends
+    glued = left[-1] + rest[:MAX_OVERLAP]
+    for match in _SENTENCE_END.finditer(glued):
+        following = glued[match.end()]
+        if following.isupper() or following in "¿¡":
+            end = match.end() - 1
+            return left + rest[:end] + "\n\n" + rest[end:]
+    return left + rest
+
+
+def _fit(text: str, tokens: int) -> str:
+    # Cut at the last sentence end that fits, or at a word boundary
+    limit = int(tokens * CHARS_PER_TOKEN)
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n\n"))
+    if end > limit // 2:
+        return cut[: end + 1].rstrip()
+    return cut.rsplit(" ", 1)[0].rstrip() + " …"
+
+
+def pack_context(hits: list[dict], budget: int) -> tuple[str, PackingStats]:
+    """
+    Assemble the prompt context from the retrieved hits.
+
+    Chunks of the same question are merged in document order, removing the
+    overlap added at ingestion; non-adjacent chunks are joined with "…".
+    Questions are ordered by their best score and added until the token
+    budget is spent; the last one that does not fit is cut at a sentence
+    boundary, or dropped if too little room is left.
+
+    Args:
+        hits (list[dict]): Hits with "id", "question_id", "score" and "chunk".
+        budget (int): Maximum context tokens.
+
+    Returns:
+        tuple: The context text and the packing stats.
+    """
+    stats = PackingStats(hits=len(hits))
+    groups: dict[str, dict] = {}
+    for hit in hits:
+        group = groups.setdefault(
+            hit["question_id"], {"score": hit["score"], "chunks": {}}
+        )
+        group["score"] = max(group["score"], hit["score"])
+        group["chunks"][chunk_position(hit["id"])] = hit["chunk"]
+        # As if every hit were pasted verbatim with its ID
+        stats.tokens_before += estimate_tokens(f"{hit['question_id']}\n{hit['chunk']}") + 1
+
+    blocks = []
+    remaining = budget
+    for question_id, group in sorted(
+        groups.items(), key=lambda item: item[1]["score"], reverse=True
+    ):
+        text = ""
+        previous = None
+        for position in sorted(group["chunks"]):
+            chunk = group["chunks"][position].strip()
+            if not text:
+                text = chunk
+            elif position == previous + 1:
+                text = merge_overlap(text, chunk)
+            else:
+                text += "\n…\n" + chunk
+            previous = position
+        block = f"{question_id}\n{text}"
+
+        tokens = estimate_tokens(block) + 1
+        if tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                stats.dropped += 1
+                continue
+            block = _fit(block, remaining - 1)
+            tokens = estimate_tokens(block) + 1
+            stats.truncated += 1
+        blocks.append(block)
+        remaining -= tokens
+
+    stats.questions = len(blocks)
+    context = "\n\n".join(blocks)
+    stats.tokens_after = estimate_tokens(context)
+    return context, stats
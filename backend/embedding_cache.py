@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+# Persistent tier. An empty path keeps the cache in memory only.
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./cache/embeddings.sqlite")
+# Maximum number of vectors held in the in-memory LRU tier
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", 20000))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text so that trivially different copies share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Content-addressed key for an embedding: sha256 of (model, normalized text).
+    """
+    payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache.
+
+    The memory tier is a bounded LRU of float32 arrays. The disk tier is a
+    SQLite table storing each vector as a raw float32 blob, so entries survive
+    restarts and re-ingestion of unchanged text costs no Ollama calls.
+    """
+
+    def __init__(
+        self,
+        path: str = EMBED_CACHE_PATH,
+        max_memory_items: int = EMBED_CACHE_MEMORY_ITEMS,
+    ):
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """
+        Look up the embeddings of several texts.
+
+        Args:
+            model (str): The embedding model name.
+            texts (list[str]): The texts to look up.
+
+        Returns:
+            list: One vector per text, or None where the cache has no entry.
+        """
+        keys = [cache_key(model, text) for text in texts]
+        found: dict[str, array] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            pending = [key for key in dict.fromkeys(keys) if key not in found]
+            from_disk = set()
+            if pending and self._db is not None:
+                for key, vector in self._read_disk(pending).items():
+                    found[key] = vector
+                    from_disk.add(key)
+                    self._remember(key, vector)
+
+            results: list[Optional[list[float]]] = []
+            for key in keys:
+                vector = found.get(key)
+                if vector is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    if key in from_disk:
+                        self.disk_hits += 1
+                    else:
+                        self.memory_hits += 1
+                    results.append(vector.tolist())
+        return results
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        """
+        Store the embeddings of several texts in both tiers.
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, text)
+                packed = array("f", vector)
+                self._remember(key, packed)
+                rows.append((key, model, len(packed), packed.tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, keys: list[str]) -> dict[str, array]:
+        found: dict[str, array] = {}
+        for i in range(0, len(keys), _SQL_BATCH):
+            batch = keys[i : i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(  # type: ignore
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch,
+            )
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector
+        return found
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from embedding_cache import EmbeddingCache
+from metrics import (
+    MICRO_BATCH_REQUESTS,
+    MICRO_BATCH_TEXTS,
+    MICRO_BATCH_WAIT_SECONDS,
+    log_event,
+)
+from ollama_client import DEFAULT_EMBED_MODEL, OllamaClient, get_ollama_client
+
+# Number of texts sent to Ollama in a single /api/embed call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+# Number of batches in flight at the same time for a single request
+EMBED_MAX_CONCURRENT_BATCHES = int(os.getenv("EMBED_MAX_CONCURRENT_BATCHES", 4))
+# Extra attempts for a failed batch before the whole request fails
+EMBED_BATCH_RETRIES = int(os.getenv("EMBED_BATCH_RETRIES", 2))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", 0.5))
+# Small requests are merged into shared calls of up to this many texts (<= 1 disables it)
+EMBED_MICRO_BATCH_MAX_SIZE = int(os.getenv("EMBED_MICRO_BATCH_MAX_SIZE", 64))
+# How long a merged call may wait for more requests while Ollama is busy
+EMBED_MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_MICRO_BATCH_MAX_WAIT_MS", 5))
+
+
+@dataclass
+class EmbeddingStats:
+    texts: int = 0
+    cache_hits: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def texts_per_sec(self) -> float:
+        return self.texts / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "texts_per_sec": round(self.texts_per_sec, 2)}
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, (httpx.TransportError, ValueError))
+
+
+@dataclass
+class _PendingRequest:
+    texts: list[str]
+    future: asyncio.Future
+    queued_at: float
+
+
+class MicroBatcher:
+    """
+    Merge concurrent small embedding requests into shared /api/embed calls.
+
+    Requests are queued; a worker takes whatever is waiting and sends it as a
+    single call, then hands each caller the slice of vectors for its texts.
+    When no call is in flight the worker sends immediately, so a lone request
+    pays no extra latency. While Ollama is busy it keeps collecting requests
+    for up to `max_wait` seconds or until `max_batch_size` texts are waiting.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], Awaitable[list[list[float]]]],
+        max_batch_size: int = EMBED_MICRO_BATCH_MAX_SIZE,
+        max_wait: float = EMBED_MICRO_BATCH_MAX_WAIT_MS / 1000,
+        max_in_flight: int = EMBED_MAX_CONCURRENT_BATCHES,
+    ):
+        self.embed = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_in_flight = max_in_flight
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def submit(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed `texts` as part of the next shared call.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()  # type: ignore
+        self._queue.put_nowait(  # type: ignore
+            _PendingRequest(texts, future, time.perf_counter())
+        )
+        return await future
+
+    async def aclose(self):
+        tasks = [task for task in [self._worker, *self._in_flight] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        self._loop = None
+
+    def _ensure_worker(self):
+        # The queue and the worker belong to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._in_flight = set()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        queue: asyncio.Queue = self._queue  # type: ignore
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0].texts)
+            deadline = self._loop.time() + self.max_wait  # type: ignore
+            while size < self.max_batch_size:
+                if not queue.empty():
+                    request = queue.get_nowait()
+                elif not self._in_flight:
+                    # Ollama is idle: waiting would only add latency
+                    break
+                else:
+                    timeout = deadline - self._loop.time()  # type: ignore
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(request)
+                size += len(request.texts)
+
+            await self._slots.acquire()  # type: ignore
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: list[_PendingRequest]):
+        try:
+            texts = [text for request in batch for text in request.texts]
+            now = time.perf_counter()
+            MICRO_BATCH_TEXTS.observe(len(texts))
+            MICRO_BATCH_REQUESTS.observe(len(batch))
+            for request in batch:
+                MICRO_BATCH_WAIT_SECONDS.observe(now - request.queued_at)
+            try:
+                vectors = await self.embed(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(
+                        f"Ollama returned {len(vectors)} embeddings for {len(texts)} texts"
+                    )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                return
+            offset = 0
+            for request in batch:
+                end = offset + len(request.texts)
+                # The caller may have gone away (e.g. a cancelled request)
+                if not request.future.done():
+                    request.future.set_result(vectors[offset:end])
+                offset = end
+        finally:
+            self._slots.release()  # type: ignore
+
+
+class EmbeddingEngine:
+    """
+    Split embedding requests into batches and run them concurrently.
+
+    Each batch is a single /api/embed call with a list input. Results are
+    reassembled in the original order, and a failing batch is retried on its
+    own instead of restarting the whole request. Texts found in the optional
+    cache are never sent to Ollama. Requests smaller than a micro-batch go
+    through a shared MicroBatcher, so concurrent questions share one call.
+    """
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        model: str = DEFAULT_EMBED_MODEL,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrent_batches: int = EMBED_MAX_CONCURRENT_BATCHES,
+        retries: int = EMBED_BATCH_RETRIES,
+        cache: Optional[EmbeddingCache] = None,
+        micro_batch_size: int = EMBED_MICRO_BATCH_MAX_SIZE,
+        micro_batch_wait: float = EMBED_MICRO_BATCH_MAX_WAIT_MS / 1000,
+    ):
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.retries = retries
+        self.batcher: Optional[MicroBatcher] = None
+        if micro_batch_size > 1:
+            self.batcher = MicroBatcher(
+                lambda texts: self.client.embed(texts, model=self.model),
+                max_batch_size=micro_batch_size,
+                max_wait=micro_batch_wait,
+                max_in_flight=max_concurrent_batches,
+            )
+
+    async def embed(
+        self, texts: list[str], batch_size: Optional[int] = None
+    ) -> list[list[float]]:
+        vectors, _ = await self.embed_with_stats(texts, batch_size)
+        return vectors
+
+    async def embed_with_stats(
+        self, texts: list[str], batch_size: Optional[int] = None
+    ) -> tuple[list[list[float]], EmbeddingStats]:
+        """
+        Embed a list of texts in concurrent batches.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            batch_size (int, optional): Overrides the configured batch size.
+
+        Returns:
+            tuple: The vectors (same order as `texts`) and the request stats.
+        """
+        start = time.perf_counter()
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+        if self.cache is not None:
+            vectors = await asyncio.to_thread(self.cache.get_many, self.model, texts)
+
+        # Embed each distinct missing text once
+        missing: dict[str, list[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(text, []).append(i)
+        pending = list(missing)
+
+        size = max(1, batch_size or self.batch_size)
+        batches = [pending[i : i + size] for i in range(0, len(pending), size)]
+        stats = EmbeddingStats(
+            texts=len(texts),
+            cache_hits=len(texts) - sum(len(idx) for idx in missing.values()),
+            batches=len(batches),
+        )
+        slots = asyncio.Semaphore(self.max_concurrent_batches)
+        # Large requests already fill whole batches on their own
+        shared = self.batcher is not None and len(pending) < self.batcher.max_batch_size
+
+        async def run(batch: list[str]) -> list[list[float]]:
+            async with slots:
+                return await self._embed_batch(batch, stats, shared)
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        embedded = [vector for result in results for vector in result]
+        for text, vector in zip(pending, embedded):
+            for i in missing[text]:
+                vectors[i] = vector
+        if self.cache is not None and embedded:
+            await asyncio.to_thread(self.cache.put_many, self.model, pending, embedded)
+        stats.seconds = time.perf_counter() - start
+        return vectors, stats  # type: ignore
+
+    async def _embed_batch(
+        self, batch: list[str], stats: EmbeddingStats, shared: bool = False
+    ) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                if shared:
+                    vectors = await self.batcher.submit(batch)  # type: ignore
+                else:
+                    vectors = await self.client.embed(batch, model=self.model)
+                if len(vectors) != len(batch):
+                    raise ValueError(
+                        f"Ollama returned {len(vectors)} embeddings for {len(batch)} texts"
+                    )
+                return vectors
+            except Exception as e:
+                if attempt >= self.retries or not _is_retryable(e):
+                    raise
+                attempt += 1
+                stats.retries += 1
+                log_event(
+                    "embed_retry",
+                    texts=len(batch),
+                    attempt=attempt,
+                    retries=self.retries,
+                    error=str(e),
+                )
+                await asyncio.sleep(EMBED_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+_engine: Optional[EmbeddingEngine] = None
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """
+    Return the process-wide embedding engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        _engine = EmbeddingEngine(get_ollama_client(), cache=EmbeddingCache())
+    return _engine
+
+
+async def close_embedding_engine():
+    global _engine
+    if _engine is not None:
+        if _engine.batcher is not None:
+            await _engine.batcher.aclose()
+        _engine = None
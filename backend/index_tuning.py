@@ -0,0 +1,466 @@
+"""
+Tune the Milvus vector index of a collection.
+
+The vectors of the collection are copied into a scratch collection, where
+every candidate index (FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ and HNSW over a
+parameter grid) is built in turn. Each index/search-parameter pair is
+measured for recall@k against exact search and for latency and QPS. The
+Pareto-optimal pairs are kept, and the fastest one reaching the target
+recall is written to INDEX_CONFIG_PATH, where create_index and the searches
+pick it up.
+
+Usage (from the backend directory):
+    python index_tuning.py --collection sarasola --k 5 --target-recall 0.95
+"""
+import json
+import math
+import os
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+from pymilvus import DataType, MilvusClient
+
+# Tuned index and search parameters, written by this module's command
+INDEX_CONFIG_PATH = os.getenv("INDEX_CONFIG_PATH", "./cache/index_config.json")
+
+# Most hits a search may ask for per query (Milvus caps topk at 16384); the
+# API validates `limit` against it and tuning checks every candidate with it
+SEARCH_MAX_LIMIT = 1024
+
+# Used until the collection has been tuned
+DEFAULT_INDEX_CONFIG = {
+    "index_type": "IVF_SQ8",
+    "metric_type": "COSINE",
+    "params": {"nlist": 256},
+    "search_params": {"nprobe": 32},
+}
+
+_config_cache: dict = {}
+
+
+def load_index_config(path: str = INDEX_CONFIG_PATH) -> dict:
+    """
+    Return the tuned index config, or the default one if there is none.
+
+    The file is re-read only when its mtime changes.
+
+    Returns:
+        dict: {"index_type", "metric_type", "params", "search_params"}.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return DEFAULT_INDEX_CONFIG
+    cached = _config_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            config = {key: data[key] for key in DEFAULT_INDEX_CONFIG}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Configuración de índice inválida en {path}: {e}")
+            config = DEFAULT_INDEX_CONFIG
+        cached = (mtime, config)
+        _config_cache[path] = cached
+    return cached[1]
+
+
+def search_params(config: Optional[dict] = None, limit: Optional[int] = None) -> dict:
+    """
+    Milvus `search_params` for the configured index.
+
+    Args:
+        config (dict, optional): Index config. Defaults to load_index_config().
+        limit (int, optional): Hits the search asks for. HNSW rejects an `ef`
+            below it, so the tuned `ef` is raised to the limit when needed.
+    """
+    config = config or load_index_config()
+    params = dict(config["search_params"])
+    if limit and "ef" in params:
+        params["ef"] = max(int(params["ef"]), limit)
+    return {"metric_type": config["metric_type"], "params": params}
+
+
+def build_index(
+    client: MilvusClient,
+    collection_name: str,
+    field_name: str = "q_vector",
+    config: Optional[dict] = None,
+):
+    """
+    Create the vector index of a collection from a config.
+
+    Args:
+        client (MilvusClient): Client using the right database.
+        collection_name (str): The collection.
+        field_name (str): The vector field.
+        config (dict, optional): Index config. Defaults to load_index_config().
+    """
+    config = config or load_index_config()
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(
+        field_name=field_name,
+        index_type=config["index_type"],
+        metric_type=config["metric_type"],
+        # add_index writes index_type/metric_type into the dict it gets
+        params=dict(config["params"]),
+    )
+    client.create_index(collection_name=collection_name, index_params=index_params)  # type: ignore
+
+
+def candidate_grid(rows: int, dim: int, k: int) -> Iterator[tuple[str, dict, list[dict]]]:
+    """
+    Candidate indexes for a collection of `rows` vectors.
+
+    The IVF nlist values are centred on sqrt(rows), the usual rule of thumb,
+    so small corpora are not over-partitioned.
+
+    Yields:
+        tuple: (index type, build params, list of search params).
+    """
+    yield "FLAT", {}, [{}]
+
+    root = max(1, int(math.sqrt(rows)))
+    nlists = sorted({max(1, min(65536, n)) for n in (root // 2, root, root * 2, root * 4)})
+    for nlist in nlists:
+        nprobes = [{"nprobe": n} for n in (1, 2, 4, 8, 16, 32, 64) if n <= nlist]
+        yield "IVF_FLAT", {"nlist": nlist}, nprobes
+        yield "IVF_SQ8", {"nlist": nlist}, nprobes
+        # PQ needs `m` to divide the dimension; skip tiny partitions it cannot train
+        if rows >= 256 * 4:
+            for m in (dim // 16, dim // 8):
+                if m and dim % m == 0:
+                    yield "IVF_PQ", {"nlist": nlist, "m": m, "nbits": 8}, nprobes
+
+    efs = [{"ef": ef} for ef in (16, 32, 64, 128, 256) if ef >= k]
+    for M in (8, 16, 32):
+        yield "HNSW", {"M": M, "efConstruction": 200}, efs
+
+
+def fetch_vectors(
+    client: MilvusClient, collection_name: str, batch_size: int = 1000
+) -> tuple[list[str], np.ndarray]:
+    """
+    Read every (q_id, q_vector) of a collection.
+    """
+    client.load_collection(collection_name)  # type: ignore
+    iterator = client.query_iterator(  # type: ignore
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter='q_id != ""',
+        output_fields=["q_id", "q_vector"],
+    )
+    ids: list[str] = []
+    vectors: list[list[float]] = []
+    while True:
+        batch = iterator.next()
+        if not batch:
+            iterator.close()
+            break
+        for record in batch:
+            ids.append(record["q_id"])
+            vectors.append(record["q_vector"])
+    return ids, np.asarray(vectors, dtype=np.float32)
+
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the exact top-k cosine neighbours of each query.
+    """
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    scores = normalize(queries) @ normalize(matrix).T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def pareto_front(results: list[dict]) -> list[dict]:
+    """
+    Results not dominated by another one with higher-or-equal recall and
+    lower-or-equal p95 latency. Sorted by latency.
+    """
+    front = []
+    for result in results:
+        dominated = any(
+            other["recall"] >= result["recall"]
+            and other["p95_ms"] <= result["p95_ms"]
+            and (other["recall"] > result["recall"] or other["p95_ms"] < result["p95_ms"])
+            for other in results
+        )
+        if not dominated:
+            front.append(result)
+    return sorted(front, key=lambda result: result["p95_ms"])
+
+
+def choose(front: list[dict], target_recall: float) -> dict:
+    """
+    The fastest Pareto-optimal result reaching the target recall, or the one
+    with the best recall if none does.
+    """
+    reaching = [result for result in front if result["recall"] >= target_recall]
+    if reaching:
+        return min(reaching, key=lambda result: result["p95_ms"])
+    return max(front, key=lambda result: result["recall"])
+
+
+def _create_scratch_collection(
+    client: MilvusClient, collection_name: str, ids: list[str], matrix: np.ndarray
+):
+    # Imported here: milvus imports this module
+    from milvus import Q_ID_MAX_LENGTH
+
+    if client.has_collection(collection_name):  # type: ignore
+        client.drop_collection(collection_name)  # type: ignore
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)  # type: ignore
+    schema.add_field(  # type: ignore
+        "q_id", DataType.VARCHAR, is_primary=True, max_length=Q_ID_MAX_LENGTH
+    )
+    schema.add_field("q_vector", DataType.FLOAT_VECTOR, dim=matrix.shape[1])  # type: ignore
+    client.create_collection(collection_name=collection_name, schema=schema)  # type: ignore
+    for i in range(0, len(ids), 1000):
+        client.insert(  # type: ignore
+            collection_name=collection_name,
+            data=[
+                {"q_id": q_id, "q_vector": vector.tolist()}
+                for q_id, vector in zip(ids[i : i + 1000], matrix[i : i + 1000])
+            ],
+        )
+    client.flush(collection_name)  # type: ignore
+
+
+def _measure(
+    client: MilvusClient,
+    collection_name: str,
+    queries: np.ndarray,
+    truth: list[set],
+    k: int,
+    params: dict,
+    max_limit: int = SEARCH_MAX_LIMIT,
+) -> dict:
+    search = {"metric_type": "COSINE", "params": params}
+
+    # Latency: one query per call, as the application searches
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        client.search(  # type: ignore
+            collection_name=collection_name,
+            anns_field="q_vector",
+            data=[query.tolist()],
+            limit=k,
+            search_params=search,
+        )
+        latencies.append(time.perf_counter() - start)
+
+    # Throughput and recall: batched queries
+    start = time.perf_counter()
+    hits = []
+    for i in range(0, len(queries), 100):
+        hits.extend(
+            client.search(  # type: ignore
+                collection_name=collection_name,
+                anns_field="q_vector",
+                data=[query.tolist() for query in queries[i : i + 100]],
+                limit=k,
+                search_params=search,
+            )
+        )
+    seconds = time.perf_counter() - start
+
+    recall = np.mean(
+        [
+            # Milvus Lite names the key after the primary field
+            len({hit.get("id", hit.get("q_id")) for hit in query_hits} & expected)
+            / len(expected)
+            for query_hits, expected in zip(hits, truth)
+        ]
+    )
+    # The tuned params are used for every search, up to the largest limit
+    # the API accepts (search_params raises HNSW's ef to it); fails if Milvus
+    # rejects them
+    client.search(  # type: ignore
+        collection_name=collection_name,
+        anns_field="q_vector",
+        data=[queries[0].tolist()],
+        limit=max_limit,
+        search_params=search_params(
+            {"metric_type": "COSINE", "search_params": params}, max_limit
+        ),
+    )
+
+    values = np.asarray(latencies) * 1000
+    return {
+        "recall": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "qps": round(len(queries) / seconds, 1),
+    }
+
+
+def tune(
+    client: MilvusClient,
+    collection_name: str,
+    k: int = 5,
+    queries: int = 200,
+    target_recall: float = 0.95,
+    seed: int = 42,
+    max_limit: int = SEARCH_MAX_LIMIT,
+) -> dict:
+    """
+    Benchmark every candidate index on a copy of a collection.
+
+    Queries are a random sample of the stored vectors; their exact top-k
+    (which includes themselves) is the ground truth for every index alike.
+
+    Args:
+        client (MilvusClient): Client using the database of the collection.
+        collection_name (str): The collection to tune.
+        k (int): Neighbours per query (the application's search limit).
+        queries (int): Number of sampled queries.
+        target_recall (float): Minimum recall@k of the chosen config.
+        seed (int): Seed of the query sample.
+        max_limit (int): Largest search limit in use; every candidate must
+            also accept a search this large.
+
+    Returns:
+        dict: The chosen config plus the "report" (results and Pareto front).
+    """
+    ids, matrix = fetch_vectors(client, collection_name)
+    if len(ids) <= k:
+        raise ValueError(f"The collection {collection_name} has only {len(ids)} vectors")
+    print(f"{len(ids)} vectores de dimensión {matrix.shape[1]}")
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(ids), size=min(queries, len(ids)), replace=False)
+    query_vectors = matrix[sample]
+    truth = [
+        {ids[int(position)] for position in row}
+        for row in exact_top_k(matrix, query_vectors, k)
+    ]
+
+    scratch = f"{collection_name}_tuning"
+    _create_scratch_collection(client, scratch, ids, matrix)
+    results = []
+    try:
+        for index_type, params, search_grid in candidate_grid(len(ids), matrix.shape[1], k):
+            config = {
+                "index_type": index_type,
+                "metric_type": "COSINE",
+                "params": params,
+            }
+            client.release_collection(scratch)  # type: ignore
+            for index_name in client.list_indexes(scratch):  # type: ignore
+                client.drop_index(scratch, index_name)  # type: ignore
+            start = time.perf_counter()
+            try:
+                build_index(client, scratch, config={**config, "search_params": {}})
+                client.load_collection(scratch)  # type: ignore
+            except Exception as e:
+                print(f"{index_type} {params}: no se pudo construir ({e})")
+                continue
+            build_seconds = round(time.perf_counter() - start, 3)
+
+            for search in search_grid:
+                try:
+                    measured = _measure(
+                        client, scratch, query_vectors, truth, k, search, max_limit
+                    )
+                except Exception as e:
+                    print(f"{index_type} {params} {search}: búsqueda rechazada ({e})")
+                    continue
+                result = {
+                    **config,
+                    "search_params": search,
+                    "build_seconds": build_seconds,
+                    **measured,
+                }
+                results.append(result)
+                print(
+                    f"{index_type:8} {json.dumps(params):40} {json.dumps(search):14} "
+                    f"recall@{k}={measured['recall']:.3f} p95={measured['p95_ms']:.2f}ms "
+                    f"qps={measured['qps']:.0f}"
+                )
+    finally:
+        client.drop_collection(scratch)  # type: ignore
+
+    if not results:
+        raise RuntimeError("No candidate index could be built")
+    front = pareto_front(results)
+    chosen = choose(front, target_recall)
+    return {
+        **{key: chosen[key] for key in DEFAULT_INDEX_CONFIG},
+        "report": {
+            "collection": collection_name,
+            "rows": len(ids),
+            "k": k,
+            "queries": len(query_vectors),
+            "target_recall": target_recall,
+            "max_limit": max_limit,
+            "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "chosen": chosen,
+            "pareto": front,
+            "results": results,
+        },
+    }
+
+
+def write_index_config(config: dict, path: str = INDEX_CONFIG_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(config, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from milvus_pool import MILVUS_COLLECTION, MILVUS_DB, MILVUS_URI
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uri", default=MILVUS_URI)
+    parser.add_argument("--db", default=MILVUS_DB)
+    parser.add_argument("--collection", default=MILVUS_COLLECTION)
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=200, help="Sampled queries")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument(
+        "--max-limit",
+        type=int,
+        default=SEARCH_MAX_LIMIT,
+        help="Largest search limit every candidate must accept",
+    )
+    parser.add_argument("--output", default=INDEX_CONFIG_PATH)
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Rebuild the index of the collection with the chosen config",
+    )
+    args = parser.parse_args()
+
+    client = MilvusClient(uri=args.uri)
+    client.using_database(args.db)  # type: ignore
+    config = tune(
+        client,
+        args.collection,
+        args.k,
+        args.queries,
+        args.target_recall,
+        max_limit=args.max_limit,
+    )
+    write_index_config(config, args.output)
+    chosen = config["report"]["chosen"]
+    print(
+        f"Configuración elegida: {chosen['index_type']} {chosen['params']} "
+        f"{chosen['search_params']} (recall@{args.k}={chosen['recall']}, "
+        f"p95={chosen['p95_ms']}ms) -> {args.output}"
+    )
+
+    if args.apply:
+        client.release_collection(args.collection)  # type: ignore
+        for index_name in client.list_indexes(args.collection):  # type: ignore
+            client.drop_index(args.collection, index_name)  # type: ignore
+        build_index(client, args.collection, config=config)
+        client.load_collection(args.collection)  # type: ignore
+        print("Índice reconstruido.")
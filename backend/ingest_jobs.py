@@ -0,0 +1,495 @@
+"""
+Background ingestion jobs with per-batch checkpoints.
+
+Every job keeps its files in INGEST_JOBS_PATH/<job id>/:
+
+    records.ndjson  the input, one {"id", "text"} question per line
+    job.json        status and checkpoint (batches already inserted)
+
+Workers run the streaming pipeline of ingestion.py over the records. Batches
+are deterministic (same records, same batch size), so a job that stopped,
+failed or was interrupted by a restart resumes after its last checkpoint.
+Rows are upserted, so a batch inserted again after a crash replaces itself.
+"""
+import asyncio
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Iterator, Optional
+
+import numpy as np
+from answer_cache import answer_cache
+from embeddings import get_embedding_engine
+from ingestion import PipelineStats, iter_chunk_batches, run_pipeline
+from milvus import (
+    clean_question_text,
+    create_index,
+    create_schema,
+    split_question_blocks,
+    split_text_into_chunks,
+)
+from milvus_pool import MILVUS_COLLECTION, get_milvus_pool
+from rag import get_search_store
+from vector_store import (
+    VECTOR_BACKEND,
+    MilvusVectorStore,
+    VectorStore,
+    insert_batch_rows,
+)
+
+# Directory of the job files; keep it on a volume so jobs survive restarts
+INGEST_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", "./cache/ingest_jobs")
+# Jobs run at the same time
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+# Batches between checkpoints
+INGEST_CHECKPOINT_BATCHES = int(os.getenv("INGEST_CHECKPOINT_BATCHES", 1))
+# In-process stores (numpy/faiss) rewrite all their files on save, so they are
+# only checkpointed once they have grown by this fraction since the last save:
+# the total I/O of a job stays linear in its size instead of quadratic
+INGEST_CHECKPOINT_GROWTH = float(os.getenv("INGEST_CHECKPOINT_GROWTH", 0.25))
+
+# Statuses of a job that has not finished; they are picked up again at startup
+PENDING = ("queued", "running")
+
+
+class JobStopped(Exception):
+    """
+    Raised from the pipeline to stop a job (cancelled or shutting down).
+    """
+
+
+class InvalidRecord(ValueError):
+    def __init__(self, line: int, reason: str):
+        super().__init__(f"Línea {line}: {reason}")
+        self.line = line
+
+
+@dataclass
+class IngestJob:
+    id: str
+    source: str  # "documents" or "ndjson"
+    batch_size: int = 64
+    max_length: int = 450
+    overlap: int = 100
+    status: str = "queued"  # queued, running, completed, failed, cancelled
+    records: int = 0
+    total_chunks: Optional[int] = None
+    total_batches: Optional[int] = None
+    # Checkpoint: batches inserted (and saved) so far
+    batches_done: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def chunks_done(self) -> int:
+        # Every batch but the last one is full
+        done = self.batches_done * self.batch_size
+        return min(done, self.total_chunks) if self.total_chunks is not None else done
+
+
+class _RunProgress:
+    # Throughput of the current run (batches resumed from a checkpoint excluded)
+    def __init__(self, start_batches: int):
+        self.start = time.perf_counter()
+        self.start_batches = start_batches
+
+
+class _Upserter:
+    """
+    insert_columns/save interface over VectorStore.upsert, so a batch replayed
+    after a restart replaces its rows instead of duplicating them.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+        # Milvus persists every upsert; the in-process stores only on save().
+        # A two-phase store saves whole files when its full vectors are local
+        self.saves_whole_store = not isinstance(
+            getattr(store, "full", store), MilvusVectorStore
+        )
+        # Rows written since the last save, and IDs not yet invalidated in
+        # the answer cache
+        self.unsaved = 0
+        self._changed: list[str] = []
+
+    def take_changed(self) -> list[str]:
+        changed, self._changed = self._changed, []
+        return changed
+
+    def checkpoint_due(self) -> bool:
+        if not self.saves_whole_store:
+            return True
+        return self.unsaved >= INGEST_CHECKPOINT_GROWTH * len(self.store)  # type: ignore
+
+    def insert_columns(self, ids: list[str], chunks: list[str], vectors: np.ndarray) -> int:
+        # Recorded first: a failed upsert may still have changed some rows
+        self._changed.extend(ids)
+        self.unsaved += len(ids)
+        step = insert_batch_rows(vectors, chunks)
+        upserted = 0
+        for start in range(0, len(ids), step):
+            end = start + step
+            upserted += self.store.upsert(
+                [
+                    {"q_id": q_id, "q_vector": vector, "q_chunk": chunk}
+                    for q_id, chunk, vector in zip(
+                        ids[start:end], chunks[start:end], vectors[start:end]
+                    )
+                ]
+            )
+        return upserted
+
+    def save(self):
+        # run_pipeline saves again after the last checkpoint
+        if self.unsaved:
+            self.store.save()
+            self.unsaved = 0
+
+
+async def _embed(chunks: list[str]) -> list[list[float]]:
+    return await get_embedding_engine().embed(chunks)
+
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Split a byte stream into lines, whatever the size of its pieces
+    pending = b""
+    async for piece in body:
+        pending += piece
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def document_records(name: str, content: str) -> Iterator[dict]:
+    """
+    Records of a questions document ("ID: ..." blocks). Question IDs are
+    prefixed with the document name, as in ingestion.iter_directory_questions.
+    """
+    doc_id = os.path.splitext(name)[0]
+    for block in split_question_blocks(content):
+        id_match = re.search(r"ID:\s*(\S+)", block)
+        if id_match:
+            yield {"id": f"{doc_id}/{id_match.group(1)}", "text": block.strip()}
+
+
+def parse_record(line: str, number: int) -> Optional[dict]:
+    """
+    Validate one NDJSON line: {"id": "...", "text": "..."}. Blank lines give None.
+
+    Raises:
+        InvalidRecord: The line is not a JSON object with string id and text.
+    """
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise InvalidRecord(number, f"JSON inválido ({e.msg})")
+    if not isinstance(record, dict):
+        raise InvalidRecord(number, "se esperaba un objeto")
+    if not isinstance(record.get("id"), str) or not record["id"]:
+        raise InvalidRecord(number, "falta el campo 'id'")
+    if not isinstance(record.get("text"), str):
+        raise InvalidRecord(number, "falta el campo 'text'")
+    return {"id": record["id"], "text": record["text"]}
+
+
+class IngestJobs:
+    """
+    Queue of ingestion jobs served by INGEST_WORKERS threads.
+
+    Jobs write into the store used by /search and /ask (rag.get_search_store),
+    embedding through the backend's own EmbeddingEngine on the event loop.
+    """
+
+    def __init__(self, path: str = INGEST_JOBS_PATH, workers: int = INGEST_WORKERS):
+        self.path = path
+        self.workers = max(1, workers)
+        self.jobs: dict[str, IngestJob] = {}
+        self._progress: dict[str, _RunProgress] = {}
+        self._cancelled: set[str] = set()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.path, job_id)
+
+    def _records_path(self, job_id: str) -> str:
+        return os.path.join(self._dir(job_id), "records.ndjson")
+
+    def _save(self, job: IngestJob):
+        # Replaced atomically, so a crash leaves the previous checkpoint
+        path = os.path.join(self._dir(job.id), "job.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(asdict(job), file)
+        os.replace(path + ".tmp", path)
+
+    def _load(self):
+        if not os.path.isdir(self.path):
+            return
+        for job_id in sorted(os.listdir(self.path)):
+            path = os.path.join(self._dir(job_id), "job.json")
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as file:
+                job = IngestJob(**json.load(file))
+            self.jobs[job.id] = job
+
+    def _iter_records(self, job_id: str) -> Iterator[dict]:
+        with open(self._records_path(job_id), "r", encoding="utf-8") as file:
+            for line in file:
+                yield json.loads(line)
+
+    def _new_job(self, source: str, **options) -> IngestJob:
+        job = IngestJob(id=uuid.uuid4().hex, source=source, **options)
+        os.makedirs(self._dir(job.id), exist_ok=True)
+        return job
+
+    def _submit(self, job: IngestJob) -> IngestJob:
+        self._save(job)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job.id)
+        print(f"Trabajo de ingesta {job.id}: {job.records} registros en cola")
+        return job
+
+    def submit_documents(self, documents: list[tuple[str, str]], **options) -> IngestJob:
+        """
+        Queue the questions of some documents, given as (name, content) pairs.
+        """
+        job = self._new_job("documents", **options)
+        with open(self._records_path(job.id), "w", encoding="utf-8") as file:
+            for name, content in documents:
+                for record in document_records(name, content):
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    job.records += 1
+        return self._submit(job)
+
+    async def submit_ndjson(self, body: AsyncIterator[bytes], **options) -> IngestJob:
+        """
+        Queue an NDJSON stream of {"id", "text"} records (e.g. the request
+        body). It is written to disk as it arrives, so its size is not
+        bounded by memory.
+
+        Raises:
+            InvalidRecord: A line is malformed; nothing is queued.
+        """
+        job = self._new_job("ndjson", **options)
+        try:
+            with open(self._records_path(job.id), "w", encoding="utf-8") as file:
+                number = 0
+                async for line in _lines(body):
+                    number += 1
+                    record = parse_record(line.decode("utf-8"), number)
+                    if record is not None:
+                        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        job.records += 1
+        except (InvalidRecord, UnicodeDecodeError):
+            self._remove_files(job.id)
+            raise
+        return self._submit(job)
+
+    def _remove_files(self, job_id: str):
+        for name in ("records.ndjson", "job.json"):
+            path = os.path.join(self._dir(job_id), name)
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(self._dir(job_id))
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> IngestJob:
+        """
+        Stop a job after its current batch. It keeps its checkpoint.
+        """
+        job = self.jobs[job_id]
+        with self._lock:
+            if job.status in PENDING:
+                self._cancelled.add(job_id)
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    self._save(job)
+        return job
+
+    def resume(self, job_id: str) -> IngestJob:
+        """
+        Queue a failed or cancelled job again, from its last checkpoint.
+        """
+        job = self.jobs[job_id]
+        with self._lock:
+            if job.status in ("failed", "cancelled"):
+                self._cancelled.discard(job_id)
+                job.status = "queued"
+                job.error = None
+                self._save(job)
+                self._queue.put(job_id)
+        return job
+
+    def start(self):
+        """
+        Start the workers (from inside the event loop) and queue again the
+        jobs a previous run left unfinished.
+        """
+        if self._threads:
+            return
+        self._loop = asyncio.get_running_loop()
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+        for job in sorted(self.jobs.values(), key=lambda job: job.created):
+            if job.status in PENDING:
+                if job.status == "running":
+                    print(f"Reanudando el trabajo de ingesta {job.id} en el lote {job.batches_done}")
+                job.status = "queued"
+                self._queue.put(job.id)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the workers after their current batch; running jobs stay
+        pending and resume on the next start.
+        """
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            job = self.jobs[job_id]
+            with self._lock:
+                if job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started = job.started or time.time()
+                self._save(job)
+            try:
+                self._run(job)
+                job.status = "completed"
+                job.finished = time.time()
+                print(f"Trabajo de ingesta {job.id} completado: {job.inserted} insertados")
+            except JobStopped:
+                job.status = "cancelled" if job.id in self._cancelled else "running"
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+                print(f"Trabajo de ingesta {job.id} falló en el lote {job.batches_done}: {e}")
+            finally:
+                self._progress.pop(job.id, None)
+                with self._lock:
+                    self._save(job)
+
+    def _questions(self, job: IngestJob) -> Iterator[tuple[str, list[str]]]:
+        for record in self._iter_records(job.id):
+            text = clean_question_text(record["text"])
+            yield record["id"], split_text_into_chunks(text, job.max_length, job.overlap)
+
+    def _embed(self, chunks: list[str]) -> np.ndarray:
+        # Runs in a pipeline thread; the engine lives on the event loop
+        future = asyncio.run_coroutine_threadsafe(_embed(chunks), self._loop)
+        return np.asarray(future.result(), dtype=np.float32)
+
+    def _run(self, job: IngestJob):
+        if job.total_batches is None:
+            # One chunking pass to know the size of the job (for the ETA)
+            job.total_chunks = 0
+            job.total_batches = 0
+            for ids, _ in iter_chunk_batches(self._questions(job), job.batch_size):
+                job.total_chunks += len(ids)
+                job.total_batches += 1
+            self._save(job)
+
+        if VECTOR_BACKEND == "milvus":
+            client = get_milvus_pool().client()
+            if not client.has_collection(MILVUS_COLLECTION):
+                create_schema(client, MILVUS_COLLECTION)
+                create_index(client, "q_vector", MILVUS_COLLECTION)
+        store = _Upserter(get_search_store())
+        self._progress[job.id] = _RunProgress(job.batches_done)
+        # Counts of the batches checkpointed by previous runs
+        inserted, skipped = job.inserted, job.skipped
+
+        def checkpoint(done: int, stats: PipelineStats):
+            # The upserted rows are already searchable, so the answers built
+            # from their previous chunks are stale now
+            answer_cache.invalidate(store.take_changed())
+            due = done - job.batches_done >= INGEST_CHECKPOINT_BATCHES
+            if (due and store.checkpoint_due()) or done == job.total_batches:
+                store.save()
+                job.batches_done = done
+                job.inserted = inserted + stats.inserted
+                job.skipped = skipped + stats.skipped
+                self._save(job)
+            if self._stopping.is_set() or job.id in self._cancelled:
+                raise JobStopped()
+
+        try:
+            run_pipeline(
+                store,  # type: ignore
+                self._questions(job),
+                batch_size=job.batch_size,
+                embed=self._embed,  # type: ignore
+                skip_batches=job.batches_done,
+                on_batch=checkpoint,
+            )
+        finally:
+            # Rows of a batch that failed or was stopped midway
+            changed = store.take_changed()
+            if changed:
+                answer_cache.invalidate(changed)
+
+    def status(self, job: IngestJob) -> dict:
+        """
+        The job with its progress, throughput (chunks/s of the current run)
+        and estimated seconds to finish.
+        """
+        state = asdict(job)
+        state["chunks_done"] = job.chunks_done
+        state["progress"] = (
+            round(job.batches_done / job.total_batches, 4) if job.total_batches else None
+        )
+        state["chunks_per_sec"] = None
+        state["eta_seconds"] = None
+        progress = self._progress.get(job.id)
+        if progress is not None:
+            elapsed = time.perf_counter() - progress.start
+            chunks = (job.batches_done - progress.start_batches) * job.batch_size
+            if elapsed > 0 and chunks > 0:
+                rate = chunks / elapsed
+                state["chunks_per_sec"] = round(rate, 1)
+                if job.total_chunks is not None:
+                    state["eta_seconds"] = round(
+                        max(job.total_chunks - job.chunks_done, 0) / rate, 1
+                    )
+        return state
+
+    def stats(self) -> list[dict]:
+        return [
+            self.status(job)
+            for job in sorted(self.jobs.values(), key=lambda job: job.created, reverse=True)
+        ]
+
+
+ingest_jobs = IngestJobs()
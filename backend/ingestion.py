@@ -0,0 +1,394 @@
+import glob
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import numpy as np
+from metrics import STAGE_SECONDS
+from milvus import (
+    build_columns,
+    get_embeddings,
+    iter_processed_questions,
+    question_records,
+)
+from question_index import build_question_index
+from vector_store import VectorStore
+
+# Sentinel that marks the end of a stage's output
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+@dataclass
+class PipelineStats:
+    chunks: int = 0
+    batches: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    stage_seconds: dict[str, float] = field(
+        default_factory=lambda: {"parse": 0.0, "embed": 0.0, "insert": 0.0}
+    )
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+    def report(self) -> str:
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in self.stage_seconds.items())
+        return (
+            f"{self.inserted} insertados de {self.chunks} chunks en {self.batches} lotes, "
+            f"{self.seconds:.2f}s ({self.chunks_per_sec:.1f} chunks/s) [{stages}]"
+        )
+
+
+def iter_chunk_batches(
+    questions: Iterable[tuple[str, list[str]]],
+    batch_size: int,
+    max_chunk_length: int = 512,
+) -> Iterator[tuple[list[str], list[str]]]:
+    """
+    Group the chunks of a stream of questions into fixed-size batches.
+
+    Duplicated question IDs are skipped, keeping the first occurrence.
+
+    Args:
+        questions: (question ID, chunks) pairs, e.g. from iter_processed_questions.
+        batch_size (int): Number of chunks per batch.
+        max_chunk_length (int): Chunks longer than this are reported.
+
+    Yields:
+        tuple: Parallel lists (ids, chunks) of at most batch_size items.
+    """
+    seen: set[str] = set()
+    ids: list[str] = []
+    chunks: list[str] = []
+    for question_id, question_chunks in questions:
+        if question_id in seen:
+            print(f"Advertencia: ID duplicado {question_id}, se ignora.")
+            continue
+        seen.add(question_id)
+        for record_id, chunk in question_records(question_id, question_chunks):
+            if len(chunk) > max_chunk_length:
+                print(f"Chunk inválido {record_id}: Longitud = {len(chunk)}")
+            ids.append(record_id)
+            chunks.append(chunk)
+            if len(ids) >= batch_size:
+                yield ids, chunks
+                ids, chunks = [], []
+    if ids:
+        yield ids, chunks
+
+
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    # Blocking put that gives up once the pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(
+    name: str,
+    items: Iterator[Any],
+    work: Callable[[Any], Any],
+    out_q: "queue.Queue[Any]",
+    stats: PipelineStats,
+    stop: threading.Event,
+):
+    """
+    Pull items, apply `work` and push the results to the next stage.
+    """
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            result = work(item)
+            elapsed = time.perf_counter() - start
+            stats.stage_seconds[name] += elapsed
+            STAGE_SECONDS.labels("ingest", name).observe(elapsed)
+            if not _put(out_q, result, stop):
+                return
+        _put(out_q, _DONE, stop)
+    except BaseException as e:
+        _put(out_q, _Failure(e), stop)
+
+
+def _drain(q: "queue.Queue[Any]", stop: threading.Event) -> Iterator[Any]:
+    # Iterate over a stage's output until its end marker, or until the
+    # pipeline is torn down (the producer may then never send the marker)
+    while True:
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def run_pipeline(
+    store: VectorStore,
+    questions: Iterable[tuple[str, list[str]]],
+    batch_size: int = 64,
+    queue_size: int = 4,
+    embed: Callable[[list[str]], list[list[float]]] = get_embeddings,
+    skip_batches: int = 0,
+    on_batch: Optional[Callable[[int, PipelineStats], None]] = None,
+) -> PipelineStats:
+    """
+    Stream questions through chunk -> embed -> insert with bounded queues.
+
+    Parsing, embedding and inserting run in separate threads, so the embedding
+    of batch N+1 overlaps with the insert of batch N. At most `queue_size`
+    batches wait between two stages, which keeps memory flat regardless of the
+    corpus size. Vectors travel as float32 matrices and are inserted by
+    columns (VectorStore.insert_columns).
+
+    Args:
+        store (VectorStore): Where the rows are inserted; a
+            bulk_ingest.ColumnExporter writes them to files instead.
+        questions: (question ID, chunks) pairs, consumed lazily.
+        batch_size (int): Chunks per embedding call and per insert.
+        queue_size (int): Maximum batches buffered between stages.
+        embed: Function that embeds a list of texts.
+        skip_batches (int): Batches already inserted by a previous run. They
+            are chunked again (so batch boundaries match) but not embedded.
+        on_batch: Called after each batch is inserted with the number of
+            batches done so far (including skipped ones) and the stats. An
+            exception raised there stops the pipeline.
+
+    Returns:
+        PipelineStats: Counts and busy time of each stage.
+    """
+    stats = PipelineStats()
+    stop = threading.Event()
+    parsed_q: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+    embedded_q: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+
+    def count(batch: tuple[list[str], list[str]]):
+        stats.chunks += len(batch[0])
+        stats.batches += 1
+        return batch
+
+    def embed_batch(batch: tuple[list[str], list[str]]):
+        # The vectors are kept as a float32 matrix from here on
+        ids, chunks = batch
+        return ids, chunks, np.asarray(embed(chunks), dtype=np.float32)
+
+    threads = [
+        threading.Thread(
+            target=_run_stage,
+            args=(
+                "parse",
+                map(
+                    count,
+                    itertools.islice(
+                        iter_chunk_batches(questions, batch_size), skip_batches, None
+                    ),
+                ),
+                lambda batch: batch,
+                parsed_q,
+                stats,
+                stop,
+            ),
+            name="ingest-parse",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_run_stage,
+            args=(
+                "embed", _drain(parsed_q, stop), embed_batch, embedded_q, stats, stop
+            ),
+            name="ingest-embed",
+            daemon=True,
+        ),
+    ]
+
+    start = time.perf_counter()
+    done = skip_batches
+    for thread in threads:
+        thread.start()
+    try:
+        for ids, chunks, vectors in _drain(embedded_q, stop):
+            insert_start = time.perf_counter()
+            kept_ids, kept_chunks, matrix = build_columns(ids, chunks, vectors)
+            stats.inserted += store.insert_columns(kept_ids, kept_chunks, matrix)
+            stats.skipped += len(ids) - len(kept_ids)
+            elapsed = time.perf_counter() - insert_start
+            stats.stage_seconds["insert"] += elapsed
+            STAGE_SECONDS.labels("ingest", "insert").observe(elapsed)
+            done += 1
+            if on_batch is not None:
+                on_batch(done, stats)
+        store.save()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=1)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def ingest_file(
+    store: VectorStore,
+    file_path: str,
+    max_length: int = 512,
+    overlap: int = 100,
+    batch_size: int = 64,
+    queue_size: int = 4,
+) -> PipelineStats:
+    """
+    Read, chunk, embed and insert a questions file as a stream.
+
+    The question lookup index of the file is rebuilt first.
+    """
+    build_question_index(file_path)
+    questions = iter_processed_questions(file_path, max_length, overlap)
+    return run_pipeline(
+        store, questions, batch_size=batch_size, queue_size=queue_size
+    )
+
+
+@dataclass
+class DocumentStats:
+    path: str
+    questions: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+
+def document_id(file_path: str, root: str) -> str:
+    """
+    Stable identifier of a document: its path relative to `root`, without extension.
+    """
+    relative = os.path.relpath(file_path, root)
+    return os.path.splitext(relative)[0].replace(os.sep, "/")
+
+
+def _parse_document(
+    file_path: str, max_length: int, overlap: int
+) -> tuple[list[tuple[str, list[str]]], float]:
+    # Runs in a worker process: parse and chunk a whole document and
+    # refresh its lookup index
+    start = time.perf_counter()
+    questions = list(iter_processed_questions(file_path, max_length, overlap))
+    build_question_index(file_path)
+    return questions, time.perf_counter() - start
+
+
+def iter_directory_questions(
+    directory: str,
+    pattern: str = "*.txt",
+    max_length: int = 512,
+    overlap: int = 100,
+    workers: Optional[int] = None,
+    file_stats: Optional[list[DocumentStats]] = None,
+) -> Iterator[tuple[str, list[str]]]:
+    """
+    Parse and chunk every document of a directory in a process pool.
+
+    Question IDs are prefixed with the document ID (`<document>/<question>`),
+    so they stay unique and stable across documents. Documents are yielded in
+    path order, and at most two per worker are parsed ahead, so memory holds
+    a bounded number of documents whatever the size of the directory.
+
+    Args:
+        directory (str): Root directory of the documents.
+        pattern (str): Glob pattern, relative to `directory`. Searched recursively.
+        max_length (int): Maximum length of each chunk.
+        overlap (int): Characters of overlap between consecutive chunks.
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        file_stats (list, optional): Receives one DocumentStats per parsed file.
+
+    Yields:
+        tuple: (prefixed question ID, chunks), in path order.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+    if not paths:
+        print(f"No se encontraron documentos '{pattern}' en {directory}")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    window = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[tuple[str, Future]] = deque()
+        remaining = iter(paths)
+        for path in itertools.islice(remaining, window):
+            pending.append((path, pool.submit(_parse_document, path, max_length, overlap)))
+        while pending:
+            # Keep the window full while the oldest document is consumed
+            path, future = pending.popleft()
+            for next_path in itertools.islice(remaining, 1):
+                pending.append(
+                    (next_path, pool.submit(_parse_document, next_path, max_length, overlap))
+                )
+            questions, seconds = future.result()
+            doc_id = document_id(path, directory)
+            doc_stats = DocumentStats(
+                path=path,
+                questions=len(questions),
+                chunks=sum(len(chunks) for _, chunks in questions),
+                seconds=seconds,
+            )
+            print(
+                f"{path}: {doc_stats.questions} preguntas, {doc_stats.chunks} chunks "
+                f"en {seconds:.2f}s ({doc_stats.chunks_per_sec:.1f} chunks/s)"
+            )
+            if file_stats is not None:
+                file_stats.append(doc_stats)
+            for question_id, chunks in questions:
+                yield f"{doc_id}/{question_id}", chunks
+
+
+def ingest_directory(
+    store: VectorStore,
+    directory: str,
+    pattern: str = "*.txt",
+    max_length: int = 512,
+    overlap: int = 100,
+    batch_size: int = 64,
+    queue_size: int = 4,
+    workers: Optional[int] = None,
+) -> tuple[PipelineStats, list[DocumentStats]]:
+    """
+    Ingest every document of a directory.
+
+    Parsing and chunking fan out over a process pool; all documents then feed
+    a single shared embedding and insert pipeline.
+
+    Returns:
+        tuple: The pipeline stats and the per-file stats.
+    """
+    file_stats: list[DocumentStats] = []
+    questions = iter_directory_questions(
+        directory, pattern, max_length, overlap, workers, file_stats
+    )
+    stats = run_pipeline(
+        store, questions, batch_size=batch_size, queue_size=queue_size
+    )
+    return stats, file_stats
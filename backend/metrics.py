@@ -0,0 +1,233 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Caller identity used for fair queuing (one per frontend session)
+CLIENT_ID_HEADER = "X-Client-ID"
+
+# Request ID of the current request, propagated from the frontend when present
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+
+STAGE_SECONDS = Histogram(
+    "versat_stage_seconds",
+    "Duration of each pipeline stage",
+    ["pipeline", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "versat_http_requests_total", "HTTP requests served", ["path", "status"]
+)
+REQUEST_SECONDS = Histogram(
+    "versat_http_request_seconds",
+    "HTTP request latency (until the response starts)",
+    ["path"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "versat_llm_time_to_first_token_seconds",
+    "Time until the first generated token",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_GENERATION_SECONDS = Histogram(
+    "versat_llm_generation_seconds",
+    "Total generation time",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "versat_llm_tokens_per_second",
+    "Generation speed reported by Ollama",
+    ["model"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200),
+)
+LLM_TOKENS = Counter("versat_llm_tokens_total", "Generated tokens", ["model"])
+LLM_LOAD_SECONDS = Histogram(
+    "versat_llm_load_seconds",
+    "Model load time reported by Ollama (cold starts)",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_PREFILL_SECONDS = Histogram(
+    "versat_llm_prefill_seconds",
+    "Prompt evaluation time reported by Ollama",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "versat_llm_prompt_tokens",
+    "Prompt tokens evaluated (cached prefix tokens are not counted)",
+    ["model"],
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+MICRO_BATCH_TEXTS = Histogram(
+    "versat_embed_micro_batch_texts",
+    "Texts per merged /api/embed call",
+    buckets=_BATCH_BUCKETS,
+)
+MICRO_BATCH_REQUESTS = Histogram(
+    "versat_embed_micro_batch_requests",
+    "Requests merged into one /api/embed call",
+    buckets=_BATCH_BUCKETS,
+)
+MICRO_BATCH_WAIT_SECONDS = Histogram(
+    "versat_embed_micro_batch_wait_seconds",
+    "Time a request waited in the micro-batching queue",
+    buckets=_LATENCY_BUCKETS,
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "versat_admission_wait_seconds",
+    "Time a generation waited for a slot of its model",
+    ["model"],
+    buckets=_LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "versat_admission_rejected_total",
+    "Generations rejected with 429 because the queue was full",
+    ["model"],
+)
+ADMISSION_ACTIVE = Gauge(
+    "versat_admission_active", "Generations running per model", ["model"]
+)
+ADMISSION_QUEUED = Gauge(
+    "versat_admission_queued", "Generations waiting for a slot per model", ["model"]
+)
+OLLAMA_NODE_UP = Gauge(
+    "versat_ollama_node_up", "Whether an Ollama node passed its last check", ["role", "url"]
+)
+OLLAMA_NODE_IN_FLIGHT = Gauge(
+    "versat_ollama_node_in_flight",
+    "Requests running or waiting on an Ollama node",
+    ["role", "url"],
+)
+OLLAMA_FAILOVERS = Counter(
+    "versat_ollama_failovers_total", "Calls retried on another Ollama node", ["role"]
+)
+RESCORE_MISSING = Counter(
+    "versat_rescore_missing_vectors_total",
+    "Coarse candidates without a full-precision vector to re-score",
+)
+
+logger = logging.getLogger("versat.timing")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def log_event(event: str, **fields):
+    """
+    Write one structured (JSON) log line tagged with the current request ID.
+    """
+    record = {
+        "ts": round(time.time(), 3),
+        "request_id": request_id_var.get(),
+        "event": event,
+        **fields,
+    }
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(stage: str, pipeline: str = "query", **fields) -> Iterator[dict]:
+    """
+    Time a stage, record it in the stage histogram and log it.
+
+    The yielded dict can be filled with extra fields for the log line.
+
+    Args:
+        stage (str): Stage name (e.g. "embed", "search", "generate").
+        pipeline (str): "query" or "ingest".
+    """
+    extra: dict = dict(fields)
+    start = time.perf_counter()
+    error: Optional[str] = None
+    try:
+        yield extra
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+        if error:
+            extra["error"] = error
+        log_event(
+            "span", pipeline=pipeline, stage=stage, ms=round(seconds * 1000, 2), **extra
+        )
+
+
+def observe_generation(
+    model: str,
+    seconds: float,
+    first_token_seconds: Optional[float],
+    final_chunk: Optional[dict],
+):
+    """
+    Record the LLM metrics of a finished generation.
+
+    Args:
+        model (str): The model used.
+        seconds (float): Total generation time measured by the backend.
+        first_token_seconds (float, optional): Time to first token (streaming only).
+        final_chunk (dict, optional): Ollama's final object, with the load,
+            prompt evaluation and generation counters.
+    """
+    LLM_GENERATION_SECONDS.labels(model).observe(seconds)
+    STAGE_SECONDS.labels("query", "generate").observe(seconds)
+    fields: dict = {"model": model, "ms": round(seconds * 1000, 2)}
+    if first_token_seconds is not None:
+        LLM_TIME_TO_FIRST_TOKEN.labels(model).observe(first_token_seconds)
+        STAGE_SECONDS.labels("query", "first_token").observe(first_token_seconds)
+        fields["first_token_ms"] = round(first_token_seconds * 1000, 2)
+    if final_chunk:
+        load_ns = final_chunk.get("load_duration") or 0
+        prefill_ns = final_chunk.get("prompt_eval_duration") or 0
+        prompt_tokens = final_chunk.get("prompt_eval_count") or 0
+        LLM_LOAD_SECONDS.labels(model).observe(load_ns / 1e9)
+        LLM_PREFILL_SECONDS.labels(model).observe(prefill_ns / 1e9)
+        LLM_PROMPT_TOKENS.labels(model).observe(prompt_tokens)
+        fields["load_ms"] = round(load_ns / 1e6, 2)
+        fields["prefill_ms"] = round(prefill_ns / 1e6, 2)
+        fields["prompt_tokens"] = prompt_tokens
+        tokens = final_chunk.get("eval_count") or 0
+        eval_ns = final_chunk.get("eval_duration") or 0
+        LLM_TOKENS.labels(model).inc(tokens)
+        fields["tokens"] = tokens
+        if tokens and eval_ns:
+            tokens_per_second = tokens / (eval_ns / 1e9)
+            LLM_TOKENS_PER_SECOND.labels(model).observe(tokens_per_second)
+            fields["tokens_per_sec"] = round(tokens_per_second, 2)
+    log_event("generation", **fields)
+
+
+def metrics_payload() -> tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format, with its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,19 +1,38 @@
+import hashlib
 import json
+import os
 
 import re
+from typing import Iterator, Optional
 
 
+import numpy as np
 import requests
+from compact_vectors import (
+    EMBED_DIM,
+    VECTOR_DIM,
+    VECTOR_STORAGE,
+    compact_enabled,
+    full_collection_name,
+    milvus_index_config,
+)
+from index_tuning import build_index, load_index_config, search_params
+from milvus_pool import MILVUS_DB, MILVUS_URI, get_milvus_pool
 from pymilvus import DataType, MilvusClient
+from vector_codec import ACCEPT_BINARY, decode_matrix
+from vector_store import (
+    VECTOR_BACKEND,
+    VECTOR_STORE_PATH,
+    VectorStore,
+    get_vector_store,
+)
 
 
 def connect_to_milvus_db(db_name: str):
     """
-    Connect to Milvus database
+    Connect to Milvus database (a pooled client, see milvus_pool.py)
     """
-    client = MilvusClient(uri="http://localhost:19530")
-    client.using_database(db_name=db_name)   # type: ignore
-    return client
+    return get_milvus_pool(db_name).client()
 
 
 def search_vector(
@@ -35,10 +54,8 @@ def search_vector(
         anns_field="q_vector",
         data=[vector],
         limit=2,
-        search_params={
-            "metric_type": "COSINE",
-            "params": {"nprobe": 32},
-        },
+        # Tuned by index_tuning.py (IVF_SQ8 with nprobe 32 until then)
+        search_params=search_params(limit=2),
     )
     return result # type: ignore
 
@@ -87,11 +104,103 @@ def split_text_into_chunks(text:str, max_length: int=512, overlap:int=100):
         if i == 0:
             final_chunks.append(chunk)
         else:
-            overlapped_chunk = chunks[i - 1][-overlap:] + chunk
+            # Shorten the repeated tail rather than cut the end of the chunk
+            tail = min(overlap, max_length - len(chunk))
+            overlapped_chunk = (chunks[i - 1][-tail:] if tail > 0 else "") + chunk
             final_chunks.append(overlapped_chunk[:max_length])
     return final_chunks
 
 
+def iter_question_blocks(file_path: str) -> Iterator[str]:
+    """
+    Read a questions file incrementally and yield one raw block per question.
+
+    Equivalent to splitting the whole content on "ID:", but only one question
+    is held in memory at a time.
+
+    Args:
+        file_path (str): The path to the file containing questions.
+
+    Yields:
+        str: The text of each question, starting with "ID:".
+    """
+    block: Optional[list[str]] = None
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            pieces = line.split("ID:")
+            if block is not None:
+                block.append(pieces[0])
+            for piece in pieces[1:]:
+                if block is not None:
+                    yield "ID:" + "".join(block)
+                block = [piece]
+    if block is not None:
+        yield "ID:" + "".join(block)
+
+
+def clean_question_text(text: str) -> str:
+    """
+    Remove the markers that carry no content ("Sct.", "N/A") from a question.
+    """
+    cleaned_text = re.sub(r"Sct\.", "", text).strip()
+    return re.sub(r"(?i)\bN/A\b", "", cleaned_text).strip()
+
+
+def split_question_blocks(text: str) -> list[str]:
+    """
+    In-memory iter_question_blocks: split a document on "ID:".
+    """
+    return ["ID:" + block for block in text.split("ID:")[1:]]
+
+
+def process_question(
+    question: str, max_length: int = 512, overlap: int = 100
+) -> Optional[tuple[str, list[str]]]:
+    """
+    Clean a single question block and split it into chunks.
+
+    Args:
+        question (str): The raw question text, starting with "ID:".
+        max_length (int, optional): Maximum length of each chunk. Default is 512.
+        overlap (int, optional): Number of characters that overlap between consecutive chunks. Default is 100.
+
+    Returns:
+        tuple: (question ID, list of chunks), or None if the block has no ID or no content.
+    """
+    full_question = question.strip()
+    id_match = re.search(r"ID:\s*(\S+)", full_question)
+    if not id_match:
+        print(
+            f"Error: No se pudo extraer el ID de la pregunta: {full_question[:100]}..."
+        )
+        return None
+    question_id: str = id_match.group(1)
+    chunks: list[str] = split_text_into_chunks(
+        clean_question_text(full_question), max_length, overlap
+    )
+    if not chunks:
+        print(
+            f"Advertencia: La pregunta con ID {question_id} no tiene contenido válido."
+        )
+        return None
+    return question_id, chunks
+
+
+def iter_processed_questions(
+    file_path: str, max_length: int = 512, overlap: int = 100
+) -> Iterator[tuple[str, list[str]]]:
+    """
+    Lazily parse and chunk a questions file, one question at a time.
+
+    Yields:
+        tuple: (question ID, list of chunks) for each valid question.
+    """
+    for question in iter_question_blocks(file_path):
+        processed = process_question(question, max_length, overlap)
+        if processed is not None:
+            yield processed
+
+
 def process_questions_file(
     file_path: str, max_length: int = 512, overlap: int = 100
 ) -> dict[str, list[str]]:
@@ -106,52 +215,73 @@ def process_questions_file(
     Returns:
         dict: A dictionary where keys are question IDs and values are lists of text chunks for each question.
     """
-    with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
-    questions = re.split(r"ID:", content)[1:]
-    processed_questions: dict[str, list[str]] = {}
-    for question in questions:
-        full_question = f"ID:{question}".strip()
-        id_match = re.search(r"ID:\s*(\S+)", full_question)
-        if not id_match:
-            print(
-                f"Error: No se pudo extraer el ID de la pregunta: {full_question[:100]}..."
-            )
-            continue
-        question_id: str = id_match.group(1)
-        cleaned_text = re.sub(r"Sct\.", "", full_question).strip()
-        cleaned_text = re.sub(r"(?i)\bN/A\b", "", cleaned_text).strip()
-        chunks: list[str] = split_text_into_chunks(cleaned_text, max_length, overlap)
-        if chunks:
-            processed_questions[question_id] = chunks
-        else:
-            print(
-                f"Advertencia: La pregunta con ID {question_id} no tiene contenido válido."
-            )
-    return processed_questions
+    return dict(iter_processed_questions(file_path, max_length, overlap))
 
 
 # URL de la API local
 API_URL = "http://localhost:5000/generate-embeddings/"
 
 
-def get_embeddings(texts: list[str]):
+def get_embeddings(texts: list[str], batch_size: Optional[int] = None) -> np.ndarray:
     """
     Get embeddings for a list of texts by sending a POST request to an API.
 
+    The vectors are requested in the binary float32 format (see
+    vector_codec.py) and decoded without copying; a JSON answer is still
+    accepted.
+
     :param texts: A list of text strings.
+    :param batch_size: Number of texts per Ollama call on the server. Uses the server default if None.
 
-    :return: A list of lists, where each inner list represents the embeddings for a given text.
+    :return: A float32 matrix with one row per text (read-only).
     """
-    headers = {"Content-Type": "application/json"}
-    data = {"texts": texts}
+    headers = {"Content-Type": "application/json", "Accept": ACCEPT_BINARY}
+    data = {"texts": texts, "batch_size": batch_size}
     response = requests.post(API_URL, headers=headers, data=json.dumps(data))
     if response.status_code == 200:
-        return response.json()["embeddings"]
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            body = response.json()
+            stats = body.get("stats")
+            # Each item comes wrapped as [[0.123, ..., 0.456]]
+            vectors = np.array(
+                [embedding[0] for embedding in body["embeddings"]], dtype=np.float32
+            )
+        else:
+            stats_header = response.headers.get("X-Embedding-Stats")
+            stats = json.loads(stats_header) if stats_header else None
+            vectors = decode_matrix(response.content, content_type)
+        if stats:
+            print(
+                f"Embeddings: {stats['texts']} textos, {stats['batches']} lotes, "
+                f"{stats['texts_per_sec']} textos/s"
+            )
+        return vectors
     else:
         raise Exception(f"Error: {response.status_code}, {response.text}")
 
 
+ANSWER_CACHE_INVALIDATE_URL = "http://localhost:5000/answer-cache/invalidate"
+
+
+def invalidate_answer_cache(ids: Optional[list[str]] = None):
+    """
+    Tell the backend to drop cached answers built from re-ingested chunks.
+
+    Best effort: ingestion must not fail because the backend is down.
+
+    :param ids: The changed or deleted chunk IDs. None drops every cached answer.
+    """
+    try:
+        response = requests.post(
+            ANSWER_CACHE_INVALIDATE_URL, json={"ids": ids}, timeout=10
+        )
+        response.raise_for_status()
+        print(f"Caché de respuestas invalidada: {response.json().get('removed', 0)}")
+    except Exception as e:
+        print("No se pudo invalidar la caché de respuestas:", e)
+
+
 def create_database(client: MilvusClient, db_name: str):
     """
     Allows creating or verifying if it already exists. If it does not exist,
@@ -173,6 +303,22 @@ def create_database(client: MilvusClient, db_name: str):
     return client
 
 
+# Sizes of the VARCHAR fields of the collection (Milvus counts UTF-8 bytes).
+# IDs of documents ingested from a directory are `<document>/<question>_<n>`
+Q_ID_MAX_LENGTH = 256
+Q_CHUNK_MAX_LENGTH = 512
+
+
+def valid_record_id(q_id: str) -> bool:
+    """
+    Whether an ID fits the q_id field; Milvus rejects the whole insert otherwise.
+    """
+    if len(q_id.encode("utf-8")) > Q_ID_MAX_LENGTH:
+        print(f"ID demasiado largo ({len(q_id)} > {Q_ID_MAX_LENGTH}), se ignora: {q_id[:80]}...")
+        return False
+    return True
+
+
 def create_schema(client: MilvusClient, collection_name: str):
     """
     Create a new collection with a specific schema and its fields.
@@ -183,19 +329,32 @@ def create_schema(client: MilvusClient, collection_name: str):
     :return: The updated Milvus client object after using the specified collection and schema.
     """
     print("Creating schema")
+    # Matryoshka-truncated and/or FLOAT16/binary when compact vectors are configured
+    vector_type = {
+        "float32": DataType.FLOAT_VECTOR,
+        "float16": DataType.FLOAT16_VECTOR,
+        "binary": DataType.BINARY_VECTOR,
+    }[VECTOR_STORAGE]
+    _create_collection(client, collection_name, vector_type, VECTOR_DIM)
+    # The full-precision vectors of the two-phase search live next to it
+    full_name = full_collection_name(collection_name)
+    if compact_enabled():
+        _create_collection(client, full_name, DataType.FLOAT_VECTOR, EMBED_DIM)
+    elif client.has_collection(full_name):  # type: ignore
+        client.drop_collection(full_name)  # type: ignore
+    return client
+
+
+def _create_collection(client: MilvusClient, collection_name: str, vector_type, dim: int):
     # Remove collection if exists
     if client.has_collection(collection_name):  # type: ignore
         client.drop_collection(collection_name)  # type: ignore
 
-    # Create schema
     schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)  # type: ignore
-    schema.add_field("q_id", DataType.VARCHAR, is_primary=True, max_length=64)  # type: ignore
-    schema.add_field("q_vector", DataType.FLOAT_VECTOR, dim=768)  # type: ignore
-    schema.add_field("q_chunk", DataType.VARCHAR, max_length=512)  # type: ignore
-
-    # Create collections
+    schema.add_field("q_id", DataType.VARCHAR, is_primary=True, max_length=Q_ID_MAX_LENGTH)  # type: ignore
+    schema.add_field("q_vector", vector_type, dim=dim)  # type: ignore
+    schema.add_field("q_chunk", DataType.VARCHAR, max_length=Q_CHUNK_MAX_LENGTH)  # type: ignore
     client.create_collection(collection_name=collection_name, schema=schema)  # type: ignore
-    return client
 
 
 def create_index(client: MilvusClient, index_name: str, collection_name: str):
@@ -208,78 +367,305 @@ def create_index(client: MilvusClient, index_name: str, collection_name: str):
 
     :return: Will return the updated Milvus client object after using the specified collection and index.
     """
-    print("Creating index")
-    index_params = [
-        {
-            "field_name": index_name,
-            "index_type": "IVF_SQ8",
-            "metric_type": "COSINE",
-            "params": {"nlist": 256},
-        }
-    ]
+    config = milvus_index_config(load_index_config())
+    print(f"Creating index {config['index_type']} {config['params']}")
     try:
-        client.create_index(collection_name=collection_name, index_params=index_params) # type: ignore
+        build_index(client, collection_name, field_name=index_name, config=config)
+        if compact_enabled():
+            # Only read by ID for the re-score; Milvus needs an index to load it
+            build_index(
+                client,
+                full_collection_name(collection_name),
+                field_name=index_name,
+                config={"index_type": "FLAT", "metric_type": "COSINE", "params": {}},
+            )
         print("Índice creado exitosamente.")
     except Exception as ex:
         print("Error al crear el índice:", ex)
     return client
 
 
-if __name__ == "__main__":
-    file_path = "./documents/mf3.txt"
-    json_data = process_questions_file(file_path, max_length=450)
+def question_records(
+    question_id: str, chunks: list[str]
+) -> list[tuple[str, str]]:
+    """
+    Assign record IDs to the chunks of one question.
 
-    # Crear una lista plana con todos los chunks
-    ps: list[str] = []
+    The first chunk keeps the question ID; the following ones get a positional
+    suffix (`<id>_2`, `<id>_3`, ...), so IDs are stable as long as the question
+    text does not change.
+
+    :return: A list of (record ID, chunk) pairs.
+    """
+    return [
+        (question_id if i == 0 else f"{question_id}_{i + 1}", chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def build_chunk_records(
+    questions: dict[str, list[str]],
+) -> tuple[list[str], list[str]]:
+    """
+    Flatten processed questions into parallel lists of record IDs and chunks.
+
+    :param questions: Question ID -> list of chunks, as returned by process_questions_file.
+
+    :return: A tuple (ids, chunks).
+    """
     ids: list[str] = []
+    chunks: list[str] = []
+    for question_id, question_chunks in questions.items():
+        for record_id, chunk in question_records(question_id, question_chunks):
+            ids.append(record_id)
+            chunks.append(chunk)
+    return ids, chunks
 
-    for question_id, chunks in json_data.items():
-        c_id: list[str] = []
-        for i, chunk in enumerate(chunks):
-            ps.append(chunk)  # Añadir el chunk a la lista plana
-            if question_id in c_id:
-                ids.append(f"{question_id}_{i + 1}")
+
+def build_rows(
+    ids: list[str], chunks: list[str], vectors: list[list[float]]
+) -> list[dict]:
+    """
+    Build the rows to insert, skipping empty chunks, IDs too long for the
+    collection and malformed vectors.
+
+    :return: A list of dicts with the fields q_id, q_vector and q_chunk.
+    """
+    rows: list[dict] = []
+    for q_id, chunk, vector in zip(ids, chunks, vectors):
+        if chunk.strip() and valid_record_id(q_id):  # Chunk no vacío, ID válido
+            if len(vector) == EMBED_DIM:  # Validar la longitud del vector
+                rows.append({"q_id": q_id, "q_vector": vector, "q_chunk": chunk})
             else:
-                ids.append(question_id)  # Añadir el ID correspondiente
-                c_id.append(question_id)
-
-    # Verificar que ningún chunk exceda los 512 caracteres
-    invalid_chunks = [(i, len(st)) for i, st in enumerate(ps) if len(st) > 512]
-    if invalid_chunks:
-        print("Chunks inválidos encontrados:")
-        for idx, length in invalid_chunks:
-            print(f"Chunk {idx}: Longitud = {length}")
+                print(f"Vector inválido para ID {q_id}: Longitud = {len(vector)}")
+    return rows
+
+
+def build_columns(
+    ids: list[str], chunks: list[str], vectors
+) -> tuple[list[str], list[str], np.ndarray]:
+    """
+    Column-oriented build_rows: the same filtering, but the vectors stay in a
+    contiguous float32 matrix instead of one list of Python floats per row.
+
+    :return: A tuple (ids, chunks, vectors) with one matrix row per ID.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[1] != EMBED_DIM:
+        print(f"Vectores inválidos: forma {matrix.shape}, se esperaba (n, {EMBED_DIM})")
+        return [], [], np.empty((0, EMBED_DIM), dtype=np.float32)
+    keep = [
+        i
+        for i, (q_id, chunk) in enumerate(zip(ids, chunks))
+        if chunk.strip() and valid_record_id(q_id)
+    ]
+    if len(keep) == len(ids):
+        return list(ids), list(chunks), matrix
+    return [ids[i] for i in keep], [chunks[i] for i in keep], matrix[keep]
+
+
+def chunk_fingerprint(chunk: str) -> str:
+    """
+    Content fingerprint of a chunk, used to detect changed records.
+    """
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def fetch_stored_fingerprints(store: VectorStore) -> dict[str, str]:
+    """
+    Read every stored record and fingerprint its chunk.
+
+    :param store: The vector store to read.
+
+    :return: A dict mapping q_id to the fingerprint of its stored chunk.
+    """
+    return {q_id: chunk_fingerprint(chunk) for q_id, chunk in store.records()}
+
+
+def ingest_incremental(
+    store: VectorStore,
+    ids: list[str],
+    chunks: list[str],
+    batch_size: Optional[int] = None,
+) -> dict[str, int]:
+    """
+    Synchronize a live collection with the current chunks without dropping it.
+
+    Only new or changed chunks are embedded and upserted; records whose ID no
+    longer exists in the source are deleted.
+
+    :param store: The vector store to update. It must already exist.
+    :param ids: Record IDs, as returned by build_chunk_records.
+    :param chunks: Chunks, parallel to ids.
+    :param batch_size: Texts per embedding call on the server.
+
+    :return: Counts of unchanged, upserted and deleted records.
+    """
+    # Empty chunks are never stored, so they must not count as changes
+    pairs = [(q_id, chunk) for q_id, chunk in zip(ids, chunks) if chunk.strip()]
+    ids = [q_id for q_id, _ in pairs]
+    chunks = [chunk for _, chunk in pairs]
+
+    stored = fetch_stored_fingerprints(store)
+
+    changed = [
+        i
+        for i, (q_id, chunk) in enumerate(zip(ids, chunks))
+        if stored.get(q_id) != chunk_fingerprint(chunk)
+    ]
+    current = set(ids)
+    orphans = [q_id for q_id in stored if q_id not in current]
+    print(
+        f"Incremental: {len(ids) - len(changed)} sin cambios, "
+        f"{len(changed)} nuevos o modificados, {len(orphans)} huérfanos"
+    )
+
+    upserted = 0
+    if changed:
+        changed_ids = [ids[i] for i in changed]
+        changed_chunks = [chunks[i] for i in changed]
+        vectors = get_embeddings(changed_chunks, batch_size=batch_size)
+        upserted = store.upsert(build_rows(changed_ids, changed_chunks, vectors))
+    store.delete(orphans)
+    store.save()
+    if changed or orphans:
+        invalidate_answer_cache([ids[i] for i in changed] + orphans)
+
+    return {
+        "unchanged": len(ids) - len(changed),
+        "upserted": upserted,
+        "deleted": len(orphans),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest the FAQ documents into the vector store")
+    parser.add_argument(
+        "--batch-size", type=int, default=None, help="Chunks per embedding call and insert"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Upsert only new/changed chunks and delete orphans instead of rebuilding",
+    )
+    parser.add_argument(
+        "--documents-dir",
+        default=None,
+        help="Ingest every *.txt under this directory instead of mf3.txt",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Processes used to parse documents"
+    )
+    parser.add_argument(
+        "--vector-backend",
+        choices=["milvus", "faiss", "numpy"],
+        default=VECTOR_BACKEND,
+        help="Where to store the vectors",
+    )
+    parser.add_argument(
+        "--export-dir",
+        default=None,
+        help="Write the rows to bulk import files in this directory instead of inserting them",
+    )
+    parser.add_argument(
+        "--export-format", choices=["npy", "parquet"], default="npy", help="Format of the export"
+    )
+    parser.add_argument(
+        "--bulk-import",
+        action="store_true",
+        help="After --export-dir, upload the files and bulk import them into Milvus",
+    )
+    args = parser.parse_args()
+
+    file_path = "./documents/mf3.txt"
+
+    def load_questions() -> dict[str, list[str]]:
+        if args.documents_dir:
+            from ingestion import iter_directory_questions
+
+            return dict(
+                iter_directory_questions(
+                    args.documents_dir, max_length=450, workers=args.workers
+                )
+            )
+        from question_index import build_question_index
+
+        build_question_index(file_path)
+        return process_questions_file(file_path, max_length=450)
+
+    if args.bulk_import and not args.export_dir:
+        parser.error("--bulk-import requires --export-dir")
+
+    # Exporting without importing does not touch the vector store
+    export_only = args.export_dir is not None and not args.bulk_import
+
+    if args.vector_backend == "milvus" and not export_only:
+        # Inicializar cliente de Milvus
+        client = MilvusClient(uri=MILVUS_URI)
+
+        # Crear y activar la base de datos (MILVUS_DB, "versat" por defecto)
+        client = create_database(client, db_name=MILVUS_DB)
+        exists = client.has_collection("sarasola")  # type: ignore
     else:
-        print("Todos los chunks tienen una longitud válida.")
+        client = None
+        exists = os.path.exists(os.path.join(VECTOR_STORE_PATH, "records.json"))
 
-    # Generar embeddings
-    emb = get_embeddings(ps)
+    if args.incremental and exists:
+        # Crear una lista plana con todos los chunks y sus IDs
+        ids, ps = build_chunk_records(load_questions())
 
-    # Inicializar cliente de Milvus
-    client = MilvusClient(uri="http://localhost:19530")
+        # Actualizar solo lo que cambió, sin tumbar la colección en uso
+        try:
+            store = get_vector_store(args.vector_backend, client=client)
+            counts = ingest_incremental(store, ids, ps, batch_size=args.batch_size)
+            print("Actualización incremental exitosa:", counts)
+        except Exception as e:
+            print("Error en la actualización incremental:", e)
+        raise SystemExit(0)
 
-    # Crear y activar la base de datos "versat"
-    client = create_database(client, db_name="versat")
+    if client is not None:
+        # Crear colección "sarasola" en la base de datos "versat"
+        client = create_schema(client, collection_name="sarasola")
 
-    # Crear colección "sarasola" en la base de datos "versat"
-    client = create_schema(client, collection_name="sarasola")
+        # Crear índice en "sarasola"
+        client = create_index(client, index_name="q_vector", collection_name="sarasola")
 
-    # Crear índice en "sarasola"
-    client = create_index(client, index_name="q_vector", collection_name="sarasola")
+    if args.export_dir:
+        from bulk_ingest import ColumnExporter
 
-    # Preparar datos
-    dt_ok: list[dict[str, float|str]] = []
-    for q_id, chunk, vector in zip(ids, ps, emb):
-        if chunk.strip():  # Asegurar que el chunk no esté vacío
-            if len(vector) == 768:  # Validar la longitud del vector
-                dt_ok.append({"q_id": q_id, "q_vector": vector, "q_chunk": chunk})
-            else:
-                print(f"Vector inválido para ID {q_id}: Longitud = {len(vector)}")
+        store = ColumnExporter(args.export_dir, args.export_format)
+    else:
+        store = get_vector_store(args.vector_backend, client=client, fresh=True)
+
+    # Leer, fragmentar, generar embeddings e insertar por lotes en streaming
+    from ingestion import ingest_directory, ingest_file
 
-    # Insertar datos
     print("Inserting data")
     try:
-        res = client.insert(collection_name="sarasola", data=dt_ok)  # type: ignore
-        print("Inserción exitosa:")
+        if args.documents_dir:
+            stats, _ = ingest_directory(
+                store,
+                args.documents_dir,
+                max_length=450,
+                batch_size=args.batch_size or 64,
+                workers=args.workers,
+            )
+        else:
+            stats = ingest_file(
+                store,
+                file_path,
+                max_length=450,
+                batch_size=args.batch_size or 64,
+            )
+        print("Inserción exitosa:", stats.report())
+        if args.bulk_import:
+            from bulk_ingest import bulk_import, upload_parts
+
+            prefix = os.path.basename(args.export_dir.rstrip("/"))
+            bulk_import(upload_parts(args.export_dir, store.parts, prefix), "sarasola")
+        if not export_only:
+            invalidate_answer_cache()
     except Exception as e:
         print("Error al insertar datos:", e)
@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import os
+import threading
+from typing import Optional
+
+from pymilvus import AsyncMilvusClient, MilvusClient
+
+# Milvus server, or a Milvus Lite file ("./milvus.db")
+MILVUS_URI = os.getenv("MILVUS_URI", "http://localhost:19530")
+MILVUS_DB = os.getenv("MILVUS_DB", "versat")
+MILVUS_COLLECTION = os.getenv("MILVUS_COLLECTION", "sarasola")
+# Connections kept open per database (sync and async each)
+MILVUS_POOL_SIZE = int(os.getenv("MILVUS_POOL_SIZE", 4))
+# Query vectors sent in one search call; larger batches are split and the
+# parts searched concurrently over the pool
+MILVUS_SEARCH_BATCH = int(os.getenv("MILVUS_SEARCH_BATCH", 32))
+
+
+def is_milvus_lite(uri: str) -> bool:
+    return uri.endswith(".db")
+
+
+class MilvusPool:
+    """
+    Warm Milvus connections to one database, shared by every caller.
+
+    Sync clients serve threads and administrative calls; async clients
+    (AsyncMilvusClient) serve searches and writes from the event loop. Both
+    are opened on first use and handed out round-robin. Milvus Lite has no
+    async client, so with a .db URI the async methods run the sync client in
+    a thread.
+
+    Which collections are loaded is checked once (see `prepare`, called at
+    startup) and remembered, so searches never call load_collection.
+    """
+
+    def __init__(
+        self, uri: str = MILVUS_URI, db_name: str = MILVUS_DB, size: int = MILVUS_POOL_SIZE
+    ):
+        self.uri = uri
+        # Milvus Lite only has the default database
+        self.db_name = "" if is_milvus_lite(uri) else db_name
+        self.size = 1 if is_milvus_lite(uri) else max(1, size)
+        self._clients: list[MilvusClient] = []
+        self._async_clients: list[AsyncMilvusClient] = []
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        # collection -> "Loaded", "NotLoad", "NotExist", ...
+        self.load_state: dict[str, str] = {}
+
+    def client(self) -> MilvusClient:
+        """
+        A pooled sync client, using the pool's database.
+        """
+        with self._lock:
+            if len(self._clients) < self.size:
+                self._clients.append(MilvusClient(uri=self.uri, db_name=self.db_name))
+                return self._clients[-1]
+            return self._clients[next(self._turn) % len(self._clients)]
+
+    def async_client(self) -> Optional[AsyncMilvusClient]:
+        """
+        A pooled async client (None for Milvus Lite). Must be called from the
+        event loop that will use it.
+        """
+        if is_milvus_lite(self.uri):
+            return None
+        if len(self._async_clients) < self.size:
+            self._async_clients.append(
+                AsyncMilvusClient(uri=self.uri, db_name=self.db_name)
+            )
+            return self._async_clients[-1]
+        return self._async_clients[next(self._turn) % len(self._async_clients)]
+
+    def ensure_loaded(self, collection_name: str) -> bool:
+        """
+        Load a collection into memory unless it is already known to be loaded.
+
+        Returns:
+            bool: Whether the collection exists and is loaded.
+        """
+        if self.load_state.get(collection_name) == "Loaded":
+            return True
+        client = self.client()
+        if not client.has_collection(collection_name):
+            self.load_state[collection_name] = "NotExist"
+            return False
+        state = str(client.get_load_state(collection_name)["state"])
+        if not state.endswith("Loaded"):
+            client.load_collection(collection_name)
+        self.load_state[collection_name] = "Loaded"
+        return True
+
+    def ensure_collection(self, collection_name: str, dimension: int) -> bool:
+        """
+        Create a collection with the quick-setup schema unless it exists.
+
+        Returns:
+            bool: Whether the collection was created.
+        """
+        client = self.client()
+        if client.has_collection(collection_name=collection_name):
+            return False
+        client.create_collection(collection_name=collection_name, dimension=dimension)
+        self.load_state.pop(collection_name, None)
+        return True
+
+    def prepare(self, collection_names: list[str]) -> dict[str, str]:
+        """
+        Open the first connection and load the collections (at startup).
+        """
+        for collection_name in collection_names:
+            try:
+                self.ensure_loaded(collection_name)
+            except Exception as e:
+                self.load_state[collection_name] = f"Error: {e}"
+                print(f"No se pudo cargar la colección {collection_name}: {e}")
+        return dict(self.load_state)
+
+    async def _call(self, method: str, **kwargs):
+        client = self.async_client()
+        if client is None:
+            return await asyncio.to_thread(getattr(self.client(), method), **kwargs)
+        return await getattr(client, method)(**kwargs)
+
+    async def search(
+        self,
+        collection_name: str,
+        vectors: list,
+        limit: int,
+        search_params: dict,
+        output_fields: Optional[list[str]] = None,
+        anns_field: str = "q_vector",
+    ) -> list[list[dict]]:
+        """
+        Search several query vectors at once.
+
+        The queries go in batches of MILVUS_SEARCH_BATCH per call, and the
+        batches run concurrently on different pooled connections.
+
+        Returns:
+            list[list[dict]]: One list of {"id", "distance", "entity"} hits per query.
+        """
+        if not vectors:
+            return []
+        if self.load_state.get(collection_name) != "Loaded":
+            await asyncio.to_thread(self.ensure_loaded, collection_name)
+        batches = [
+            vectors[start : start + MILVUS_SEARCH_BATCH]
+            for start in range(0, len(vectors), MILVUS_SEARCH_BATCH)
+        ]
+        results = await asyncio.gather(
+            *(
+                self._call(
+                    "search",
+                    collection_name=collection_name,
+                    anns_field=anns_field,
+                    data=batch,
+                    limit=limit,
+                    search_params=search_params,
+                    output_fields=output_fields or [],
+                )
+                for batch in batches
+            )
+        )
+        return [list(hits) for result in results for hits in result]
+
+    async def insert(self, collection_name: str, rows: list[dict]) -> dict:
+        return await self._call("insert", collection_name=collection_name, data=rows)
+
+    async def upsert(self, collection_name: str, rows: list[dict]) -> dict:
+        return await self._call("upsert", collection_name=collection_name, data=rows)
+
+    async def delete(self, collection_name: str, ids: list[str]) -> dict:
+        return await self._call("delete", collection_name=collection_name, ids=ids)
+
+    async def aclose(self):
+        for client in self._async_clients:
+            await client.close()
+        self._async_clients = []
+
+    def stats(self) -> dict:
+        return {
+            "uri": self.uri,
+            "db_name": self.db_name,
+            "connections": len(self._clients),
+            "async_connections": len(self._async_clients),
+            "load_state": dict(self.load_state),
+        }
+
+
+_pools: dict[tuple[str, str], MilvusPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_milvus_pool(db_name: str = MILVUS_DB, uri: str = MILVUS_URI) -> MilvusPool:
+    """
+    Return the process-wide pool of a database, creating it on first use.
+    """
+    with _pools_lock:
+        key = (uri, db_name)
+        if key not in _pools:
+            _pools[key] = MilvusPool(uri, db_name)
+        return _pools[key]
+
+
+async def close_milvus_pools():
+    for pool in list(_pools.values()):
+        await pool.aclose()
+    _pools.clear()
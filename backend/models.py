@@ -1,4 +1,11 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from index_tuning import SEARCH_MAX_LIMIT
+from milvus import Q_CHUNK_MAX_LENGTH
+from pydantic import BaseModel, Field, model_validator
+
+# Largest batch accepted by the ingestion jobs
+INGEST_MAX_BATCH_SIZE = 4096
 
 
 # Define a data model using Pydantic for the request body
@@ -6,7 +13,56 @@ class Answer_Request(BaseModel):
     model: str = "qwen2.5:1.5b"  # Name of the model to be used
     prompt: str  # Prompt to be sent to the model
     stream: bool = False  # Flag to enable streaming of responses
+    question: Optional[str] = None  # Original user question, enables the answer cache
+    context_ids: Optional[list[str]] = None  # IDs of the retrieved chunks used in the prompt
 
 
 class Data_embed(BaseModel):
     texts: list[str]
+    batch_size: Optional[int] = None  # Texts per Ollama call (server default if None)
+
+
+class Search_Request(BaseModel):
+    queries: list[str]  # Questions searched in a single batch
+    # Hits per query (server default if None)
+    limit: Optional[int] = Field(None, ge=1, le=SEARCH_MAX_LIMIT)
+
+
+class Ask_Request(BaseModel):
+    question: str
+    model: str = "qwen2.5:1.5b"
+    stream: bool = True
+    # Context chunks retrieved for the question (server default if None)
+    limit: Optional[int] = Field(None, ge=1, le=SEARCH_MAX_LIMIT)
+
+
+class Warmup_Request(BaseModel):
+    model: str  # Model to load (generation or embedding)
+
+
+class Invalidate_Request(BaseModel):
+    ids: Optional[list[str]] = None  # Re-ingested chunk IDs; None invalidates everything
+
+
+class Ingest_Document(BaseModel):
+    name: str  # File name; prefixes the question IDs of the document
+    content: str  # Questions in the "ID: ..." format of the FAQ files
+
+
+class Ingest_Options(BaseModel):
+    # Chunks per embedding call, insert and checkpoint
+    batch_size: int = Field(64, ge=1, le=INGEST_MAX_BATCH_SIZE)
+    # Maximum length of each chunk; longer ones do not fit the q_chunk field
+    max_length: int = Field(450, ge=1, le=Q_CHUNK_MAX_LENGTH)
+    # Characters of overlap between consecutive chunks
+    overlap: int = Field(100, ge=0)
+
+    @model_validator(mode="after")
+    def check_overlap(self):
+        if self.overlap >= self.max_length:
+            raise ValueError("overlap debe ser menor que max_length")
+        return self
+
+
+class Ingest_Documents_Request(Ingest_Options):
+    documents: list[Ingest_Document]
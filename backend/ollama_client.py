@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+
+from ollama_router import FAILOVER_ERRORS, OllamaRouter
+
+# Ollama endpoints. The embedding daemon can live on a different host/port.
+OLLAMA_LLM_URL = os.getenv("OLLAMA_LLM_URL", "http://ollama_llm:11434")
+OLLAMA_EMBED_URL = "http://{}:{}".format(
+    os.getenv("URL_FOR_EMBED", "ollama_llm"), os.getenv("PORT_FOR_EMBED", 11434)
+)
+# Several daemons per role (comma-separated); see ollama_router.OllamaRouter
+OLLAMA_GENERATE_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_GENERATE_URLS", OLLAMA_LLM_URL).split(",")
+    if url.strip()
+]
+OLLAMA_EMBED_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_EMBED_URLS", OLLAMA_EMBED_URL).split(",")
+    if url.strip()
+]
+
+# Per-endpoint timeouts (seconds). Generation on CPU can take minutes.
+GENERATE_TIMEOUT = float(os.getenv("OLLAMA_GENERATE_TIMEOUT", 500))
+EMBED_TIMEOUT = float(os.getenv("OLLAMA_EMBED_TIMEOUT", 60))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+
+# Maximum number of requests in flight against each node.
+MAX_CONCURRENT_GENERATE = int(os.getenv("OLLAMA_MAX_CONCURRENT_GENERATE", 8))
+MAX_CONCURRENT_EMBED = int(os.getenv("OLLAMA_MAX_CONCURRENT_EMBED", 16))
+
+DEFAULT_EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text:latest")
+# Models served by the embed nodes (comma-separated); any other model is
+# served by the generate nodes
+OLLAMA_EMBED_MODELS = {DEFAULT_EMBED_MODEL} | {
+    model.strip() for model in os.getenv("OLLAMA_EMBED_MODELS", "").split(",") if model.strip()
+}
+
+# How long Ollama keeps a model loaded after its last request ("30m", "-1" = forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Per-model overrides, as JSON: {"qwen2.5:7b": "10m", "nomic-embed-text:latest": "-1"}
+OLLAMA_MODEL_KEEP_ALIVE: dict = json.loads(os.getenv("OLLAMA_MODEL_KEEP_ALIVE", "{}"))
+
+
+def keep_alive_for(model: str):
+    """
+    keep_alive sent to Ollama for a model. Plain numbers are seconds (Ollama
+    does not parse "-1" as a duration string).
+    """
+    value = OLLAMA_MODEL_KEEP_ALIVE.get(model, OLLAMA_KEEP_ALIVE)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class OllamaClient:
+    """
+    Long-lived async client for the Ollama HTTP API.
+
+    A single instance is shared by every route. It keeps a pool of keep-alive
+    connections and limits how many generate/embed calls are in flight on
+    each node, so a slow generation never blocks the event loop or starves
+    embeddings. Calls are spread over the nodes of their role by an
+    OllamaRouter, with failover when a node cannot be reached.
+    """
+
+    def __init__(
+        self,
+        generate_urls: list[str] = OLLAMA_GENERATE_URLS,
+        embed_urls: list[str] = OLLAMA_EMBED_URLS,
+        max_generate: int = MAX_CONCURRENT_GENERATE,
+        max_embed: int = MAX_CONCURRENT_EMBED,
+    ):
+        self._generate_timeout = httpx.Timeout(GENERATE_TIMEOUT, connect=CONNECT_TIMEOUT)
+        self._embed_timeout = httpx.Timeout(EMBED_TIMEOUT, connect=CONNECT_TIMEOUT)
+        connections = (max_generate * len(generate_urls)) + (max_embed * len(embed_urls))
+        limits = httpx.Limits(
+            max_connections=connections,
+            max_keepalive_connections=connections,
+            keepalive_expiry=60,
+        )
+        self._http = httpx.AsyncClient(limits=limits)
+        self.router = OllamaRouter(
+            self._http,
+            {"generate": generate_urls, "embed": embed_urls},
+            {"generate": max_generate, "embed": max_embed},
+        )
+
+    def role_of(self, model: str) -> str:
+        """
+        Node group that serves a model: "embed" or "generate".
+        """
+        return "embed" if model in OLLAMA_EMBED_MODELS else "generate"
+
+    async def _post(
+        self,
+        role: str,
+        model: str,
+        path: str,
+        payload: dict,
+        timeout: httpx.Timeout,
+        idempotent: bool = True,
+    ) -> dict:
+        # Try the nodes of the role in the router's order until one answers
+        error: Optional[Exception] = None
+        for node in self.router.candidates(role, model):
+            async with self.router.use(node):
+                try:
+                    response = await self._http.post(
+                        f"{node.url}{path}", json=payload, timeout=timeout
+                    )
+                    response.raise_for_status()
+                except (httpx.HTTPStatusError, *FAILOVER_ERRORS) as e:
+                    if not self.router.should_fail_over(node, e, idempotent):
+                        raise
+                    error = e
+                    continue
+            self.router.served(node, model)
+            return response.json()
+        raise error  # type: ignore
+
+    async def embed(
+        self, texts: list[str], model: str = DEFAULT_EMBED_MODEL
+    ) -> list[list[float]]:
+        """
+        Embed a list of texts with a single call to /api/embed.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            model (str): The embedding model to use.
+
+        Returns:
+            list[list[float]]: One embedding vector per input text, in order.
+        """
+        payload = {"model": model, "input": texts, "keep_alive": keep_alive_for(model)}
+        result = await self._post("embed", model, "/api/embed", payload, self._embed_timeout)
+        return result["embeddings"]
+
+    async def generate(self, model: str, prompt: str, **options: Any) -> dict:
+        """
+        Run a non-streaming generation with /api/generate.
+
+        Args:
+            model (str): The model to use.
+            prompt (str): The prompt to send.
+            **options: Extra fields forwarded to Ollama (e.g. keep_alive).
+
+        Returns:
+            dict: The final Ollama response object.
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": keep_alive_for(model),
+            **options,
+        }
+        return await self._post(
+            "generate",
+            model,
+            "/api/generate",
+            payload,
+            self._generate_timeout,
+            idempotent=False,
+        )
+
+    async def generate_stream(
+        self, model: str, prompt: str, **options: Any
+    ) -> AsyncIterator[dict]:
+        """
+        Run a streaming generation with /api/generate.
+
+        Yields each NDJSON object as soon as Ollama emits them. The node's
+        generate slot is held until the stream is exhausted or closed. As
+        with generate, the call fails over to another node only when the
+        node could not be reached or answered 404 (model not there); any
+        other error status may come from a generation that already started.
+
+        Args:
+            model (str): The model to use.
+            prompt (str): The prompt to send.
+            **options: Extra fields forwarded to Ollama (e.g. keep_alive).
+
+        Yields:
+            dict: Partial responses; the last one has "done": True.
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": keep_alive_for(model),
+            **options,
+        }
+        error: Optional[Exception] = None
+        for node in self.router.candidates("generate", model):
+            started = False
+            async with self.router.use(node):
+                try:
+                    async with self._http.stream(
+                        "POST",
+                        f"{node.url}/api/generate",
+                        json=payload,
+                        timeout=self._generate_timeout,
+                    ) as response:
+                        if response.is_error:
+                            await response.aread()
+                            response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            try:
+                                chunk = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            started = True
+                            yield chunk
+                except (httpx.HTTPStatusError, *FAILOVER_ERRORS) as e:
+                    if started or not self.router.should_fail_over(
+                        node, e, idempotent=False
+                    ):
+                        raise
+                    error = e
+                    continue
+            self.router.served(node, model)
+            return
+        raise error  # type: ignore
+
+    async def warm(self, model: str, system: Optional[str] = None) -> dict:
+        """
+        Load a model into memory and refresh its keep_alive.
+
+        Models of the embed nodes (OLLAMA_EMBED_MODELS) get an empty
+        /api/embed call there. Generation models get a
+        one-token generation; with `system`, the system prompt is evaluated
+        too, so its KV cache is ready for the next request sharing it.
+
+        Returns:
+            dict: The final Ollama response (with load_duration).
+        """
+        if self.role_of(model) == "embed":
+            payload = {"model": model, "input": [], "keep_alive": keep_alive_for(model)}
+            return await self._post(
+                "embed", model, "/api/embed", payload, self._generate_timeout
+            )
+        if system is None:
+            # An empty prompt only loads the model
+            return await self.generate(model, "")
+        return await self.generate(
+            model, ".", system=system, options={"num_predict": 1}
+        )
+
+    async def aclose(self):
+        await self.router.stop()
+        await self._http.aclose()
+
+
+_client: Optional[OllamaClient] = None
+
+
+def get_ollama_client() -> OllamaClient:
+    """
+    Return the process-wide Ollama client, creating it on first use.
+
+    Must be called from inside the running event loop.
+    """
+    global _client
+    if _client is None:
+        _client = OllamaClient()
+    return _client
+
+
+async def close_ollama_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
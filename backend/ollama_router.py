@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from metrics import OLLAMA_FAILOVERS, OLLAMA_NODE_IN_FLIGHT, OLLAMA_NODE_UP, log_event
+
+# Seconds between health checks of every node (GET /api/ps)
+HEALTH_CHECK_INTERVAL = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", 15))
+# Timeout of each health check
+HEALTH_CHECK_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_CHECK_TIMEOUT", 3))
+# Extra requests in flight tolerated on a node that already has the model
+# loaded before a less busy node, which would have to load it, is preferred
+AFFINITY_SLACK = int(os.getenv("OLLAMA_AFFINITY_SLACK", 2))
+
+# Errors after which the request is retried on the next node: they are raised
+# before the request is sent, so nothing was computed there
+FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Answers that another node may not give (model not pulled there, daemon error)
+FAILOVER_STATUS = {404, 500, 502, 503}
+# Answers after which a non-idempotent call (a generation) can be retried: the
+# model is not on that node, so it did no work
+SAFE_FAILOVER_STATUS = {404}
+
+
+class NoOllamaNodes(RuntimeError):
+    def __init__(self, role: str):
+        super().__init__(f"No hay ningún nodo de Ollama configurado para '{role}'.")
+        self.role = role
+
+
+class OllamaNode:
+    """
+    One Ollama daemon serving a role ("generate" or "embed").
+    """
+
+    def __init__(self, role: str, url: str, max_in_flight: int):
+        self.role = role
+        self.url = url.rstrip("/")
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        # Optimistic until the first health check says otherwise
+        self.healthy = True
+        self.models: set[str] = set()
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.requests = 0
+        self.failures = 0
+
+    def set_healthy(self, healthy: bool, error: Optional[str] = None):
+        if healthy != self.healthy:
+            log_event("ollama_node", role=self.role, url=self.url, healthy=healthy, error=error)
+        self.healthy = healthy
+        self.last_error = error
+        OLLAMA_NODE_UP.labels(self.role, self.url).set(1 if healthy else 0)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "models": sorted(self.models),
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaRouter:
+    """
+    Spread Ollama calls over several daemons per role.
+
+    Each call goes to the least busy healthy node, except that a node which
+    already has the model loaded is kept while it is at most AFFINITY_SLACK
+    requests busier (loading a model on CPU costs far more than queueing
+    behind a couple of requests). Nodes that cannot be reached are marked
+    down and the call moves on to the next one; a background task checks
+    every node each HEALTH_CHECK_INTERVAL seconds and refreshes the models it
+    has loaded.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        endpoints: dict[str, list[str]],
+        max_in_flight: dict[str, int],
+    ):
+        self._http = http
+        self.nodes: dict[str, list[OllamaNode]] = {
+            role: [OllamaNode(role, url, max_in_flight[role]) for url in urls]
+            for role, urls in endpoints.items()
+        }
+        self._health_task: Optional[asyncio.Task] = None
+
+    def candidates(self, role: str, model: Optional[str] = None) -> list[OllamaNode]:
+        """
+        Nodes of a role in the order they should be tried. Nodes marked down
+        come last, so a call is still attempted if every node looks down.
+        """
+        nodes = self.nodes.get(role)
+        if not nodes:
+            raise NoOllamaNodes(role)
+        healthy = [node for node in nodes if node.healthy]
+        least = min((node.in_flight for node in healthy), default=0)
+
+        def preference(node: OllamaNode):
+            warm = model in node.models and node.in_flight <= least + AFFINITY_SLACK
+            return (0 if warm else 1, node.in_flight)
+
+        down = [node for node in nodes if not node.healthy]
+        return sorted(healthy, key=preference) + down
+
+    @asynccontextmanager
+    async def use(self, node: OllamaNode) -> AsyncIterator[OllamaNode]:
+        """
+        Hold one request slot of a node (waiting requests count as load too).
+        """
+        node.in_flight += 1
+        OLLAMA_NODE_IN_FLIGHT.labels(node.role, node.url).set(node.in_flight)
+        try:
+            async with node.slots:
+                node.requests += 1
+                yield node
+        finally:
+            node.in_flight -= 1
+            OLLAMA_NODE_IN_FLIGHT.labels(node.role, node.url).set(node.in_flight)
+
+    def should_fail_over(
+        self, node: OllamaNode, error: Exception, idempotent: bool = True
+    ) -> bool:
+        """
+        Record a failed call and tell whether the next node should be tried.
+
+        Args:
+            idempotent (bool): Whether the call can safely run twice. A
+                generation that may have started on the node (any error
+                status but 404) is not retried elsewhere.
+        """
+        node.failures += 1
+        statuses = FAILOVER_STATUS if idempotent else SAFE_FAILOVER_STATUS
+        if isinstance(error, FAILOVER_ERRORS):
+            # A pool timeout only means our own connections to it are busy
+            if not isinstance(error, httpx.PoolTimeout):
+                node.set_healthy(False, f"{type(error).__name__}: {error}")
+        elif not (
+            isinstance(error, httpx.HTTPStatusError)
+            and error.response.status_code in statuses
+        ):
+            return False
+        OLLAMA_FAILOVERS.labels(node.role).inc()
+        log_event("ollama_failover", role=node.role, url=node.url, error=str(error))
+        return True
+
+    def served(self, node: OllamaNode, model: str):
+        # A successful call leaves the model loaded there
+        node.models.add(model)
+        if not node.healthy:
+            node.set_healthy(True)
+
+    async def check(self, node: OllamaNode):
+        try:
+            response = await self._http.get(
+                f"{node.url}/api/ps", timeout=HEALTH_CHECK_TIMEOUT
+            )
+            response.raise_for_status()
+            node.models = {model["name"] for model in response.json().get("models", [])}
+            node.set_healthy(True)
+        except Exception as e:
+            node.set_healthy(False, f"{type(e).__name__}: {e}")
+        node.last_check = time.time()
+
+    async def check_all(self):
+        await asyncio.gather(
+            *(self.check(node) for nodes in self.nodes.values() for node in nodes)
+        )
+
+    async def _health_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    def start(self):
+        """
+        Start the background health checks (from inside the event loop).
+        """
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def stats(self) -> dict:
+        return {
+            role: [node.stats() for node in nodes] for role, nodes in self.nodes.items()
+        }
@@ -1,177 +1,142 @@
 import datetime
 import json
 import logging
-import re
-from typing import Optional
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
 
 import requests
-import streamlit as st
 from dotenv import load_dotenv
-from pymilvus import MilvusClient
 
 load_dotenv()
 
 
+REQUEST_ID_HEADER = "X-Request-ID"
+CLIENT_ID_HEADER = "X-Client-ID"
+
+
 def print_with_date(message: str):
     print(datetime.datetime.now(), "-->", message)
 
 
-def get_answer_from_model(
-    prompt: str,
-    model: str = "qwen2.5:3B",
-    endpoint: str = "http://localhost:5000/get_answer/",
-):
-    """
-    Get answer from model.
+def request_headers(request_id: Optional[str], client_id: Optional[str] = None) -> dict:
+    headers = {REQUEST_ID_HEADER: request_id} if request_id else {}
+    if client_id:
+        headers[CLIENT_ID_HEADER] = client_id
+    return headers
 
-    Args:
-        prompt (str): The prompt to be sent to the model.
-        model (str): The model to be used.
-        endpoint (str): The endpoint to be used.
 
-    Returns:
-        str: The answer from the model.
+def busy_message(response: requests.Response) -> str:
     """
-    # print("The len of prompt is:", prompt)
-
-    # Validate inputs
-    if not prompt:
-        return "Error: the prompt must be a non-empty string."
-    if not model:
-        return "Error: The model parameter must be a non-empty string."
-
-    # Build payload
-    payload = {"model": model, "prompt": prompt, "stream": False, "port": 11434}
-
-    # Validate JSON
-    try:
-        json_payload = json.dumps(payload)
-        json.loads(json_payload)
-    except ValueError as e:
-        return f"Error: The JSON generated is not valid: {e}"
-
-    # Send the request
-    try:
-        response = requests.post(endpoint, json=payload, timeout=500)
-        response.raise_for_status()
-
-        print("The answer is:", response.text)
-
-        # Process response
-        data = response.json()
-        if "response" in data:
-            return data["response"]
-        else:
-            logging.error(f"Wrong response format from server: {data}")
-            return "Error: The answer format from server is not valid."
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Connection error: {e}")
-        return f"Connection error: {e}"
-
-
-def get_question_contents(questions_id: list[str]) -> str:
+    Message shown when the backend rejects a question because its queue is full (429).
     """
-    Retrieve the contents of questions from a file.
+    retry_after = response.headers.get("Retry-After")
+    wait = f" en unos {retry_after} s" if retry_after else " en unos momentos"
+    return f"El servidor está ocupado. Intenta de nuevo{wait}."
 
-    Args:
-        questions_id (list[str]): A list of question IDs.
 
-    Returns:
-        str: The contents of the questions.
+@contextmanager
+def timed_stage(stage: str, request_id: Optional[str] = None):
     """
-    file_path = "./documents/mf3.txt"
+    Print how long a stage of the query took, tagged with the request ID.
+    """
+    start = time.perf_counter()
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-
-        # Regular expression to capture IDs and their content
-        pattern = r"(ID:\s*[A-Za-z0-9_-]+_[\w-]+_P\d+)\s*([\s\S]*?)(?=ID:\s*[A-Za-z0-9_-]+_[\w-]+_P\d+|\Z)"
-        matches = re.findall(pattern, content)
-
-        # Create a dictionary with IDs as keys and content as values
-        result: dict[str, str] = {}
-        for match in matches:
-            question_id = match[0].strip()
-            question_content = match[1].strip()
-            result[question_id] = question_content
-
-        # Adjust IDs in questions_id to match dictionary keys
-        adjusted_questions_id: list[str] = [f"ID: {c_id}" for c_id in questions_id]
-
-        # Obtain contents corresponding to adjusted IDs
-        contents = [
-            result.get(c_id, f"ID not found: {c_id}") for c_id in adjusted_questions_id
-        ]
-        return contents  # type: ignore
-
-    except Exception as e:
-        st.error(f"Error reading file or extracting data: {e}")
-        return []  # type: ignore
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print_with_date(f"[{request_id or '-'}] {stage}: {elapsed_ms:.1f} ms")
 
 
-@st.cache_resource
-def get_milvus_client(db_name: str, collection_name: str) -> Optional[MilvusClient]:
+def ask_question(
+    question: str,
+    model: str = "qwen2.5:3B",
+    endpoint: str = "http://localhost:5000/ask",
+    request_id: Optional[str] = None,
+    sources: Optional[list] = None,
+    client_id: Optional[str] = None,
+    on_queue: Optional[Callable[[Optional[dict]], None]] = None,
+) -> Iterator[str]:
     """
-    Initialize and return a Milvus client.
+    Stream the answer of the server-side RAG pipeline (/ask) token by token.
 
     Args:
-        db_name (str): The name of the database.
-        collection_name (str): The name of the collection.
-
-    Returns:
-        Optional[MilvusClient]: The initialized Milvus client or None if an error occurs.
+        question (str): The user question.
+        model (str): The model to be used.
+        endpoint (str): The /ask endpoint.
+        request_id (str, optional): Sent as X-Request-ID to correlate the backend logs.
+        sources (list, optional): Filled with the retrieved sources ({"id", "question_id", "score"}).
+        client_id (str, optional): Sent as X-Client-ID so the backend queues sessions fairly.
+        on_queue (callable, optional): Called with {"position", "eta_seconds"} while the
+            question waits for the model, and with None once the answer starts.
+
+    Yields:
+        str: Fragments of the answer as soon as the backend emits them.
     """
-    milvus_url = "http://localhost:19530"
+    if not question:
+        yield "Error: the question must be a non-empty string."
+        return
+
+    payload = {"question": question, "model": model, "stream": True}
+    queued = False
     try:
-        print_with_date(f"Intentando conectar a Milvus en {milvus_url}...")
-        client = MilvusClient(uri=milvus_url)
-        print_with_date(
-            f"Conectado a Milvus. Intentando usar base de datos '{db_name}'..."
-        )
-        client.using_database(db_name)  # type: ignore
-        print_with_date(f"Base de datos '{db_name}' seleccionada.")
-
-        print_with_date(
-            f"Verificando existencia de la colección '{collection_name}'..."
-        )
-        if not client.has_collection(collection_name):  # type: ignore
-            st.error(
-                f"Error crítico: La colección '{collection_name}' no existe en la base de datos '{db_name}'."
-            )
-            logging.error(
-                f"La colección '{collection_name}' no existe en la DB '{db_name}'."
-            )
-            return None
-
-        print_with_date(
-            f"Colección encontrada. Intentando cargar '{collection_name}' en memoria..."
-        )
-        client.load_collection(collection_name)  # type: ignore
-        print_with_date(f"Colección '{collection_name}' cargada exitosamente.")
-        return client
-    except Exception as e:
-        st.error(f"No se pudo conectar o preparar la colección en Milvus: {e}")
-        logging.error(f"Error conectando/cargando colección Milvus: {e}", exc_info=True)
-        return None
+        # The read timeout applies between chunks, not to the whole answer
+        with requests.post(
+            endpoint,
+            json=payload,
+            headers=request_headers(request_id, client_id),
+            stream=True,
+            timeout=(10, 500),
+        ) as response:
+            if response.status_code == 429:
+                yield busy_message(response)
+                return
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line.decode("utf-8"))
+                except json.JSONDecodeError:
+                    continue
+                if "sources" in chunk:
+                    if sources is not None:
+                        sources.extend(chunk["sources"])
+                    continue
+                if "queue" in chunk:
+                    queued = True
+                    if on_queue is not None:
+                        on_queue(chunk["queue"])
+                    continue
+                if queued and on_queue is not None:
+                    on_queue(None)
+                queued = False
+                if "error" in chunk:
+                    logging.error(f"Error while streaming the answer: {chunk['error']}")
+                    yield f"\n\nError: {chunk['error']}"
+                    return
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    return
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Connection error: {e}")
+        yield f"Connection error: {e}"
 
 
-def get_embedding_ollama(text: str):
+def warm_model(
+    model: str, endpoint: str = "http://localhost:5000/warmup"
+) -> Optional[dict]:
     """
-    Sends a POST request to the Ollama API to convert text into an embedding.
+    Ask the backend to load a model before the first question needs it.
 
-    text: list of texts: ["your text"]
     Returns:
-        list: The embedding vector as a list of floats.
+        dict: The warm-up result (load time, keep_alive), or None on error.
     """
-    url = "http://localhost:5000/generate-embeddings/"
-    payload = {"texts": [text]}
     try:
-        response = requests.post(url, json=payload)
+        response = requests.post(endpoint, json={"model": model}, timeout=300)
         response.raise_for_status()
-        data = response.json()
-        # Se asume que la respuesta tiene el formato:
-        # {"embeddings": [[0.123,...,0.456]]}
-        return data["embeddings"][0]
-    except Exception as e:
-        st.error(f"Error al obtener el embedding desde la API: {e}")
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Could not warm up {model}: {e}")
         return None
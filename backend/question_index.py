@@ -0,0 +1,172 @@
+import json
+import mmap
+import os
+import re
+import threading
+from typing import Optional
+
+# A word character of an ID in UTF-8. Bytes patterns only know ASCII, so the
+# multibyte characters ("facturación") are spelled out, except the Latin-1
+# symbols (lead byte C2: no-break space, "¿", "«") and the general
+# punctuation and symbol blocks U+2000-U+2FFF (lead byte E2)
+_ID_CHAR = (
+    rb"(?:[\w-]|[\xc3-\xdf][\x80-\xbf]|[\xe0\xe1\xe3-\xef][\x80-\xbf]{2}"
+    rb"|[\xf0-\xf4][\x80-\xbf]{3})"
+)
+_QUESTION_ID = rb"%s+_%s+_P\d+" % (_ID_CHAR, _ID_CHAR)
+# Same question layout as the FAQ documents: "ID: <system>_<topic>_P<n>" followed by its content
+QUESTION_PATTERN = re.compile(
+    rb"ID:\s*(%s)\s*([\s\S]*?)(?=ID:\s*%s|\Z)" % (_QUESTION_ID, _QUESTION_ID)
+)
+
+INDEX_SUFFIX = ".idx.json"
+# Bumped when QUESTION_PATTERN changes, so that older indexes are rebuilt
+INDEX_VERSION = 2
+
+
+def index_path_for(source_path: str) -> str:
+    return source_path + INDEX_SUFFIX
+
+
+def _source_signature(source_path: str) -> dict:
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_question_index(source_path: str, index_path: Optional[str] = None) -> dict:
+    """
+    Scan a questions file once and persist an ID -> (byte offset, length) index.
+
+    The file is scanned through a memory map, so it is never loaded as a whole
+    into Python strings. The index records the size and mtime of the source so
+    that a stale index can be detected.
+
+    Args:
+        source_path (str): The questions file.
+        index_path (str, optional): Where to write the index. Defaults to `<source>.idx.json`.
+
+    Returns:
+        dict: The index, with the keys "size", "mtime_ns", "version" and "entries".
+    """
+    index: dict = {
+        **_source_signature(source_path),
+        "version": INDEX_VERSION,
+        "entries": {},
+    }
+    if index["size"] > 0:
+        with open(source_path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            for match in QUESTION_PATTERN.finditer(data):  # type: ignore
+                question_id = match.group(1).decode("utf-8")
+                start, end = match.span(2)
+                index["entries"][question_id] = [start, end - start]
+
+    index_path = index_path or index_path_for(source_path)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path)
+    return index
+
+
+class QuestionIndex:
+    """
+    O(1) question lookups backed by a persistent offset index and a memory map.
+
+    Every lookup checks the size and mtime of the source file; when they no
+    longer match the index, the index is rebuilt before answering.
+    """
+
+    def __init__(self, source_path: str, index_path: Optional[str] = None):
+        self.source_path = source_path
+        self.index_path = index_path or index_path_for(source_path)
+        self._lock = threading.Lock()
+        self._signature: Optional[dict] = None
+        self._entries: dict[str, list[int]] = {}
+        self._file = None
+        self._data: Optional[mmap.mmap] = None
+
+    def get(self, question_id: str) -> Optional[str]:
+        """
+        Return the content of a question, or None if the ID is not indexed.
+        """
+        return self.get_many([question_id])[0]
+
+    def get_many(self, question_ids: list[str]) -> list[Optional[str]]:
+        """
+        Return the contents of several questions, in order.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            results: list[Optional[str]] = []
+            for question_id in question_ids:
+                entry = self._entries.get(question_id)
+                if entry is None or self._data is None:
+                    results.append(None)
+                    continue
+                offset, length = entry
+                raw = self._data[offset : offset + length]
+                results.append(raw.decode("utf-8").strip())
+            return results
+
+    def __contains__(self, question_id: str) -> bool:
+        with self._lock:
+            self._ensure_fresh()
+            return question_id in self._entries
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    def _ensure_fresh(self):
+        signature = _source_signature(self.source_path)
+        if signature == self._signature:
+            return
+
+        index = self._load_index()
+        if (
+            index is None
+            or index.get("version") != INDEX_VERSION
+            or {k: index.get(k) for k in signature} != signature
+        ):
+            print(f"Reconstruyendo índice de preguntas para {self.source_path}")
+            index = build_question_index(self.source_path, self.index_path)
+
+        self._unmap()
+        self._entries = index["entries"]
+        self._signature = signature
+        if signature["size"] > 0:
+            self._file = open(self.source_path, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load_index(self) -> Optional[dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _unmap(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._signature = None
+
+
+_indexes: dict[str, QuestionIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_question_index(source_path: str) -> QuestionIndex:
+    """
+    Return the shared QuestionIndex of a file, creating it on first use.
+    """
+    key = os.path.abspath(source_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = QuestionIndex(source_path)
+        return _indexes[key]
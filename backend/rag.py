@@ -0,0 +1,121 @@
+import asyncio
+import os
+from typing import Optional
+
+from context_packing import PackingStats, pack_context, question_id_of, token_budget
+from embeddings import get_embedding_engine
+from metrics import log_event, span
+from question_index import get_question_index
+from vector_store import VectorStore, get_vector_store
+
+# Source of the full question contents returned with each hit
+QUESTIONS_FILE = os.getenv("QUESTIONS_FILE", "./documents/mf3.txt")
+# Hits returned per query when the caller does not say
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 5))
+
+# Fixed instruction block, sent as the system prompt. It is identical for
+# every question, so Ollama can reuse its KV cache; only the context and the
+# question that follow it are evaluated per request.
+SYSTEM_PROMPT = """**Rol:** Eres un asistente experto que responde preguntas sobre el software basándose *únicamente* en fragmentos de documentación proporcionados.
+
+**Tarea:** Analiza el "Contexto" que acompaña a cada pregunta, que puede contener uno o más fragmentos relevantes. Responde la "Pregunta" del usuario de forma precisa y útil.
+
+**Instrucciones:**
+1.  Para cada fragmento en el contexto, localiza la información más relevante para la pregunta, priorizando `Sct. Respuesta` y `Sct. Pasos a Seguir`.
+2.  **Sintetiza** la información de los fragmentos relevantes en una **única respuesta coherente**. No te limites a listar las respuestas de cada fragmento por separado.
+3.  La respuesta debe ser clara, directa y enfocada en resolver la duda del usuario.
+4.  Basa tu respuesta *exclusivamente* en el contexto. No inventes información ni uses conocimiento externo.
+5.  Si el contexto no contiene la información necesaria, indícalo claramente."""
+
+QUESTION_TEMPLATE = """**Contexto:**
+{context}
+
+**Pregunta:** {question}
+
+**Respuesta:**"""
+
+_store: Optional[VectorStore] = None
+
+
+def get_search_store() -> VectorStore:
+    """
+    Return the vector store used by /search and /ask, creating it on first use.
+
+    In-process stores are reloaded when another process (a CLI ingestion)
+    has saved new files since.
+    """
+    global _store
+    if _store is None:
+        _store = get_vector_store()
+    else:
+        _store.refresh()
+    return _store
+
+
+def _hydrate(hits: list[list[dict]]) -> list[list[dict]]:
+    # Every hit gets the full question text; chunks of questions that are not
+    # in the questions file (e.g. other documents) fall back to the chunk itself
+    record_ids = [hit["id"] for query_hits in hits for hit in query_hits]
+    question_ids = [question_id_of(record_id) for record_id in record_ids]
+    try:
+        contents = get_question_index(QUESTIONS_FILE).get_many(question_ids)
+    except OSError as e:
+        log_event("questions_read_error", path=QUESTIONS_FILE, error=str(e))
+        contents = [None] * len(question_ids)
+
+    position = 0
+    results = []
+    for query_hits in hits:
+        hydrated = []
+        for hit in query_hits:
+            chunk = hit.get("entity", {}).get("q_chunk", "")
+            content = contents[position]
+            hydrated.append(
+                {
+                    "id": hit["id"],
+                    "question_id": question_ids[position],
+                    "score": hit["distance"],
+                    "chunk": chunk,
+                    "content": content if content is not None else chunk,
+                }
+            )
+            position += 1
+        results.append(hydrated)
+    return results
+
+
+async def search(
+    queries: list[str], limit: int = SEARCH_LIMIT
+) -> tuple[list[list[dict]], list[list[float]]]:
+    """
+    Embed the queries, search the vector store and hydrate the hits.
+
+    Args:
+        queries (list[str]): The questions, searched in a single batch.
+        limit (int): Hits per query.
+
+    Returns:
+        tuple: One list of hits ({"id", "question_id", "score", "chunk",
+            "content"}) per query, and the query embeddings.
+    """
+    with span("embed", texts=len(queries)):
+        vectors = await get_embedding_engine().embed(queries)
+    with span("search", queries=len(queries)):
+        hits = await get_search_store().asearch(vectors, limit, ["q_chunk"])
+    with span("hydrate"):
+        results = await asyncio.to_thread(_hydrate, hits)
+    return results, vectors
+
+
+def build_prompt(question: str, hits: list[dict], model: str) -> tuple[str, PackingStats]:
+    """
+    Build the per-question part of the prompt (sent after SYSTEM_PROMPT).
+
+    The context is packed to the token budget of the model (see
+    context_packing.pack_context).
+
+    Returns:
+        tuple: The prompt and the packing stats.
+    """
+    context, stats = pack_context(hits, token_budget(model))
+    return QUESTION_TEMPLATE.format(context=context, question=question), stats
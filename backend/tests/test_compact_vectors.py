@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from compact_vectors import full_collection_name, get_compact_vector_store, truncate
+
+DIM = 768
+
+
+class FakeMilvusClient:
+    """
+    Collections as dicts of q_id -> vector; search is exact inner product.
+    """
+
+    def __init__(self):
+        self.collections: dict[str, dict[str, np.ndarray]] = {}
+
+    def _rows(self, collection_name):
+        return self.collections.setdefault(collection_name, {})
+
+    def upsert(self, collection_name, data):
+        for row in data:
+            self._rows(collection_name)[row["q_id"]] = np.asarray(row["q_vector"])
+
+    def load_collection(self, collection_name):
+        pass
+
+    def get_collection_stats(self, collection_name):
+        return {"row_count": len(self._rows(collection_name))}
+
+    def query(self, collection_name, ids, output_fields):
+        rows = self._rows(collection_name)
+        return [{"q_id": q_id, "q_vector": list(rows[q_id])} for q_id in ids if q_id in rows]
+
+    def search(self, collection_name, anns_field, data, limit, search_params, output_fields):
+        rows = self._rows(collection_name)
+        ids = list(rows)
+        matrix = np.asarray([rows[q_id] for q_id in ids], dtype=np.float32)
+        results = []
+        for query in np.asarray(data, dtype=np.float32):
+            scores = matrix @ query
+            results.append(
+                [
+                    {"id": ids[i], "distance": float(scores[i]), "entity": {}}
+                    for i in np.argsort(-scores)[:limit]
+                ]
+            )
+        return results
+
+
+def vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def test_milvus_backend_keeps_the_full_vectors_in_milvus(tmp_path):
+    client = FakeMilvusClient()
+    store = get_compact_vector_store(
+        "milvus", str(tmp_path), client, "sarasola", dim=128, storage="float32"
+    )
+    matrix = vectors(50)
+    ids = [f"q{i}" for i in range(50)]
+    store.upsert(
+        [{"q_id": q_id, "q_vector": v, "q_chunk": ""} for q_id, v in zip(ids, matrix)]
+    )
+
+    # A second process (the backend container) sees the same collections
+    other = get_compact_vector_store(
+        "milvus", str(tmp_path / "elsewhere"), client, "sarasola", dim=128, storage="float32"
+    )
+    hits = other.search(matrix[:3], limit=2)
+
+    assert len(client.collections[full_collection_name("sarasola")]) == 50
+    assert len(client.collections["sarasola"][ids[0]]) == 128
+    assert not (tmp_path / "full").exists()
+    assert [query_hits[0]["id"] for query_hits in hits] == ids[:3]
+    assert all(hit["rescored"] for query_hits in hits for hit in query_hits)
+    assert hits[0][0]["distance"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_search_fails_when_the_full_vectors_are_missing(tmp_path):
+    client = FakeMilvusClient()
+    matrix = vectors(10)
+    # Only the compact index was filled, as by an older ingestion
+    client.upsert(
+        "sarasola",
+        [{"q_id": f"q{i}", "q_vector": v} for i, v in enumerate(truncate(matrix, 128))],
+    )
+    store = get_compact_vector_store(
+        "milvus", str(tmp_path), client, "sarasola", dim=128, storage="float32"
+    )
+
+    with pytest.raises(RuntimeError, match="sarasola_full"):
+        store.search(matrix[:1], limit=2)
@@ -0,0 +1,76 @@
+import pytest
+
+from context_packing import merge_overlap, pack_context
+from milvus import split_text_into_chunks
+
+# A question as split_text_into_chunks receives it (markers removed, single
+# spaces between sentences)
+QUESTION = """ID: VER_factura_P12
+Pregunta: ¿Cómo se anula una factura ya contabilizada en el módulo de ventas?
+
+Respuesta: Una factura contabilizada no se borra. Se genera un documento de anulación que revierte el asiento contable y libera el saldo del cliente. El documento de anulación toma la fecha del período abierto. Si el período de la factura está cerrado, el asiento se registra en el período actual. La conciliación bancaria no cambia si la factura no tenía cobros. Si ya tenía cobros, primero hay que deshacer la conciliación del cobro. Después se anula el cobro y por último la factura. El reporte de facturas anuladas muestra el usuario y la fecha de cada anulación.
+
+Pasos a Seguir:
+1. Abrir la factura desde Ventas.
+2. Pulsar Anular y confirmar el motivo.
+
+Observaciones: Las facturas con impuesto retenido necesitan permiso de contabilidad para anularse. El permiso se asigna en Configuración, en la sección de usuarios."""
+
+
+def merge_chunks(chunks: list[str]) -> str:
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        text = merge_overlap(text, chunk)
+    return text
+
+
+@pytest.mark.parametrize(
+    "max_length,overlap", [(450, 100), (512, 100), (200, 50), (300, 150)]
+)
+def test_merging_the_chunks_of_a_question_gives_back_its_text(max_length, overlap):
+    chunks = split_text_into_chunks(QUESTION, max_length, overlap)
+
+    assert len(chunks) > 2
+    assert all(len(chunk) <= max_length for chunk in chunks)
+    assert merge_chunks(chunks) == QUESTION
+
+
+def test_tail_cut_mid_word_is_not_repeated():
+    # Chunks stored before the tail was shortened: `left` was cut at
+    # max_length in the middle of the repeated tail
+    previous = (
+        "La conciliación del cobro se deshace antes de anular la factura "
+        "y la tasa de cambio se conserva."
+    )
+    left = "Inicio del texto. " + previous[:70]
+    right = previous[-60:] + previous[-60:].lstrip() + " Después se anula el cobro."
+
+    merged = merge_overlap(left, right)
+
+    assert merged == "Inicio del texto. " + previous + " Después se anula el cobro."
+
+
+def test_new_section_gets_its_blank_line_back():
+    left = "Primera sección con una frase completa y suficiente texto."
+    right = left[-30:] + "Pasos a Seguir: abrir la factura."
+
+    assert merge_overlap(left, right) == left + "\n\nPasos a Seguir: abrir la factura."
+
+
+def test_pack_context_merges_adjacent_chunks_once():
+    chunks = split_text_into_chunks(QUESTION, 300, 100)
+    hits = [
+        {
+            "id": f"VER_factura_P12_{position}",
+            "question_id": "VER_factura_P12",
+            "score": 0.9,
+            "chunk": chunk,
+        }
+        for position, chunk in enumerate(chunks, start=1)
+    ]
+
+    context, stats = pack_context(hits, budget=10_000)
+
+    assert context == f"VER_factura_P12\n{QUESTION}"
+    assert stats.questions == 1
+    assert stats.truncated == 0
@@ -0,0 +1,63 @@
+import numpy as np
+
+import index_tuning
+from index_tuning import SEARCH_MAX_LIMIT, candidate_grid, search_params
+from milvus import Q_ID_MAX_LENGTH
+
+HNSW = {"metric_type": "COSINE", "search_params": {"ef": 16}}
+
+
+def test_hnsw_ef_is_raised_to_the_limit():
+    assert search_params(HNSW, 200)["params"] == {"ef": 200}
+    assert search_params(HNSW, 5)["params"] == {"ef": 16}
+    assert search_params(HNSW)["params"] == {"ef": 16}
+    # The config itself is left alone
+    assert HNSW["search_params"] == {"ef": 16}
+
+
+def test_other_indexes_ignore_the_limit():
+    ivf = {"metric_type": "COSINE", "search_params": {"nprobe": 32}}
+
+    assert search_params(ivf, SEARCH_MAX_LIMIT) == {
+        "metric_type": "COSINE",
+        "params": {"nprobe": 32},
+    }
+
+
+def test_grid_searches_are_valid_at_the_largest_limit():
+    for index_type, _, searches in candidate_grid(10_000, 768, 5):
+        for search in searches:
+            config = {"metric_type": "COSINE", "search_params": search}
+            ef = search_params(config, SEARCH_MAX_LIMIT)["params"].get("ef")
+            assert ef is None or ef >= SEARCH_MAX_LIMIT, index_type
+
+
+class RecordingClient:
+    def __init__(self):
+        self.schema = None
+        self.rows = []
+
+    def has_collection(self, collection_name):
+        return False
+
+    def create_collection(self, collection_name, schema):
+        self.schema = schema
+
+    def insert(self, collection_name, data):
+        self.rows.extend(data)
+
+    def flush(self, collection_name):
+        pass
+
+
+def test_scratch_collection_takes_directory_ids():
+    client = RecordingClient()
+    long_id = "manuales/contabilidad/cierre/VER_cierre_P1_2" + "x" * 100
+
+    index_tuning._create_scratch_collection(
+        client, "scratch", [long_id], np.zeros((1, 4), dtype=np.float32)
+    )
+
+    q_id = next(field for field in client.schema.fields if field.name == "q_id")
+    assert q_id.params["max_length"] == Q_ID_MAX_LENGTH
+    assert client.rows[0]["q_id"] == long_id
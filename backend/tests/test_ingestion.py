@@ -0,0 +1,120 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.stub_ollama import deterministic_vector
+from ingestion import iter_chunk_batches, run_pipeline
+from vector_store import NumpyVectorStore
+
+# 20 chunks: questions of one to three chunks each
+QUESTIONS = [
+    (
+        f"VER_factura_P{number}",
+        [f"Pregunta {number}, parte {part}." for part in range(number % 3 + 1)],
+    )
+    for number in range(1, 11)
+]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class CountingEmbed:
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.texts.extend(texts)
+        return [deterministic_vector(text) for text in texts]
+
+
+def test_batches_keep_order_and_size():
+    batches = list(iter_chunk_batches(QUESTIONS, batch_size=4))
+
+    ids = [record_id for batch_ids, _ in batches for record_id in batch_ids]
+    assert [len(batch_ids) for batch_ids, _ in batches] == [4, 4, 4, 4, 4]
+    assert ids[:4] == [
+        "VER_factura_P1",
+        "VER_factura_P1_2",
+        "VER_factura_P2",
+        "VER_factura_P2_2",
+    ]
+    assert len(ids) == len(set(ids)) == sum(len(chunks) for _, chunks in QUESTIONS)
+
+
+def test_duplicated_question_ids_keep_the_first():
+    questions = [("VER_factura_P1", ["uno"]), ("VER_factura_P1", ["otro"])]
+
+    batches = list(iter_chunk_batches(questions, batch_size=4))
+
+    assert batches == [(["VER_factura_P1"], ["uno"])]
+
+
+def test_resume_skips_the_inserted_batches(tmp_path):
+    complete = NumpyVectorStore(str(tmp_path / "complete"), fresh=True)
+    run_pipeline(complete, QUESTIONS, batch_size=4, embed=CountingEmbed())
+
+    def stop_after_two(done, stats):
+        if done == 2:
+            raise Interrupted()
+
+    store = NumpyVectorStore(str(tmp_path / "resumed"), fresh=True)
+    with pytest.raises(Interrupted):
+        run_pipeline(
+            store,
+            QUESTIONS,
+            batch_size=4,
+            embed=CountingEmbed(),
+            on_batch=stop_after_two,
+        )
+    assert len(store) == 8
+
+    embed = CountingEmbed()
+    batches_done = []
+    stats = run_pipeline(
+        store,
+        QUESTIONS,
+        batch_size=4,
+        embed=embed,
+        skip_batches=2,
+        on_batch=lambda done, stats: batches_done.append(done),
+    )
+
+    first_batches = list(iter_chunk_batches(QUESTIONS, 4))[:2]
+    skipped = [chunk for _, chunks in first_batches for chunk in chunks]
+    assert batches_done == [3, 4, 5]
+    assert stats.batches == 3
+    assert not set(embed.texts) & set(skipped)
+    assert dict(store.records()) == dict(complete.records())
+    ids, vectors = store.get_vectors(sorted(dict(complete.records())))
+    _, expected = complete.get_vectors(ids)
+    np.testing.assert_array_equal(vectors, expected)
+
+
+def test_stopping_from_on_batch_ends_every_stage(tmp_path):
+    def slow_questions():
+        # The embed stage waits for the parser when the pipeline stops
+        for number in range(20):
+            time.sleep(0.05)
+            yield f"VER_factura_P{number}", [f"Pregunta {number}."]
+
+    def cancel(done, stats):
+        raise Interrupted()
+
+    store = NumpyVectorStore(str(tmp_path / "store"), fresh=True)
+    running = set(threading.enumerate())
+    with pytest.raises(Interrupted):
+        run_pipeline(
+            store,
+            slow_questions(),
+            batch_size=2,
+            queue_size=1,
+            embed=CountingEmbed(),
+            on_batch=cancel,
+        )
+
+    leaked = [thread.name for thread in threading.enumerate() if thread not in running]
+    assert leaked == []
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from ollama_client import OllamaClient
+
+FIRST = "http://ollama-1:11434"
+SECOND = "http://ollama-2:11434"
+
+
+def client_with(first_status: int) -> tuple[OllamaClient, list[str]]:
+    """
+    A client with two generate nodes; the first answers `first_status`.
+    """
+    called: list[str] = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        node = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        called.append(node)
+        if node == FIRST:
+            return httpx.Response(first_status, json={"error": "fallo"})
+        lines = [{"response": "hola", "done": False}, {"response": "", "done": True}]
+        return httpx.Response(200, text="\n".join(json.dumps(line) for line in lines))
+
+    client = OllamaClient([FIRST, SECOND], [FIRST])
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    client.router._http = client._http
+    return client, called
+
+
+async def stream(client: OllamaClient) -> list[dict]:
+    try:
+        return [chunk async for chunk in client.generate_stream("qwen2.5:1.5b", "hola")]
+    finally:
+        await client.aclose()
+
+
+@pytest.mark.parametrize("status", [500, 502, 503])
+def test_streamed_generation_is_not_sent_twice(status):
+    client, called = client_with(status)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(stream(client))
+
+    assert called == [FIRST]
+
+
+def test_streamed_generation_fails_over_when_the_model_is_missing():
+    client, called = client_with(404)
+
+    chunks = asyncio.run(stream(client))
+
+    assert called == [FIRST, SECOND]
+    assert chunks[-1]["done"]
@@ -0,0 +1,65 @@
+import json
+
+from milvus import process_question, split_question_blocks
+from question_index import QUESTION_PATTERN, QuestionIndex, build_question_index
+
+DOCUMENT = """ID: VER_facturación_P1
+Pregunta: ¿Cómo se emite una factura?
+Respuesta: Desde Ventas.
+
+ID: NÓM_configuración_P2
+Pregunta: ¿Dónde se configura la nómina?
+Respuesta: En Configuración.
+
+ID: INV_almacen_P3 
+Pregunta: ¿Qué es un almacén?
+Respuesta: Un lugar de inventario.
+"""
+
+
+def test_pattern_matches_ids_with_accents():
+    ids = [
+        match.group(1).decode("utf-8")
+        for match in QUESTION_PATTERN.finditer(DOCUMENT.encode("utf-8"))
+    ]
+
+    assert ids == ["VER_facturación_P1", "NÓM_configuración_P2", "INV_almacen_P3"]
+
+
+def test_pattern_agrees_with_process_question():
+    expected = [process_question(block)[0] for block in split_question_blocks(DOCUMENT)]
+    ids = [
+        match.group(1).decode("utf-8")
+        for match in QUESTION_PATTERN.finditer(DOCUMENT.encode("utf-8"))
+    ]
+
+    assert ids == expected
+
+
+def test_index_returns_each_question_alone(tmp_path):
+    source = tmp_path / "preguntas.txt"
+    source.write_text(DOCUMENT, encoding="utf-8")
+    index = QuestionIndex(str(source))
+    try:
+        first, second = index.get_many(["VER_facturación_P1", "NÓM_configuración_P2"])
+    finally:
+        index.close()
+
+    assert first == "Pregunta: ¿Cómo se emite una factura?\nRespuesta: Desde Ventas."
+    assert second.startswith("Pregunta: ¿Dónde se configura la nómina?")
+    assert "ID:" not in second
+
+
+def test_index_from_an_older_pattern_is_rebuilt(tmp_path):
+    source = tmp_path / "preguntas.txt"
+    source.write_text(DOCUMENT, encoding="utf-8")
+    stale = build_question_index(str(source))
+    stale.pop("version")
+    stale["entries"] = {}
+    (tmp_path / "preguntas.txt.idx.json").write_text(json.dumps(stale))
+
+    index = QuestionIndex(str(source))
+    try:
+        assert "NÓM_configuración_P2" in index
+    finally:
+        index.close()
@@ -0,0 +1,36 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from pymilvus.exceptions import MilvusException, MilvusUnavailableException
+
+import app as backend
+from ollama_router import NoOllamaNodes
+
+REQUESTS = [
+    ("/search", {"queries": ["¿Cómo anulo una factura?"]}),
+    ("/ask", {"question": "¿Cómo anulo una factura?", "stream": False}),
+]
+TIMEOUT = httpx.ConnectTimeout("timeout")
+
+
+@pytest.mark.parametrize("path,body", REQUESTS)
+@pytest.mark.parametrize(
+    "error,status",
+    [
+        (NoOllamaNodes("No hay nodos de Ollama para embed"), 503),
+        (TIMEOUT, 504),
+        (MilvusUnavailableException(message="sin conexión"), 503),
+        (MilvusException(message="colección no cargada"), 502),
+        (OSError("vectors.npy ilegible"), 502),
+    ],
+)
+def test_search_failures_get_a_clean_status(monkeypatch, path, body, error, status):
+    async def failing_search(queries, limit):
+        raise error
+
+    monkeypatch.setattr(backend.rag, "search", failing_search)
+    # Without the lifespan: no Ollama, Milvus or ingestion workers are started
+    response = TestClient(backend.app).post(path, json=body)
+
+    assert response.status_code == status
+    assert response.json()["detail"]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from vector_codec import (
+    ACCEPT_BINARY,
+    FLOAT32_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    NPY_MEDIA_TYPE,
+    binary_media_types,
+    decode_matrix,
+    encode_matrix,
+    negotiate,
+)
+
+
+@pytest.fixture
+def matrix():
+    return np.random.default_rng(0).standard_normal((5, 768)).astype(np.float32)
+
+
+@pytest.mark.parametrize("media_type", [FLOAT32_MEDIA_TYPE, NPY_MEDIA_TYPE])
+def test_round_trip(matrix, media_type):
+    decoded = decode_matrix(encode_matrix(matrix, media_type), media_type)
+
+    assert decoded.shape == matrix.shape
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, matrix)
+
+
+def test_msgpack_round_trip(matrix):
+    pytest.importorskip("msgpack")
+    body = encode_matrix(matrix, MSGPACK_MEDIA_TYPE)
+
+    np.testing.assert_array_equal(decode_matrix(body, MSGPACK_MEDIA_TYPE), matrix)
+
+
+@pytest.mark.parametrize("media_type", [FLOAT32_MEDIA_TYPE, NPY_MEDIA_TYPE])
+def test_round_trip_without_rows(media_type):
+    empty = np.empty((0, 768), dtype=np.float32)
+
+    assert decode_matrix(encode_matrix(empty, media_type), media_type).shape == (0, 768)
+
+
+def test_float64_input_is_sent_as_float32(matrix):
+    body = encode_matrix(matrix.astype(np.float64), FLOAT32_MEDIA_TYPE)
+
+    assert len(body) == 8 + matrix.size * 4
+    np.testing.assert_array_equal(decode_matrix(body, FLOAT32_MEDIA_TYPE), matrix)
+
+
+def test_decode_does_not_copy(matrix):
+    body = encode_matrix(matrix, FLOAT32_MEDIA_TYPE)
+
+    decoded = decode_matrix(body, FLOAT32_MEDIA_TYPE)
+
+    assert not decoded.flags.writeable
+    assert not decoded.flags.owndata
+
+
+def test_decode_ignores_media_type_parameters(matrix):
+    body = encode_matrix(matrix, NPY_MEDIA_TYPE)
+
+    decoded = decode_matrix(body, "application/x-npy; charset=binary")
+
+    np.testing.assert_array_equal(decoded, matrix)
+
+
+def test_encode_rejects_vectors_and_unknown_types(matrix):
+    with pytest.raises(ValueError):
+        encode_matrix(matrix[0], FLOAT32_MEDIA_TYPE)
+    with pytest.raises(ValueError):
+        encode_matrix(matrix, "text/csv")
+
+
+@pytest.mark.parametrize(
+    "accept,expected",
+    [
+        (None, None),
+        ("", None),
+        ("application/json", None),
+        ("*/*", None),
+        ("text/html", None),
+        (ACCEPT_BINARY, FLOAT32_MEDIA_TYPE),
+        ("application/x-npy", NPY_MEDIA_TYPE),
+        ("application/x-float32;q=0.4, application/x-npy;q=0.5", NPY_MEDIA_TYPE),
+        ("application/json, application/x-float32", None),
+        ("application/json;q=0.5, application/x-float32", FLOAT32_MEDIA_TYPE),
+        ("application/x-float32;q=0, application/x-npy;q=0.1", NPY_MEDIA_TYPE),
+        ("Application/X-Float32", FLOAT32_MEDIA_TYPE),
+    ],
+)
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_msgpack_is_only_offered_when_installed():
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        assert MSGPACK_MEDIA_TYPE not in binary_media_types()
+        assert negotiate(MSGPACK_MEDIA_TYPE) is None
+    else:
+        assert negotiate(MSGPACK_MEDIA_TYPE) == MSGPACK_MEDIA_TYPE
@@ -0,0 +1,130 @@
+"""
+Binary wire formats for embedding matrices.
+
+/generate-embeddings/ picks the format from the Accept header; JSON stays
+the default. Every binary format carries a (rows, dim) float32 matrix and is
+decoded without copying the vector data:
+
+    application/x-float32  8-byte header (rows, dim as little-endian uint32)
+                           followed by the rows, little-endian float32
+    application/x-npy      a NumPy .npy file
+    application/msgpack    {"shape": [rows, dim], "data": <raw float32 bytes>}
+                           (needs the msgpack package on both sides)
+"""
+import io
+import struct
+from typing import Optional
+
+import numpy as np
+
+FLOAT32_MEDIA_TYPE = "application/x-float32"
+NPY_MEDIA_TYPE = "application/x-npy"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Accept header of the client helpers: the cheapest format first, JSON last
+ACCEPT_BINARY = f"{FLOAT32_MEDIA_TYPE}, {NPY_MEDIA_TYPE};q=0.9, application/json;q=0.1"
+
+_HEADER = struct.Struct("<II")
+_LE_FLOAT32 = np.dtype("<f4")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def binary_media_types() -> list[str]:
+    """
+    Binary formats this process can encode and decode.
+    """
+    types = [FLOAT32_MEDIA_TYPE, NPY_MEDIA_TYPE]
+    if _msgpack() is not None:
+        types.append(MSGPACK_MEDIA_TYPE)
+    return types
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the binary format preferred by an Accept header.
+
+    Returns:
+        str: The media type, or None for JSON (no Accept header, JSON
+            preferred, or no supported binary format listed).
+    """
+    if not accept:
+        return None
+    offered = binary_media_types()
+    choices = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            choices.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(choices):
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+        if media_type in offered:
+            return media_type
+    return None
+
+
+def encode_matrix(matrix: np.ndarray, media_type: str) -> bytes:
+    """
+    Serialize a (rows, dim) matrix as little-endian float32.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=_LE_FLOAT32)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a 2-D matrix, got shape {matrix.shape}")
+    if media_type == FLOAT32_MEDIA_TYPE:
+        return _HEADER.pack(*matrix.shape) + matrix.tobytes()
+    if media_type == NPY_MEDIA_TYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, matrix, allow_pickle=False)
+        return buffer.getvalue()
+    if media_type == MSGPACK_MEDIA_TYPE:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        return msgpack.packb({"shape": list(matrix.shape), "data": matrix.tobytes()})
+    raise ValueError(f"Unknown media type: {media_type}")
+
+
+def decode_matrix(body: bytes, media_type: str) -> np.ndarray:
+    """
+    Read a matrix written by encode_matrix. The result is a read-only view
+    of `body`; copy it before modifying it in place.
+    """
+    media_type = media_type.split(";")[0].strip().lower()
+    if media_type == FLOAT32_MEDIA_TYPE:
+        rows, dim = _HEADER.unpack_from(body)
+        return np.frombuffer(
+            body, dtype=_LE_FLOAT32, count=rows * dim, offset=_HEADER.size
+        ).reshape(rows, dim)
+    if media_type == NPY_MEDIA_TYPE:
+        stream = io.BytesIO(body)
+        if np.lib.format.read_magic(stream) == (1, 0):
+            header = np.lib.format.read_array_header_1_0(stream)
+        else:
+            header = np.lib.format.read_array_header_2_0(stream)
+        shape, fortran_order, dtype = header
+        if fortran_order or len(shape) != 2:
+            return np.load(io.BytesIO(body), allow_pickle=False)
+        return np.frombuffer(
+            body, dtype=dtype, count=shape[0] * shape[1], offset=stream.tell()
+        ).reshape(shape)
+    if media_type == MSGPACK_MEDIA_TYPE:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        message = msgpack.unpackb(body)
+        rows, dim = message["shape"]
+        return np.frombuffer(message["data"], dtype=_LE_FLOAT32).reshape(rows, dim)
+    raise ValueError(f"Unknown media type: {media_type}")
@@ -0,0 +1,594 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Iterator, Optional
+
+import numpy as np
+from index_tuning import load_index_config, search_params
+from milvus_pool import MILVUS_COLLECTION, MILVUS_DB, MilvusPool, get_milvus_pool
+from pymilvus import MilvusClient
+
+# "milvus" (default), "faiss" or "numpy"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus")
+# Directory where the in-process backends persist their files
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./cache/vector_store")
+# Approximate bytes (vectors + text) sent per insert call by insert_columns
+INSERT_BATCH_BYTES = int(os.getenv("INSERT_BATCH_BYTES", 16 * 1024 * 1024))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row so that inner product equals cosine similarity.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def insert_batch_rows(vectors: np.ndarray, chunks: list[str]) -> int:
+    """
+    Rows per insert call so that a call carries about INSERT_BATCH_BYTES.
+    """
+    if not len(chunks):
+        return 1
+    text_bytes = sum(len(chunk) for chunk in chunks) / len(chunks)
+    row_bytes = vectors[0].nbytes + text_bytes if len(vectors) else text_bytes
+    return max(1, int(INSERT_BATCH_BYTES // max(row_bytes, 1)))
+
+
+class VectorStore:
+    """
+    Common interface of the vector search backends.
+
+    Rows use the collection layout ({"q_id", "q_vector", "q_chunk"}) and search
+    results use the Milvus shape: one list of {"id", "distance", "entity"} hits
+    per query, with the COSINE similarity as distance.
+    """
+
+    def insert(self, rows: list[dict]) -> int:
+        raise NotImplementedError
+
+    def upsert(self, rows: list[dict]) -> int:
+        self.delete([row["q_id"] for row in rows])
+        return self.insert(rows)
+
+    def insert_columns(self, ids: list[str], chunks: list[str], vectors: np.ndarray) -> int:
+        """
+        Insert column-oriented data: parallel IDs and chunks plus a float32
+        matrix with one vector per row.
+
+        The rows are sent in slices of about INSERT_BATCH_BYTES, and each row
+        holds a view of the matrix instead of a list of Python floats.
+        """
+        step = insert_batch_rows(vectors, chunks)
+        inserted = 0
+        for start in range(0, len(ids), step):
+            end = start + step
+            inserted += self.insert(
+                [
+                    {"q_id": q_id, "q_vector": vector, "q_chunk": chunk}
+                    for q_id, chunk, vector in zip(
+                        ids[start:end], chunks[start:end], vectors[start:end]
+                    )
+                ]
+            )
+        return inserted
+
+    def delete(self, ids: list[str]) -> int:
+        raise NotImplementedError
+
+    def search(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        raise NotImplementedError
+
+    async def asearch(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        """
+        `search` for the event loop; in-process stores run it in a thread.
+        """
+        return await asyncio.to_thread(self.search, vectors, limit, output_fields)
+
+    def records(self, batch_size: int = 1000) -> Iterator[tuple[str, str]]:
+        """
+        Iterate over every stored (q_id, q_chunk) pair.
+        """
+        raise NotImplementedError
+
+    def save(self):
+        """
+        Persist pending changes. A no-op for server-backed stores.
+        """
+
+    def refresh(self):
+        """
+        Pick up changes saved by another process (e.g. a CLI ingestion).
+        A no-op for server-backed stores.
+        """
+
+
+class MilvusVectorStore(VectorStore):
+    """
+    Vector store backed by a Milvus collection.
+
+    Without an explicit client it uses the shared connection pool of the
+    database (see milvus_pool.py), and `asearch` goes through its async clients.
+    """
+
+    def __init__(
+        self,
+        client: Optional[MilvusClient] = None,
+        collection_name: str = MILVUS_COLLECTION,
+        db_name: str = MILVUS_DB,
+        storage: str = "float32",
+    ):
+        self.pool: Optional[MilvusPool] = None
+        if client is None:
+            self.pool = get_milvus_pool(db_name)
+            client = self.pool.client()
+        self.client = client
+        self.collection_name = collection_name
+        # "float16" and "binary" match FLOAT16_VECTOR / BINARY_VECTOR fields
+        self.storage = storage
+
+    def _encode(self, vectors: list) -> list:
+        if self.storage == "float32":
+            return [list(map(float, vector)) for vector in vectors]
+        from compact_vectors import encode_for_milvus
+
+        return encode_for_milvus(vectors, self.storage)
+
+    def _encode_rows(self, rows: list[dict]) -> list[dict]:
+        if self.storage == "float32":
+            return rows
+        vectors = self._encode([row["q_vector"] for row in rows])
+        return [{**row, "q_vector": vector} for row, vector in zip(rows, vectors)]
+
+    def insert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        self.client.insert(collection_name=self.collection_name, data=self._encode_rows(rows))  # type: ignore
+        return len(rows)
+
+    def upsert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        self.client.upsert(collection_name=self.collection_name, data=self._encode_rows(rows))  # type: ignore
+        return len(rows)
+
+    def delete(self, ids: list[str]) -> int:
+        if not ids:
+            return 0
+        self.client.delete(collection_name=self.collection_name, ids=ids)  # type: ignore
+        return len(ids)
+
+    def __len__(self) -> int:
+        stats = self.client.get_collection_stats(self.collection_name)  # type: ignore
+        return int(stats["row_count"])
+
+    def _ensure_loaded(self):
+        if self.pool is not None:
+            self.pool.ensure_loaded(self.collection_name)
+        else:
+            self.client.load_collection(self.collection_name)  # type: ignore
+
+    def records(self, batch_size: int = 1000) -> Iterator[tuple[str, str]]:
+        self._ensure_loaded()
+        iterator = self.client.query_iterator(  # type: ignore
+            collection_name=self.collection_name,
+            batch_size=batch_size,
+            filter='q_id != ""',
+            output_fields=["q_id", "q_chunk"],
+        )
+        while True:
+            batch = iterator.next()
+            if not batch:
+                iterator.close()
+                return
+            for record in batch:
+                yield record["q_id"], record["q_chunk"]
+
+    def get_vectors(self, ids: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Stored vectors of the given IDs, normalized; unknown IDs are left out.
+        Only for float32 collections.
+
+        Returns:
+            tuple: The found IDs and their vectors, in the same order.
+        """
+        if not ids:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        self._ensure_loaded()
+        rows = self.client.query(  # type: ignore
+            collection_name=self.collection_name,
+            ids=ids,
+            output_fields=["q_vector"],
+        )
+        vectors = {row["q_id"]: row["q_vector"] for row in rows}
+        found = [q_id for q_id in ids if q_id in vectors]
+        if not found:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return found, normalize_rows(
+            np.asarray([vectors[q_id] for q_id in found], dtype=np.float32)
+        )
+
+    def search(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        result = self.client.search(  # type: ignore
+            collection_name=self.collection_name,
+            anns_field="q_vector",
+            data=self._encode(vectors),
+            limit=limit,
+            search_params=self._search_params(limit),
+            output_fields=output_fields or [],
+        )
+        return self._hits(result)
+
+    async def asearch(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        if self.pool is None:
+            return await super().asearch(vectors, limit, output_fields)
+        result = await self.pool.search(
+            self.collection_name,
+            self._encode(vectors),
+            limit,
+            self._search_params(limit),
+            output_fields,
+        )
+        return self._hits(result)
+
+    @staticmethod
+    def _hits(result) -> list[list[dict]]:
+        # Recent Milvus versions key each hit by the primary field ("q_id")
+        return [
+            [
+                {
+                    "id": hit.get("id", hit.get("q_id")),
+                    "distance": hit["distance"],
+                    "entity": hit.get("entity", {}),
+                }
+                for hit in hits
+            ]
+            for hits in result
+        ]
+
+    def _search_params(self, limit: int) -> dict:
+        if self.storage == "binary":
+            from compact_vectors import milvus_index_config
+
+            return search_params(
+                milvus_index_config(load_index_config(), self.storage), limit
+            )
+        return search_params(limit=limit)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process exact search over a normalized float32 matrix.
+
+    Files in `path`:
+        vectors.npy   normalized vectors, loaded memory-mapped
+        records.json  parallel list of {"q_id", "q_chunk"}
+
+    With fresh=True the existing files are ignored and overwritten on save().
+    refresh() reloads the files when their mtime changes, unless this
+    instance has unsaved changes of its own.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_PATH, fresh: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids: list[str] = []
+        self._chunks: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._pending: list[np.ndarray] = []
+        # mtimes of the files when they were last loaded or saved here
+        self._files_mtime: Optional[tuple] = None
+        self._dirty = False
+        if not fresh:
+            self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def records_path(self) -> str:
+        return os.path.join(self.path, "records.json")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _files(self) -> list[str]:
+        return [self.vectors_path, self.records_path]
+
+    def _stat_files(self) -> Optional[tuple]:
+        try:
+            return tuple(os.stat(path).st_mtime_ns for path in self._files())
+        except OSError:
+            return None
+
+    def refresh(self):
+        mtime = self._stat_files()
+        if mtime is None or mtime == self._files_mtime:
+            return
+        with self._lock:
+            if self._dirty:
+                # Our own unsaved rows win; they overwrite the files on save()
+                return
+            print(f"Recargando el almacén de vectores {self.path}")
+            self._ids, self._chunks, self._positions = [], [], {}
+            self._vectors, self._pending = None, []
+            self._on_change()
+            self._load()
+
+    def insert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        with self._lock:
+            vectors = self._encode(np.array([row["q_vector"] for row in rows]))
+            for row in rows:
+                self._positions[row["q_id"]] = len(self._ids)
+                self._ids.append(row["q_id"])
+                self._chunks.append(row.get("q_chunk", ""))
+            self._pending.append(vectors)
+            self._dirty = True
+            self._on_change()
+        return len(rows)
+
+    def insert_columns(self, ids: list[str], chunks: list[str], vectors: np.ndarray) -> int:
+        if not ids:
+            return 0
+        with self._lock:
+            encoded = self._encode(vectors)
+            for q_id, chunk in zip(ids, chunks):
+                self._positions[q_id] = len(self._ids)
+                self._ids.append(q_id)
+                self._chunks.append(chunk)
+            self._pending.append(encoded)
+            self._dirty = True
+            self._on_change()
+        return len(ids)
+
+    def delete(self, ids: list[str]) -> int:
+        with self._lock:
+            drop = {self._positions[q_id] for q_id in ids if q_id in self._positions}
+            if not drop:
+                return 0
+            matrix = self._matrix()
+            keep = [i for i in range(len(self._ids)) if i not in drop]
+            self._vectors = np.ascontiguousarray(matrix[keep])
+            self._ids = [self._ids[i] for i in keep]
+            self._chunks = [self._chunks[i] for i in keep]
+            self._positions = {q_id: i for i, q_id in enumerate(self._ids)}
+            self._dirty = True
+            self._on_change()
+            return len(drop)
+
+    def records(self, batch_size: int = 1000) -> Iterator[tuple[str, str]]:
+        with self._lock:
+            pairs = list(zip(self._ids, self._chunks))
+        return iter(pairs)
+
+    def get_vectors(self, ids: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Stored vectors of the given IDs; unknown IDs are left out.
+
+        Returns:
+            tuple: The found IDs and their vectors, in the same order.
+        """
+        with self._lock:
+            found = [q_id for q_id in ids if q_id in self._positions]
+            matrix = self._matrix()
+            positions = [self._positions[q_id] for q_id in found]
+            return found, np.asarray(matrix[positions], dtype=np.float32)
+
+    def search(
+        self,
+        vectors: list[list[float]],
+        limit: int = 5,
+        output_fields: Optional[list[str]] = None,
+    ) -> list[list[dict]]:
+        queries = normalize_rows(np.asarray(vectors))
+        with self._lock:
+            if not self._ids:
+                return [[] for _ in range(len(queries))]
+            scores, positions = self._top_k(queries, min(limit, len(self._ids)))
+            return [
+                [
+                    self._hit(int(position), float(score), output_fields)
+                    for score, position in zip(row_scores, row_positions)
+                    if position >= 0
+                ]
+                for row_scores, row_positions in zip(scores, positions)
+            ]
+
+    def save(self):
+        # Files are replaced atomically: the current matrix may be a memory map
+        # of the previous vectors.npy
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.vectors_path + ".tmp", "wb") as file:
+                np.save(file, self._matrix())
+            os.replace(self.vectors_path + ".tmp", self.vectors_path)
+            with open(self.records_path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(
+                    [
+                        {"q_id": q_id, "q_chunk": chunk}
+                        for q_id, chunk in zip(self._ids, self._chunks)
+                    ],
+                    file,
+                    ensure_ascii=False,
+                )
+            os.replace(self.records_path + ".tmp", self.records_path)
+            self._save_extra()
+            self._files_mtime = self._stat_files()
+            self._dirty = False
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Convert inserted vectors to the stored representation.
+        """
+        return normalize_rows(vectors)
+
+    def _top_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self._matrix().T
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(scores, positions, axis=1)
+        order = np.argsort(-top, axis=1)
+        return (
+            np.take_along_axis(top, order, axis=1),
+            np.take_along_axis(positions, order, axis=1),
+        )
+
+    def _hit(
+        self, position: int, score: float, output_fields: Optional[list[str]]
+    ) -> dict:
+        entity = {}
+        if output_fields and "q_chunk" in output_fields:
+            entity["q_chunk"] = self._chunks[position]
+        return {"id": self._ids[position], "distance": score, "entity": entity}
+
+    def _matrix(self) -> np.ndarray:
+        # Merge pending inserts into a single contiguous matrix
+        if self._pending:
+            parts = ([self._vectors] if self._vectors is not None else []) + self._pending
+            self._vectors = np.ascontiguousarray(np.concatenate(parts, axis=0))
+            self._pending = []
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors
+
+    def _on_change(self):
+        """
+        Hook for subclasses that keep a derived index.
+        """
+
+    def _save_extra(self):
+        """
+        Hook for subclasses that persist a derived index.
+        """
+
+    def _load(self):
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.records_path)):
+            return
+        self._files_mtime = self._stat_files()
+        self._vectors = np.load(self.vectors_path, mmap_mode="r")
+        with open(self.records_path, "r", encoding="utf-8") as file:
+            records = json.load(file)
+        self._ids = [record["q_id"] for record in records]
+        self._chunks = [record["q_chunk"] for record in records]
+        self._positions = {q_id: i for i, q_id in enumerate(self._ids)}
+
+
+class FaissVectorStore(NumpyVectorStore):
+    """
+    In-process search with a FAISS inner-product index over normalized vectors.
+
+    The index is persisted as `index.faiss` next to the NumPy files and is
+    opened memory-mapped.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_PATH, fresh: bool = False):
+        import faiss  # type: ignore
+
+        self._faiss = faiss
+        self._index = None
+        super().__init__(path, fresh)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.path, "index.faiss")
+
+    def _files(self) -> list[str]:
+        files = super()._files()
+        if os.path.exists(self.index_path):
+            files.append(self.index_path)
+        return files
+
+    def _top_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        return self._ensure_index().search(np.ascontiguousarray(queries), k)
+
+    def _ensure_index(self):
+        if self._index is None:
+            matrix = self._matrix()
+            self._index = self._faiss.IndexFlatIP(matrix.shape[1])
+            self._index.add(np.ascontiguousarray(matrix, dtype=np.float32))
+        return self._index
+
+    def _on_change(self):
+        # The flat index is rebuilt lazily on the next search
+        self._index = None
+
+    def _save_extra(self):
+        if self._ids:
+            self._faiss.write_index(self._ensure_index(), self.index_path + ".tmp")
+            os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _load(self):
+        super()._load()
+        if self._ids and os.path.exists(self.index_path):
+            self._index = self._faiss.read_index(
+                self.index_path, self._faiss.IO_FLAG_MMAP
+            )
+
+
+def get_vector_store(
+    backend: str = VECTOR_BACKEND,
+    path: str = VECTOR_STORE_PATH,
+    client: Optional[MilvusClient] = None,
+    collection_name: str = MILVUS_COLLECTION,
+    fresh: bool = False,
+) -> VectorStore:
+    """
+    Build the configured vector store.
+
+    With VECTOR_DIM/VECTOR_STORAGE set to compact vectors, the store is a
+    two-phase one (see compact_vectors.py).
+
+    Args:
+        backend (str): "milvus", "faiss" or "numpy". "faiss" falls back to
+            "numpy" when faiss is not installed.
+        path (str): Directory used by the in-process backends.
+        client (MilvusClient, optional): Existing client for the Milvus backend.
+        collection_name (str): Collection used by the Milvus backend.
+        fresh (bool): Start the in-process backends empty, ignoring saved files.
+
+    Returns:
+        VectorStore: The store.
+    """
+    from compact_vectors import compact_enabled, get_compact_vector_store
+
+    if compact_enabled():
+        return get_compact_vector_store(backend, path, client, collection_name, fresh)
+    if backend == "milvus":
+        return MilvusVectorStore(client, collection_name)
+    if backend == "faiss":
+        try:
+            return FaissVectorStore(path, fresh)
+        except ImportError:
+            print("faiss no está instalado, se usa búsqueda exacta con NumPy")
+            return NumpyVectorStore(path, fresh)
+    if backend == "numpy":
+        return NumpyVectorStore(path, fresh)
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from metrics import LLM_LOAD_SECONDS, log_event
+from ollama_client import DEFAULT_EMBED_MODEL, get_ollama_client, keep_alive_for
+from rag import SYSTEM_PROMPT
+
+# Models loaded when the backend starts (comma-separated)
+WARMUP_MODELS = [
+    model.strip()
+    for model in os.getenv(
+        "WARMUP_MODELS", f"qwen2.5:1.5b,{DEFAULT_EMBED_MODEL}"
+    ).split(",")
+    if model.strip()
+]
+
+# Last warm-up of each model: {"model", "seconds", "load_seconds", "at", "error"}
+warm_state: dict[str, dict] = {}
+
+
+async def warm_model(model: str) -> dict:
+    """
+    Load a model and prefill the system prompt, recording how long it took.
+
+    Returns:
+        dict: The warm-up result, also kept in `warm_state`.
+    """
+    start = time.perf_counter()
+    state: dict = {"model": model, "keep_alive": keep_alive_for(model)}
+    try:
+        result = await get_ollama_client().warm(model, system=SYSTEM_PROMPT)
+        load_seconds = (result.get("load_duration") or 0) / 1e9
+        LLM_LOAD_SECONDS.labels(model).observe(load_seconds)
+        state["load_seconds"] = round(load_seconds, 3)
+    except Exception as e:
+        state["error"] = str(e)
+    state["seconds"] = round(time.perf_counter() - start, 3)
+    state["at"] = time.time()
+    warm_state[model] = state
+    log_event("warmup", **state)
+    return state
+
+
+async def warm_models(models: Optional[list[str]] = None) -> list[dict]:
+    """
+    Warm several models, one at a time so they do not compete for memory.
+    """
+    results = []
+    for model in models if models is not None else WARMUP_MODELS:
+        results.append(await warm_model(model))
+    return results
+
+
+def start_warmup(models: Optional[list[str]] = None) -> asyncio.Task:
+    """
+    Warm the models in the background; startup does not wait for them.
+    """
+    return asyncio.create_task(warm_models(models))
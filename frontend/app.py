@@ -1,22 +1,39 @@
 import json
+import math
+import os
+import uuid
+from collections import deque
+from itertools import islice
 
-import ollama
 import requests
 import streamlit as st
 
-from processing import (
-    get_answer_from_model,
-    get_embedding_ollama,
-    get_milvus_client,
-    get_question_contents,
-    print_with_date,
-)
+from model_catalog import ModelCatalog
+from processing import ask_question, print_with_date, timed_stage, warm_model
+
+# Questions kept in the session history; older ones are discarded
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", 50))
+# Questions shown per history page
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 5))
 
 # Initialize session state for history and last processed question
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=HISTORY_MAX_ENTRIES)
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
 if "last_processed_question" not in st.session_state:
     st.session_state.last_processed_question = None
+# One ID per browser session, so the backend queues sessions fairly
+if "client_id" not in st.session_state:
+    st.session_state.client_id = uuid.uuid4().hex
+
+
+@st.cache_resource
+def get_model_catalog() -> ModelCatalog:
+    """
+    Model catalog shared by every session of this Streamlit server.
+    """
+    return ModelCatalog()
 
 
 def configure_sidebar():
@@ -29,13 +46,22 @@ def configure_sidebar():
     with st.sidebar:
         st.header("Configuración")
         try:
-            # Dynamically fetch available models from Ollama
-            print("listin ollama")
-            available_models = [model["model"] for model in ollama.list()["models"]]
-            print("listin ollama")
+            # Models available in Ollama, from the shared TTL cache
+            catalog = get_model_catalog()
+            available_models = catalog.models()
+            if not available_models and catalog.error:
+                st.error(f"No se pudo obtener la lista de modelos: {catalog.error}")
+            st.button("Actualizar modelos", on_click=catalog.invalidate)
             selected_model = st.selectbox(
                 "Selecciona un modelo:", available_models, key="model_selection"
             )
+            # Load the model now instead of on the first question
+            if selected_model and st.session_state.get("warmed_model") != selected_model:
+                with st.spinner(f"Cargando {selected_model}..."):
+                    result = warm_model(selected_model)
+                if result is not None:
+                    print_with_date(f"Model warmed up: {result}")
+                st.session_state.warmed_model = selected_model
 
             return selected_model
         except Exception as e:
@@ -43,6 +69,53 @@ def configure_sidebar():
             return None
 
 
+def _turn_page(step: int):
+    st.session_state.history_page += step
+
+
+def render_history(skip_latest: bool):
+    """
+    Render one page of the history, newest questions first.
+
+    Only HISTORY_PAGE_SIZE entries are drawn per run, so a rerun costs the
+    same however long the session has been going.
+
+    Args:
+        skip_latest (bool): Leave out the latest entry (already on screen).
+    """
+    history = st.session_state.history
+    total = len(history) - 1 if skip_latest else len(history)
+    if total <= 0:
+        return
+    pages = math.ceil(total / HISTORY_PAGE_SIZE)
+    page = max(0, min(st.session_state.history_page, pages - 1))
+    st.session_state.history_page = page
+
+    start = page * HISTORY_PAGE_SIZE + (1 if skip_latest else 0)
+    st.markdown("---")
+    st.subheader("Historial de Preguntas y Respuestas:")
+    for entry in islice(reversed(history), start, start + HISTORY_PAGE_SIZE):
+        st.markdown(f"**Pregunta:** {entry['question']}")
+        st.markdown(f"**Respuesta:** {entry['answer']}")
+        st.markdown("---")
+
+    if pages > 1:
+        older, position, newer = st.columns([1, 2, 1])
+        older.button(
+            "← Anteriores",
+            on_click=_turn_page,
+            args=(1,),
+            disabled=page >= pages - 1,
+        )
+        position.caption(f"Página {page + 1} de {pages}")
+        newer.button(
+            "Recientes →",
+            on_click=_turn_page,
+            args=(-1,),
+            disabled=page == 0,
+        )
+
+
 def is_valid_json(json_data: str):
     """
     Check if the provided string is a valid JSON.
@@ -94,92 +167,52 @@ def main():
         if user_query.lower() in ["salir", "exit"]:
             st.info("👋 ¡Hasta luego!")
         else:
-            with st.spinner(
-                "Procesando su pregunta..."
-            ):  # Get the embedding of the question
-                vt_search = get_embedding_ollama(user_query)[0]
-                # print("vt_search: ",vt_search)
-                if not vt_search or not isinstance(vt_search, list):
-                    st.error(
-                        "El proceso de embeddings ha fallado o devolvió datos inválidos."
-                    )
-                    st.stop()
-
-                # Search in Milvus
-                try:
-                    print_with_date("Searching in Milvus...")
-                    # Connect to Milvus
-                    client = get_milvus_client(
-                        db_name="versat", collection_name="sarasola"
-                    )
-                    res_query: dict[str : [str | float]] = client.search(  # type: ignore
-                        collection_name="sarasola",
-                        anns_field="q_vector",
-                        data=[vt_search],
-                        limit=5,
-                        search_params={"metric_type": "COSINE"},
-                        output_fields=["q_question"],
-                    )[
-                        0
-                    ]
-                    # print("res_query:\n", res_query)
-                    cont: list[str] = [
-                        "\n".join([str(v["id"]), str(v["entity"]["q_question"])])
-                        for v in res_query
-                    ]
-                    id_interest: [list[str]] = [item.get("id", "") for item in res_query]  # type: ignore
-                    print_with_date(f"Selected IDS: {id_interest}")
-                    resultados = "\n\n".join(cont)
-                except Exception as e:
-                    print_with_date(f"Error during the search: {e}")
-                    st.stop()
-
-                # print("resultados:", resultados)
-
-                # Build the prompt
-                prompt = f"""
-                **Rol:** Eres un asistente experto que responde preguntas sobre el software basándose *únicamente* en fragmentos de documentación proporcionados.
-
-                **Tarea:** Analiza el siguiente "Contexto", que puede contener uno o más fragmentos relevantes. Responde la "Pregunta del Usuario" de forma precisa y útil.
-
-                **Instrucciones:**
-                1.  Para cada fragmento en el contexto, localiza la información más relevante para la pregunta, priorizando `Sct. Respuesta` y `Sct. Pasos a Seguir`.
-                2.  **Sintetiza** la información de los fragmentos relevantes en una **única respuesta coherente**. No te limites a listar las respuestas de cada fragmento por separado.
-                3.  La respuesta debe ser clara, directa y enfocada en resolver la duda del usuario.
-                4.  Basa tu respuesta *exclusivamente* en el contexto. No inventes información ni uses conocimiento externo.
-                5.  Si el contexto no contiene la información necesaria, indícalo claramente.
-
-                **Contexto:**
-
-                Contexto:
-                {resultados}
-
-                Pregunta: {user_query}
-
-                Respuesta:
-                """
-
+            # Same ID in the frontend and backend logs of this question
+            request_id = uuid.uuid4().hex
             print_with_date(f"Building the final answer by {selected_model}...")
 
-            # Get the answer from the model
-            output = get_answer_from_model(model=selected_model, prompt=prompt)
+            # Retrieval, prompt and generation run in the backend (/ask);
+            # the answer is streamed as tokens arrive
+            st.markdown(f"**Pregunta:** {user_query}")
+            st.markdown("**Respuesta:**")
+            sources: list[dict] = []
+            queue_notice = st.empty()
+
+            def show_queue(status):
+                if status is None:
+                    queue_notice.empty()
+                else:
+                    queue_notice.info(
+                        f"⏳ En cola: {status['position']} pregunta(s) por delante, "
+                        f"unos {status['eta_seconds']:.0f} s de espera."
+                    )
+
+            with timed_stage("answer", request_id):
+                output = st.write_stream(
+                    ask_question(
+                        user_query,
+                        model=selected_model,
+                        request_id=request_id,
+                        sources=sources,
+                        client_id=st.session_state.client_id,
+                        on_queue=show_queue,
+                    )
+                )
+            print_with_date(f"Selected IDS: {[source['id'] for source in sources]}")
             print_with_date(f"The answer has been generated: {len(output)}")
 
-            # Save question and answer to history
+            # Save question and answer to history (bounded, oldest dropped)
             st.session_state.history.append({"question": user_query, "answer": output})
+            st.session_state.history_page = 0
 
             # Update the last processed question
             st.session_state.last_processed_question = user_query
 
-            # Display chat history
-            if st.session_state.history:
-                st.subheader("Historial de Preguntas y Respuestas:")
-                for entry in st.session_state.history:
-                    st.markdown(f"**Pregunta:** {entry['question']}")
-                    st.markdown(f"**Respuesta:** {entry['answer']}")
-                    st.markdown("---")
-            else:
-                st.session_state.historial = []
+            # Display previous questions; the current one is already on screen
+            render_history(skip_latest=True)
+            return
+
+    render_history(skip_latest=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from typing import Optional
+
+import ollama
+
+# Seconds the model list is served before it is refreshed in the background
+MODEL_CATALOG_TTL = float(os.getenv("MODEL_CATALOG_TTL", 60))
+# Seconds before retrying after `ollama list` failed
+MODEL_CATALOG_RETRY = float(os.getenv("MODEL_CATALOG_RETRY", 10))
+# Timeout of each `ollama list` call
+MODEL_CATALOG_TIMEOUT = float(os.getenv("MODEL_CATALOG_TIMEOUT", 5))
+
+
+class ModelCatalog:
+    """
+    Models available in Ollama, cached for MODEL_CATALOG_TTL seconds.
+
+    Once a list has been fetched, `models()` never waits for Ollama: when the
+    list is stale it is returned as is and a single background thread fetches
+    a new one. Only the very first call, with nothing cached yet, waits for
+    the daemon (at most MODEL_CATALOG_TIMEOUT seconds).
+    """
+
+    def __init__(
+        self,
+        ttl: float = MODEL_CATALOG_TTL,
+        retry: float = MODEL_CATALOG_RETRY,
+        timeout: float = MODEL_CATALOG_TIMEOUT,
+    ):
+        self.ttl = ttl
+        self.retry = retry
+        self._client = ollama.Client(timeout=timeout)
+        self._lock = threading.Lock()
+        self._models: list[str] = []
+        self._next_refresh = 0.0
+        self._refreshing = False
+        self.error: Optional[str] = None
+
+    def _refresh(self):
+        try:
+            models = [model["model"] for model in self._client.list()["models"]]
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self._next_refresh = time.monotonic() + self.retry
+                self._refreshing = False
+            print(f"Could not list the Ollama models: {e}")
+            return
+        with self._lock:
+            self._models = models
+            self.error = None
+            self._next_refresh = time.monotonic() + self.ttl
+            self._refreshing = False
+
+    def models(self) -> list[str]:
+        """
+        Return the cached model names, refreshing them if they are stale.
+        """
+        with self._lock:
+            start = not self._refreshing and time.monotonic() >= self._next_refresh
+            if start:
+                self._refreshing = True
+            cached = self._models
+        if start:
+            if cached:
+                threading.Thread(target=self._refresh, daemon=True).start()
+            else:
+                self._refresh()
+        with self._lock:
+            return self._models
+
+    def invalidate(self):
+        """
+        Fetch the list again on the next call (still in the background).
+        """
+        with self._lock:
+            self._next_refresh = 0.0